@@ -4,6 +4,7 @@ const express = require('express')
 const ws = require('ws');
 const fs = require('fs');
 const crypto = require('crypto');
+const net = require('net');
 
 const app = express()
 const port = 8042
@@ -12,6 +13,8 @@ const wsport = 8021
 //const remoteServerDefault = 'wss://testmap.krakenrf.com:2096'
 const remoteServerDefault = 'wss://map.krakenrf.com:2096'
 const settingsJsonPath = '_share/settings.json'
+// Unix socket of the DoA result stream from the DSP
+const doaStreamPath = '_share/middleware.sock'
 
 let remoteServer = ''
 let lastDoaUpdate = Date.now()
@@ -166,24 +169,39 @@ app.get('/', (req, res) => {
     res.send('Hi, this is the KrakenSDR middleware server :)')
 })
 
-app.post('/doapost', (req, res) => {
+// Forwards the DoA results of a frame (one per VFO), returns false if they could not be forwarded
+function forwardDoaResults(results) {
     lastDoaUpdate = Date.now()
-    let vfo = req.body.freq.toString()
-    let oldCnt = dataCounts[vfo] || 0
-    dataCounts[vfo] = oldCnt + 1
+    for (const result of results) {
+      let vfo = result.freq.toString()
+      let oldCnt = dataCounts[vfo] || 0
+      dataCounts[vfo] = oldCnt + 1
+    }
     // in remote mode, send data to sdr server backend like the App does
     if (inRemoteMode) {
-      wsTrySend(`{"apikey": "${settingsJson.krakenpro_key}", "data": ${JSON.stringify(req.body)}}`) 
+      // while the server is unreachable, the DSP keeps the results in its spool and sends them again later
+      if (!wsClient || wsClient.readyState !== ws.OPEN) {
+        return false
+      }
+      if (results.length == 1) {
+        return wsTrySend(`{"apikey": "${settingsJson.krakenpro_key}", "data": ${JSON.stringify(results[0])}}`)
+      }
+      // the results of all VFOs go to the server in one message
+      return wsTrySend(`{"apikey": "${settingsJson.krakenpro_key}", "type": "batch", "data": ${JSON.stringify(results)}}`)
     } else {
       // sends data to all websocket clients
       /*
       wsServer.clients.forEach(function each(client) {
         if (client.readyState === ws.OPEN) {
-          client.send(JSON.stringify(req.body));
+          client.send(JSON.stringify(results));
         }
       })*/
-    } 
-  res.sendStatus(200)
+    }
+    return true
+}
+
+app.post('/doapost', (req, res) => {
+  res.sendStatus(forwardDoaResults([req.body]) ? 200 : 503)
 });
 
 app.post('/prpost', (req, res) => {
@@ -203,6 +221,40 @@ app.post('/prpost', (req, res) => {
   res.sendStatus(200)
 });
 
+// Persistent DoA result stream from the DSP: newline delimited JSON messages {"type": "doa", "data": [results]},
+// each message is answered with a line {"ok": true} or {"ok": false, "error": "..."}
+const doaStreamServer = net.createServer((socket) => {
+  let buffer = ''
+  socket.setEncoding('utf8')
+  socket.on('data', (chunk) => {
+    buffer += chunk
+    let end
+    while ((end = buffer.indexOf('\n')) >= 0) {
+      const line = buffer.slice(0, end)
+      buffer = buffer.slice(end + 1)
+      let answer
+      try {
+        const message = JSON.parse(line)
+        answer = forwardDoaResults(message.data) ? {ok: true} : {ok: false, error: 'remote server unreachable'}
+      } catch (error) {
+        answer = {ok: false, error: 'invalid message'}
+      }
+      socket.write(JSON.stringify(answer) + '\n')
+    }
+  })
+  socket.on('error', (error) => {
+    console.error('DoA stream error:', error.message)
+  })
+})
+
+// remove the socket left by a previous run
+try {
+  fs.unlinkSync(doaStreamPath)
+} catch (error) {}
+doaStreamServer.listen(doaStreamPath, () => {
+  console.log(`DoA result stream is listening at ${doaStreamPath}`)
+})
+
 app.listen(port, () => {
     console.log(`Middleware HTTP Server is listening at http://localhost:${port}, Websocket on ${wsport}`)
 })
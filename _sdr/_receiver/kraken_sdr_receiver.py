@@ -103,6 +103,21 @@ class ReceiverRTLSDR:
                 return -1
         return 0
 
+    def reattach_data_iface(self, num_ch):
+        """
+        Reopens the data interface after the DAQ firmware has been restarted, e.g. with a new configuration.
+        The data interface must have been closed before (eth_close), the configuration of the receiver is kept,
+        the connection is re-established on the next frame request.
+
+        Parameters:
+        -----------
+            :param: num_ch: Number of channels of the DAQ configuration
+        """
+        self.M = num_ch
+        self.iq_header = IQHeader()
+        self.iq_samples = np.empty(0)
+        return self.init_data_iface()
+
     def eth_connect(self):
         """
         Compatible only with DAQ firmwares that has the IQ streaming mode.
@@ -197,7 +212,7 @@ class ReceiverRTLSDR:
 
         elif self.data_interface == "shmem":
             active_buff_index = self.in_shmem_iface.wait_buff_free()
-            if active_buff_index < 0 or active_buff_index > 1:
+            if active_buff_index < 0 or active_buff_index >= self.in_shmem_iface.num_slots:
                 self.logger.info("Terminating.., signal: {:d}".format(active_buff_index))
                 # If we cannot get the new IQ frame then we zero the stored IQ header
                 self.iq_header = IQHeader()
@@ -21,6 +21,7 @@
 
 import logging
 import os
+import select
 import time
 from multiprocessing import shared_memory
 from struct import pack, unpack
@@ -33,42 +34,103 @@ INIT_READY = 10
 TERMINATE = 255
 SLEEP_TIME_BETWEEN_READ_ATTEMPTS = 0.01  # seconds
 
+# The DAQ firmware uses two buffers (A/B), further slots are only used between the DSP pipeline stages.
+# Buffer ready tokens are slot index + 1, skipping the control tokens, so the first two match A/B_BUFF_READY.
+DEFAULT_NUM_SLOTS = 2
+MAX_NUM_SLOTS = 26
+
+# Optional header in front of each slot: magic, sequence number, payload size, write time [ns].
+# The DAQ firmware does not write it, it is only enabled between processes that both know about it.
+SLOT_HEADER_SIZE = 64  # [byte], keeps the payload aligned
+SLOT_HEADER_MAGIC = 0x4B52414B454E5231  # "KRAKENR1"
+
+
+def slot_to_token(slot_index):
+    token = slot_index + 1
+    return token if token < INIT_READY else token + 1
+
+
+def token_to_slot(token):
+    if token == INIT_READY or token == TERMINATE or token == 0:
+        return -1
+    return token - 1 if token < INIT_READY else token - 2
+
+
+def slot_shmem_name(shmem_name, slot_index):
+    # Slot 0 and 1 are the "_A" and "_B" buffers of the DAQ firmware
+    return shmem_name + "_" + chr(ord("A") + slot_index)
+
+
+def map_slot(memory, slot_header):
+    """
+    Returns the header (None if the slot has no header) and the payload view of a shared memory slot
+    """
+    buffer = np.ndarray((memory.size,), dtype=np.uint8, buffer=memory.buf)
+    if not slot_header:
+        return None, buffer
+    return buffer[:SLOT_HEADER_SIZE].view(np.uint64), buffer[SLOT_HEADER_SIZE:]
+
 
 class outShmemIface:
-    def __init__(self, shmem_name, shmem_size, drop_mode=False):
+    def __init__(
+        self,
+        shmem_name,
+        shmem_size,
+        drop_mode=False,
+        ctr_fifo_path="_data_control/",
+        num_slots=DEFAULT_NUM_SLOTS,
+        slot_header=False,
+    ):
+        """
+        Parameters:
+        -----------
+        :param: shmem_size: Payload size of a slot [byte]
+        :param: num_slots: Number of slots in the ring, the DAQ firmware uses 2 (A/B)
+        :param: slot_header: Write a header with a sequence number in front of each slot
+        """
         self.init_ok = True
         logging.basicConfig(level=logging.INFO)
         self.logger = logging.getLogger(__name__)
         self.drop_mode = drop_mode
         self.dropped_frame_cntr = 0
 
+        if not 2 <= num_slots <= MAX_NUM_SLOTS:
+            raise ValueError(f"Number of slots must be between 2 and {MAX_NUM_SLOTS}")
+
         self.shmem_name = shmem_name
-        self.buffer_free = [True, True]
+        self.num_slots = num_slots
+        self.slot_header = slot_header
+        self.buffer_free = [True] * num_slots
+        self.sequence_number = 0
+        # Highest number of slots handed over to the reader at the same time
+        self.occupancy_high_water_mark = 0
+        if slot_header:
+            shmem_size += SLOT_HEADER_SIZE
 
         self.memories = []
+        self.headers = []
         self.buffers = []
 
         # Try to remove shared memories if already exist
-        try:
-            shmem_A = shared_memory.SharedMemory(name=shmem_name + "_A", create=False, size=shmem_size)
-            shmem_A.close()
-            # shmem_A.unlink()
-            # shmem_A.unkink()
-        except FileNotFoundError as err:
-            self.logger.warning(f"Shared memory not exist: {err}")
-        try:
-            shmem_B = shared_memory.SharedMemory(name=shmem_name + "_B", create=False, size=shmem_size)
-            shmem_B.close()
-            # shmem_B.unlink()
-            # shmem_B.unkink()
-        except FileNotFoundError as err:
-            self.logger.warning(f"Shared memory not exist: {err}")
+        for slot_index in range(num_slots):
+            try:
+                shmem = shared_memory.SharedMemory(
+                    name=slot_shmem_name(shmem_name, slot_index), create=False, size=shmem_size
+                )
+                shmem.close()
+                # shmem.unlink()
+            except FileNotFoundError as err:
+                self.logger.warning(f"Shared memory not exist: {err}")
 
         # Create the shared memories
-        self.memories.append(shared_memory.SharedMemory(name=shmem_name + "_A", create=True, size=shmem_size))
-        self.memories.append(shared_memory.SharedMemory(name=shmem_name + "_B", create=True, size=shmem_size))
-        self.buffers.append(np.ndarray((shmem_size,), dtype=np.uint8, buffer=self.memories[0].buf))
-        self.buffers.append(np.ndarray((shmem_size,), dtype=np.uint8, buffer=self.memories[1].buf))
+        for slot_index in range(num_slots):
+            memory = shared_memory.SharedMemory(
+                name=slot_shmem_name(shmem_name, slot_index), create=True, size=shmem_size
+            )
+            header, buffer = map_slot(memory, slot_header)
+            self.memories.append(memory)
+            self.headers.append(header)
+            self.buffers.append(buffer)
 
         # Opening control FIFOs
         if self.drop_mode:
@@ -76,8 +138,8 @@ class outShmemIface:
         else:
             bw_fifo_flags = os.O_RDONLY
         try:
-            self.fw_ctr_fifo = os.open("_data_control/" + "fw_" + shmem_name, os.O_WRONLY)
-            self.bw_ctr_fifo = os.open("_data_control/" + "bw_" + shmem_name, bw_fifo_flags)
+            self.fw_ctr_fifo = os.open(ctr_fifo_path + "fw_" + shmem_name, os.O_WRONLY)
+            self.bw_ctr_fifo = os.open(ctr_fifo_path + "bw_" + shmem_name, bw_fifo_flags)
         except OSError as err:
             self.logger.critical(f"OS error: {err}")
             self.logger.critical("Failed to open control fifos")
@@ -89,63 +151,132 @@ class outShmemIface:
         if self.init_ok:
             os.write(self.fw_ctr_fifo, pack("B", INIT_READY))
 
-    def send_ctr_buff_ready(self, active_buffer_index):
+    def send_ctr_buff_ready(self, active_buffer_index, payload_size=0):
+        """
+        Parameters:
+        -----------
+        :param: active_buffer_index: Slot that has been filled
+        :param: payload_size: Number of valid bytes in the slot, stored in the slot header
+        """
+        if self.slot_header:
+            self.headers[active_buffer_index][:] = (
+                SLOT_HEADER_MAGIC,
+                self.sequence_number,
+                payload_size,
+                time.time_ns(),
+                0,
+                0,
+                0,
+                0,
+            )
+        self.sequence_number += 1
+
         # Send buffer ready signal on the forward FIFO
-        if active_buffer_index == 0:
-            os.write(self.fw_ctr_fifo, pack("B", A_BUFF_READY))
-        elif active_buffer_index == 1:
-            os.write(self.fw_ctr_fifo, pack("B", B_BUFF_READY))
+        os.write(self.fw_ctr_fifo, pack("B", slot_to_token(active_buffer_index)))
 
         # Deassert buffer free flag
         self.buffer_free[active_buffer_index] = False
+        # The slots released meanwhile are still flagged busy until their tokens are read
+        self.read_released_slots()
+        self.occupancy_high_water_mark = max(self.occupancy_high_water_mark, self.get_occupancy())
+
+    def read_released_slots(self):
+        """
+        Flags the slots released by the reader as free, reads the pending tokens of the backward FIFO without waiting
+        """
+        while select.select([self.bw_ctr_fifo], [], [], 0)[0]:
+            try:
+                tokens = os.read(self.bw_ctr_fifo, self.num_slots)
+            except BlockingIOError:
+                break
+            if not tokens:
+                # The reader side has been closed, wait_buff_free() reports it
+                break
+            for token in tokens:
+                slot_index = token_to_slot(token)
+                if 0 <= slot_index < self.num_slots:
+                    self.buffer_free[slot_index] = True
+
+    def get_occupancy(self):
+        """Returns the number of slots handed over to the reader and not released yet"""
+        return self.num_slots - sum(self.buffer_free)
 
     def send_ctr_terminate(self):
         os.write(self.fw_ctr_fifo, pack("B", TERMINATE))
         self.logger.info("Terminate signal sent")
 
     def destory_sm_buffer(self):
+        # May be called more than once, the closed file descriptors could already belong to other files
         for memory in self.memories:
             memory.close()
             # memory.unlink()
+        self.memories = []
+        self.headers = []
+        self.buffers = []
 
         if self.fw_ctr_fifo is not None:
             os.close(self.fw_ctr_fifo)
+            self.fw_ctr_fifo = None
 
         if self.bw_ctr_fifo is not None:
             os.close(self.bw_ctr_fifo)
+            self.bw_ctr_fifo = None
 
     def wait_buff_free(self):
-        if self.buffer_free[0]:
-            return 0
-        elif self.buffer_free[1]:
-            return 1
-        else:
-            try:
-                buffer = os.read(self.bw_ctr_fifo, 1)
-                signal = unpack("B", buffer)[0]
-
-                if signal == A_BUFF_READY:
-                    self.buffer_free[0] = True
-                    return 0
-                if signal == B_BUFF_READY:
-                    self.buffer_free[1] = True
-                    return 1
-            except BlockingIOError as err:
-                self.dropped_frame_cntr += 1
-                self.logger.warning(f"Dropping frame.. Total: [{self.dropped_frame_cntr}] ")
-                self.logger.warning(f"Due to: {err}")
+        for slot_index in range(self.num_slots):
+            if self.buffer_free[slot_index]:
+                return slot_index
+
+        try:
+            buffer = os.read(self.bw_ctr_fifo, 1)
+            if not buffer:
+                # The reader side has been closed
+                return -1
+            slot_index = token_to_slot(unpack("B", buffer)[0])
+            if 0 <= slot_index < self.num_slots:
+                self.buffer_free[slot_index] = True
+                return slot_index
+        except BlockingIOError as err:
+            self.dropped_frame_cntr += 1
+            # The reader sees the gap in the sequence numbers
+            self.sequence_number += 1
+            self.logger.warning(f"Dropping frame.. Total: [{self.dropped_frame_cntr}] ")
+            self.logger.warning(f"Due to: {err}")
         return -1
 
 
 class inShmemIface:
-    def __init__(self, shmem_name, ctr_fifo_path="_data_control/", read_timeout=None):
+    def __init__(
+        self,
+        shmem_name,
+        ctr_fifo_path="_data_control/",
+        read_timeout=None,
+        num_slots=DEFAULT_NUM_SLOTS,
+        slot_header=False,
+    ):
+        """
+        Parameters:
+        -----------
+        :param: read_timeout: Timeout of a buffer ready signal [s], blocks if None
+        :param: num_slots: Number of slots in the ring, must match the writer
+        :param: slot_header: The writer puts a header with a sequence number in front of each slot
+        """
         self.init_ok = True
         logging.basicConfig(level=logging.INFO)
         self.logger = logging.getLogger(__name__)
         self.num_read_attempts = int(read_timeout / SLEEP_TIME_BETWEEN_READ_ATTEMPTS) if read_timeout else 1
         self.shmem_name = shmem_name
+        self.num_slots = num_slots
+        self.slot_header = slot_header
+        self.last_sequence_number = -1
+        # Frames the writer dropped or overwrote, detected from the gaps in the sequence numbers
+        self.lost_frames = 0
+        self.held_slots = 0
+        # Highest number of slots held by the reader at the same time
+        self.occupancy_high_water_mark = 0
 
         self.memories = []
+        self.headers = []
         self.buffers = []
         fw_fifo_flags = os.O_RDONLY | os.O_NONBLOCK if read_timeout else os.O_RDONLY
 
@@ -162,60 +293,74 @@ class inShmemIface:
         if self.fw_ctr_fifo is not None:
             signal = self.read_fw_ctr_fifo()
             if signal and signal == INIT_READY:
-                self.memories.append(shared_memory.SharedMemory(name=shmem_name + "_A"))
-                self.memories.append(shared_memory.SharedMemory(name=shmem_name + "_B"))
-                self.buffers.append(
-                    np.ndarray(
-                        (self.memories[0].size,),
-                        dtype=np.uint8,
-                        buffer=self.memories[0].buf,
-                    )
-                )
-                self.buffers.append(
-                    np.ndarray(
-                        (self.memories[1].size,),
-                        dtype=np.uint8,
-                        buffer=self.memories[1].buf,
-                    )
-                )
+                for slot_index in range(num_slots):
+                    memory = shared_memory.SharedMemory(name=slot_shmem_name(shmem_name, slot_index))
+                    header, buffer = map_slot(memory, slot_header)
+                    self.memories.append(memory)
+                    self.headers.append(header)
+                    self.buffers.append(buffer)
             else:
                 self.init_ok = False
 
     def send_ctr_buff_ready(self, active_buffer_index):
-        if active_buffer_index == 0:
-            os.write(self.bw_ctr_fifo, pack("B", A_BUFF_READY))
-        elif active_buffer_index == 1:
-            os.write(self.bw_ctr_fifo, pack("B", B_BUFF_READY))
+        os.write(self.bw_ctr_fifo, pack("B", slot_to_token(active_buffer_index)))
+        self.held_slots = max(self.held_slots - 1, 0)
 
     def destory_sm_buffer(self):
+        # May be called more than once, the closed file descriptors could already belong to other files
         for memory in self.memories:
             memory.close()
+        self.memories = []
+        self.headers = []
+        self.buffers = []
 
         if self.fw_ctr_fifo is not None:
             os.close(self.fw_ctr_fifo)
+            self.fw_ctr_fifo = None
 
         if self.bw_ctr_fifo is not None:
             os.close(self.bw_ctr_fifo)
+            self.bw_ctr_fifo = None
 
     def wait_buff_free(self):
         signal = self.read_fw_ctr_fifo()
         if not signal:
             return -1
-        elif signal == A_BUFF_READY:
-            return 0
-        elif signal == B_BUFF_READY:
-            return 1
         elif signal == TERMINATE:
             return TERMINATE
-        else:
+        slot_index = token_to_slot(signal)
+        if not 0 <= slot_index < self.num_slots:
             return -1
 
+        self.held_slots += 1
+        self.occupancy_high_water_mark = max(self.occupancy_high_water_mark, self.held_slots)
+        if self.slot_header:
+            sequence_number = self.get_sequence_number(slot_index)
+            if self.last_sequence_number >= 0 and sequence_number > self.last_sequence_number + 1:
+                self.lost_frames += sequence_number - self.last_sequence_number - 1
+            self.last_sequence_number = sequence_number
+        return slot_index
+
+    def get_sequence_number(self, slot_index):
+        """Returns the sequence number of the frame in the slot, or -1 if the slot has no valid header"""
+        header = self.headers[slot_index]
+        if header is None or int(header[0]) != SLOT_HEADER_MAGIC:
+            return -1
+        return int(header[1])
+
+    def get_payload_size(self, slot_index):
+        header = self.headers[slot_index]
+        return int(header[2]) if header is not None else self.buffers[slot_index].size
+
     def read_fw_ctr_fifo(self):
         for _ in range(self.num_read_attempts):
             try:
-                signal = unpack("B", os.read(self.fw_ctr_fifo, 1))[0]
+                buffer = os.read(self.fw_ctr_fifo, 1)
             except BlockingIOError:
                 time.sleep(SLEEP_TIME_BETWEEN_READ_ATTEMPTS)
             else:
-                return signal
+                if buffer:
+                    return unpack("B", buffer)[0]
+                # The writer side has been closed
+                time.sleep(SLEEP_TIME_BETWEEN_READ_ATTEMPTS)
         return None
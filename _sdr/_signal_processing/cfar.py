@@ -0,0 +1,190 @@
+# KrakenSDR Signal Processor - CFAR detector
+#
+# Copyright (C) 2018-2021  Carl Laufer, Tamás Pető
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#
+# - coding: utf-8 -*-
+
+# Signal detection for the "CFAR" VFO mode, where the VFOs are assigned automatically to the signals present in the
+# spectrum.
+#
+# The cell averaging CFAR (constant false alarm rate) detector compares every bin with the mean power of the
+# training cells on both sides of it (leaving out the guard cells next to it). The training sums of all bins come
+# from a single cumulative sum, so the detector is O(N). Neighbouring detections are merged into signals, and the
+# signals are tracked over the frames with hysteresis: a signal gets a VFO after AUTO_VFO_ACQUIRE_FRAMES consecutive
+# detections and keeps it until it has been missing for AUTO_VFO_RELEASE_FRAMES frames.
+
+import numpy as np
+
+CFAR_GUARD_CELLS = 8  # [bins] on each side
+CFAR_TRAINING_CELLS = 32  # [bins] on each side
+CFAR_THRESHOLD_DB = 10.0  # Detection threshold above the mean of the training cells
+CFAR_MERGE_GAP = 2  # [bins] Detections closer than this belong to the same signal
+AUTO_VFO_MIN_BW = 2500  # [Hz]
+AUTO_VFO_BW_MARGIN = 1.2  # Bandwidth of the VFO relative to the detected width of the signal
+AUTO_VFO_ACQUIRE_FRAMES = 2
+AUTO_VFO_RELEASE_FRAMES = 10
+AUTO_VFO_SMOOTHING = 0.5  # Weight of the new detection in the tracked frequency and bandwidth
+
+
+def ca_cfar(spectrum, guard_cells=CFAR_GUARD_CELLS, training_cells=CFAR_TRAINING_CELLS, threshold_db=CFAR_THRESHOLD_DB):
+    """
+    Cell averaging CFAR detector, returns the detection mask of the bins
+
+    Parameters:
+    -----------
+    :param: spectrum: Power spectrum [dB]
+    :param: guard_cells: Number of bins left out on each side of the bin under test
+    :param: training_cells: Number of bins on each side of the bin under test used for the noise estimation
+    :param: threshold_db: Detection threshold above the noise estimation [dB]
+    """
+    power = 10 ** (np.asarray(spectrum, dtype=np.float64) / 10)
+    size = power.size
+    prefix_sum = np.concatenate(([0.0], np.cumsum(power)))
+    bins = np.arange(size)
+
+    # The training windows are cut at the edges of the spectrum
+    left_start = np.clip(bins - guard_cells - training_cells, 0, size)
+    left_end = np.clip(bins - guard_cells, 0, size)
+    right_start = np.clip(bins + guard_cells + 1, 0, size)
+    right_end = np.clip(bins + guard_cells + training_cells + 1, 0, size)
+
+    training_sum = prefix_sum[left_end] - prefix_sum[left_start] + prefix_sum[right_end] - prefix_sum[right_start]
+    training_count = (left_end - left_start) + (right_end - right_start)
+    noise = training_sum / np.maximum(training_count, 1)
+    return power > noise * 10 ** (threshold_db / 10)
+
+
+def cluster_detections(detections, spectrum, freqs, merge_gap=CFAR_MERGE_GAP):
+    """
+    Merges the neighbouring detected bins into signals.
+    Returns the power weighted center frequency, the width [Hz] and the peak level [dB] of each signal.
+
+    Parameters:
+    -----------
+    :param: detections: Detection mask of the bins
+    :param: spectrum: Power spectrum [dB]
+    :param: freqs: Increasing, equally spaced frequencies of the bins
+    :param: merge_gap: Detections closer than this many bins are merged
+    """
+    indices = np.flatnonzero(detections)
+    if not indices.size:
+        return np.empty(0), np.empty(0), np.empty(0)
+
+    breaks = np.flatnonzero(np.diff(indices) > merge_gap + 1)
+    first = np.concatenate(([0], breaks + 1))
+    last = np.concatenate((breaks, [indices.size - 1]))
+
+    levels = np.asarray(spectrum, dtype=np.float64)[indices]
+    power = 10 ** (levels / 10)
+    center_freqs = np.add.reduceat(power * freqs[indices], first) / np.add.reduceat(power, first)
+    bin_width = freqs[1] - freqs[0] if freqs.size > 1 else 0
+    widths = (indices[last] - indices[first] + 1) * bin_width
+    return center_freqs, widths, np.maximum.reduceat(levels, first)
+
+
+class AutoVFOTrack:
+    def __init__(self, freq, bw, level):
+        self.freq = freq
+        self.bw = bw
+        self.level = level
+        self.hits = 1
+        self.misses = 0
+        self.vfo = None  # Index of the assigned VFO
+
+
+class AutoVFOTracker:
+    def __init__(
+        self,
+        acquire_frames=AUTO_VFO_ACQUIRE_FRAMES,
+        release_frames=AUTO_VFO_RELEASE_FRAMES,
+        smoothing=AUTO_VFO_SMOOTHING,
+    ):
+        """
+        Parameters:
+        -----------
+        :param: acquire_frames: Consecutive detections needed before a signal gets a VFO
+        :param: release_frames: Missed frames after which a signal loses its VFO
+        :param: smoothing: Weight of the new detection in the tracked frequency and bandwidth
+        """
+        self.acquire_frames = acquire_frames
+        self.release_frames = release_frames
+        self.smoothing = smoothing
+        self.tracks = []
+
+    def reset(self):
+        """Drops every tracked signal, e.g. after retuning"""
+        self.tracks = []
+
+    def update(self, freqs, bws, levels, vfo_number):
+        """
+        Updates the tracked signals with the signals detected in a new frame and assigns the VFOs.
+        Returns a list of (frequency, bandwidth, detected) tuples for each VFO, or None for the unused VFOs.
+        detected is False while a signal is missing but has not been released yet.
+
+        Parameters:
+        -----------
+        :param: freqs: Center frequencies of the detected signals
+        :param: bws: Bandwidths of the detected signals
+        :param: levels: Peak levels of the detected signals [dB]
+        :param: vfo_number: Number of VFOs that can be assigned
+        """
+        matched = set()
+        # The strongest signals are matched first
+        for k in np.argsort(levels)[::-1]:
+            freq, bw, level = freqs[k], bws[k], levels[k]
+            candidates = [
+                track
+                for track in self.tracks
+                if id(track) not in matched and abs(track.freq - freq) <= max(track.bw, bw) / 2
+            ]
+            if candidates:
+                track = min(candidates, key=lambda track: abs(track.freq - freq))
+                track.freq += self.smoothing * (freq - track.freq)
+                track.bw += self.smoothing * (bw - track.bw)
+                track.level = level
+                track.hits += 1
+                track.misses = 0
+            else:
+                track = AutoVFOTrack(freq, bw, level)
+                self.tracks.append(track)
+            matched.add(id(track))
+
+        for track in self.tracks:
+            if id(track) not in matched:
+                track.misses += 1
+                track.hits = 0
+        self.tracks = [track for track in self.tracks if track.misses <= self.release_frames]
+
+        # Signals keep their VFO, the free VFOs go to the strongest newly confirmed signals
+        used_vfos = set()
+        for track in self.tracks:
+            if track.vfo is not None and track.vfo < vfo_number:
+                used_vfos.add(track.vfo)
+            else:
+                track.vfo = None
+        free_vfos = [i for i in range(vfo_number) if i not in used_vfos]
+        for track in sorted(self.tracks, key=lambda track: track.level, reverse=True):
+            if not free_vfos:
+                break
+            if track.vfo is None and track.hits >= self.acquire_frames:
+                track.vfo = free_vfos.pop(0)
+
+        vfos = [None] * vfo_number
+        for track in self.tracks:
+            if track.vfo is not None:
+                vfos[track.vfo] = (track.freq, track.bw, track.misses == 0)
+        return vfos
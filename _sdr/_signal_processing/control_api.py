@@ -0,0 +1,235 @@
+# KrakenSDR Signal Processor - Local control API
+#
+# Copyright (C) 2018-2021  Carl Laufer, Tamás Pető
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#
+# - coding: utf-8 -*-
+
+# HTTP control API on the loopback interface, for local tools that need to reconfigure the DSP chain quickly
+# (frequency, gain, VFOs, DoA method, ...) without rewriting settings.json and waiting for the file watcher.
+#
+#   GET  /settings  Current settings, same keys as settings.json
+#   GET  /status    Receiver state and whether the last change has been applied
+#   POST /settings  JSON object with the settings to change, e.g. {"center_freq": 433.5, "vfo_freq_0": 433500000}
+#
+# A POST is applied as one settings snapshot at the next frame boundary, the response is sent once the signal
+# processor has applied it, and after a center frequency change, once the frames arrive from the new frequency.
+# settings.json is updated in the background after the changes have settled for SETTINGS_PERSIST_DELAY.
+
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from kraken_sdr_settings import (
+    CONFIG_APPLY_TIMEOUT,
+    RECEIVER_SETTINGS_KEYS,
+    apply_receiver_settings,
+    configure_signal_processor,
+    get_center_freq_mhz,
+)
+from output_dispatcher import write_file_atomic
+from scan_scheduler import SCAN_FREQ_TOLERANCE
+from settings_watcher import get_changed_keys
+
+CONTROL_API_HOST = "127.0.0.1"
+CONTROL_API_DEFAULT_PORT = 8043
+CONTROL_API_MAX_REQUEST_SIZE = 64 * 1024  # [byte]
+RETUNE_TIMEOUT = 5.0  # [s]
+RETUNE_POLL_INTERVAL = 0.01  # [s]
+SETTINGS_PERSIST_DELAY = 1.0  # [s]
+
+
+class ControlRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        control_api = self.server.control_api
+        if self.path == "/settings":
+            self.send_json(200, control_api.get_settings())
+        elif self.path == "/status":
+            self.send_json(200, control_api.get_status())
+        else:
+            self.send_json(404, {"error": f"Unknown path: {self.path}"})
+
+    def do_POST(self):
+        if self.path != "/settings":
+            self.send_json(404, {"error": f"Unknown path: {self.path}"})
+            return
+
+        length = int(self.headers.get("Content-Length", 0))
+        if length > CONTROL_API_MAX_REQUEST_SIZE:
+            self.send_json(413, {"error": "Request too large"})
+            return
+        try:
+            changes = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError as e:
+            self.send_json(400, {"error": f"Invalid JSON: {e}"})
+            return
+        if not isinstance(changes, dict):
+            self.send_json(400, {"error": "Expected a JSON object"})
+            return
+
+        self.send_json(*self.server.control_api.apply_changes(changes))
+
+    def send_json(self, status, content):
+        body = json.dumps(content).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        self.server.control_api.logger.debug(format % args)
+
+
+class ControlAPI:
+    def __init__(
+        self,
+        module_signal_processor,
+        module_receiver,
+        settings,
+        settings_file_path,
+        port=CONTROL_API_DEFAULT_PORT,
+        logging_level=10,
+    ):
+        """
+        Parameters:
+        -----------
+        :param: module_signal_processor: Signal processor to configure
+        :param: module_receiver: Receiver to retune
+        :param: settings: Settings that are already applied
+        :param: settings_file_path: The changes are persisted to this file
+        :param: port: TCP port on the loopback interface
+        """
+        self.logger = logging.getLogger(__name__)
+        self.logger.setLevel(logging_level)
+        self.module_signal_processor = module_signal_processor
+        self.module_receiver = module_receiver
+        self.settings_file_path = settings_file_path
+        self.port = port
+        self.settings = {key: value for key, value in settings.items() if key != "timestamp"}
+        self.lock = threading.Lock()
+        self.persist_timer = None
+        self.server = None
+
+    def start(self):
+        self.server = ThreadingHTTPServer((CONTROL_API_HOST, self.port), ControlRequestHandler)
+        self.server.daemon_threads = True
+        self.server.control_api = self
+        threading.Thread(target=self.server.serve_forever, name="control_api", daemon=True).start()
+        self.logger.info(f"Control API listening on http://{CONTROL_API_HOST}:{self.port}")
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+        with self.lock:
+            pending = self.persist_timer is not None
+            if pending:
+                self.persist_timer.cancel()
+                self.persist_timer = None
+        if pending:
+            self.persist()
+
+    def update_settings(self, settings):
+        """
+        Follows the changes of the settings file made by others (web interface, node middleware)
+        """
+        with self.lock:
+            self.settings = {key: value for key, value in settings.items() if key != "timestamp"}
+
+    def get_settings(self):
+        with self.lock:
+            return dict(self.settings)
+
+    def get_status(self):
+        iq_header = self.module_receiver.iq_header
+        return {
+            "connected": bool(self.module_receiver.receiver_connection_status),
+            "center_freq_hz": int(self.module_receiver.daq_center_freq),
+            "rf_center_freq_hz": int(iq_header.rf_center_freq),
+            "gain_db": self.module_receiver.daq_rx_gain,
+            "config_applied": self.module_signal_processor.config_applied.is_set(),
+            "processing": bool(self.module_signal_processor.is_running),
+        }
+
+    def apply_changes(self, changes):
+        """
+        Applies the changed settings, returns the HTTP status and the response content
+
+        Parameters:
+        -----------
+        :param: changes: Settings to change, with the keys of settings.json
+        """
+        start_time = time.time()
+        with self.lock:
+            settings = {**self.settings, **changes}
+            changed_keys = get_changed_keys(settings, self.settings)
+            if not changed_keys:
+                return 200, {"changed": [], "applied": True, "elapsed_ms": 0.0}
+            try:
+                configure_signal_processor(self.module_signal_processor, settings)
+            except (TypeError, ValueError, AttributeError) as e:
+                return 400, {"error": f"Invalid settings: {e}"}
+            if changed_keys & RECEIVER_SETTINGS_KEYS:
+                apply_receiver_settings(self.module_receiver, settings)
+            self.settings = settings
+            self.schedule_persist()
+
+        applied = self.module_signal_processor.wait_config_applied(CONFIG_APPLY_TIMEOUT)
+        if "center_freq" in changed_keys and self.module_receiver.receiver_connection_status:
+            applied = self.wait_for_center_freq(get_center_freq_mhz(settings) * 10**6) and applied
+        self.logger.info(f"Control API changed: {', '.join(sorted(changed_keys))}")
+        return (200 if applied else 504), {
+            "changed": sorted(changed_keys),
+            "applied": applied,
+            "elapsed_ms": round((time.time() - start_time) * 1000, 1),
+        }
+
+    def wait_for_center_freq(self, center_freq):
+        """
+        Waits until the frames arrive from the new center frequency [Hz], returns False on timeout
+        """
+        deadline = time.time() + RETUNE_TIMEOUT
+        while abs(self.module_receiver.iq_header.rf_center_freq - center_freq) > SCAN_FREQ_TOLERANCE:
+            if time.time() > deadline:
+                return False
+            time.sleep(RETUNE_POLL_INTERVAL)
+        return True
+
+    def schedule_persist(self):
+        """
+        (Re)starts the persist timer, called with the lock held
+        """
+        if self.persist_timer is not None:
+            self.persist_timer.cancel()
+        self.persist_timer = threading.Timer(SETTINGS_PERSIST_DELAY, self.persist)
+        self.persist_timer.daemon = True
+        self.persist_timer.start()
+
+    def persist(self):
+        """
+        Writes the settings to the settings file. The file is replaced atomically, so the settings file watchers
+        never read a partially written file.
+        """
+        with self.lock:
+            self.persist_timer = None
+            settings = dict(self.settings)
+        try:
+            write_file_atomic(self.settings_file_path, json.dumps(settings, indent=2))
+        except OSError as e:
+            self.logger.error(f"Failed to save the settings file: {e}")
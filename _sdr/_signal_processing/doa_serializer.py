@@ -0,0 +1,103 @@
+# KrakenSDR Signal Processor - DoA serializer
+#
+# Copyright (C) 2018-2021  Carl Laufer, Tamás Pető
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#
+# - coding: utf-8 -*-
+
+# Serialization of the DoA spectra (doa_result_log, one value per degree) shared by the outputs.
+#
+# The spectra are sent normalized, shifted so their minimum is 0 dB, either as text with two decimals or, more
+# compactly, as base64 encoded little endian int16 values in centi-dB (value [dB] = int16 / 100).
+#
+# The outputs of a frame (Kraken App file, data recording, Kraken Pro, Full POST) get the same spectrum arrays, each
+# of them is serialized only once: the results are cached by array, until the spectra of the newer frames push the
+# array out of the cache.
+
+import base64
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# Encodings of the DoA spectra
+DOA_SPECTRUM_TEXT = "text"  # Values with two decimals, e.g. "12.34, 0.00, 3.21"
+DOA_SPECTRUM_INT16_BASE64 = "int16_base64"  # Values in centi-dB as little endian int16, base64 encoded
+DOA_SPECTRUM_ENCODINGS = (DOA_SPECTRUM_TEXT, DOA_SPECTRUM_INT16_BASE64)
+
+DOA_SPECTRUM_DECIMALS = 2
+DOA_SPECTRUM_SEPARATOR = ", "
+# Spectra cached, one per VFO of the last frames
+DOA_SPECTRUM_CACHE_SIZE = 64
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_text_templates = {}
+
+
+def normalize_doa_spectrum(doa_result_log):
+    """
+    Returns the spectrum shifted so its minimum is 0 dB (the spectrum in dB is not positive)
+    """
+    doa_result_log = np.asarray(doa_result_log, dtype=np.float64)
+    if doa_result_log.size == 0:
+        return doa_result_log
+    return doa_result_log + np.abs(np.min(doa_result_log))
+
+
+def _get_text_template(size):
+    # One format string for the whole spectrum, formatted in a single call, the same text as "{:.2f}" per value
+    template = _text_templates.get(size)
+    if template is None:
+        template = DOA_SPECTRUM_SEPARATOR.join([f"%.{DOA_SPECTRUM_DECIMALS}f"] * size)
+        _text_templates[size] = template
+    return template
+
+
+def _serialize(doa_result_log, encoding):
+    values = normalize_doa_spectrum(doa_result_log)
+    if encoding == DOA_SPECTRUM_TEXT:
+        return _get_text_template(values.size) % tuple(values.tolist())
+    if encoding == DOA_SPECTRUM_INT16_BASE64:
+        centi_db = np.clip(np.rint(values * 100), np.iinfo(np.int16).min, np.iinfo(np.int16).max)
+        return base64.b64encode(centi_db.astype("<i2").tobytes()).decode("ascii")
+    raise ValueError(f"Invalid DoA spectrum encoding: {encoding}")
+
+
+def serialize_doa_spectrum(doa_result_log, encoding=DOA_SPECTRUM_TEXT):
+    """
+    Returns the normalized DoA spectrum serialized, the values separated with ", " in the text encoding.
+    The result is cached, the array must not be modified after it has been serialized.
+
+    Parameters:
+    -----------
+    :param: doa_result_log: DoA spectrum [dB]
+    :param: encoding: DOA_SPECTRUM_TEXT or DOA_SPECTRUM_INT16_BASE64
+    """
+    key = (id(doa_result_log), encoding)
+    with _cache_lock:
+        cached = _cache.get(key)
+        # The cache holds the arrays, so the id of a cached array is not reused by another one
+        if cached is not None:
+            _cache.move_to_end(key)
+            return cached[1]
+
+    serialized = _serialize(doa_result_log, encoding)
+    with _cache_lock:
+        _cache[key] = (doa_result_log, serialized)
+        while len(_cache) > DOA_SPECTRUM_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return serialized
@@ -0,0 +1,184 @@
+# KrakenSDR Signal Processor - HTTP client
+#
+# Copyright (C) 2018-2021  Carl Laufer, Tamás Pető
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#
+# - coding: utf-8 -*-
+
+# Shared HTTP client of the network outputs (RDF Mapper, Full POST, public IP lookup).
+#
+# The posts go through one keep-alive session, so the connections to the servers are reused instead of opened for
+# every result. The number of requests in flight is bounded by the size of the connection pool and every request
+# has a connect and a read timeout. The posts are made from the worker threads of the output dispatcher, whose
+# bounded backlogs drop the oldest results when a server is too slow.
+#
+# Values that have to be looked up over the network (public IP) are cached and refreshed in the background, the
+# outputs always get the cached value without waiting.
+
+import logging
+import threading
+import time
+
+HTTP_MAX_IN_FLIGHT = 4  # Also the number of pooled connections per server
+HTTP_CONNECT_TIMEOUT = 3.05  # [s]
+HTTP_READ_TIMEOUT = 5  # [s]
+
+PUBLIC_IP_URL = "https://ip.seeip.org/jsonip?"
+PUBLIC_IP_DEFAULT = "127.0.0.1"
+PUBLIC_IP_REFRESH_INTERVAL = 600  # [s]
+PUBLIC_IP_RETRY_INTERVAL = 60  # [s]
+
+
+class HTTPClient:
+    def __init__(self, max_in_flight=HTTP_MAX_IN_FLIGHT, logging_level=10):
+        """
+        Parameters:
+        -----------
+        :param: max_in_flight: Maximum number of requests in flight, the other requests wait for a free connection
+        """
+        self.logger = logging.getLogger(__name__)
+        self.logger.setLevel(logging_level)
+        self.max_in_flight = max_in_flight
+        self.timeout = (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+        self.session = None
+        self.slots = threading.BoundedSemaphore(max_in_flight)
+        self.lock = threading.Lock()
+
+        # Metrics
+        self.in_flight = 0
+        self.requests = 0
+        self.errors = 0
+        self.last_latency = 0.0  # [s]
+
+    def get_session(self):
+        # requests is only needed by the network outputs, it is imported on first use to keep the start up fast
+        with self.lock:
+            if self.session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=self.max_in_flight, pool_maxsize=self.max_in_flight)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self.session = session
+            return self.session
+
+    def request(self, method, url, **kwargs):
+        """
+        Sends a request through the pooled session, raises on connection errors, timeouts and error responses
+
+        Parameters:
+        -----------
+        :param: method: HTTP method, e.g. "POST"
+        :param: url: Address of the server
+        :param: kwargs: Passed to requests.Session.request(), e.g. data or json
+        """
+        session = self.get_session()
+        with self.slots:
+            with self.lock:
+                self.in_flight += 1
+                self.requests += 1
+            start_time = time.time()
+            try:
+                response = session.request(method, url, timeout=self.timeout, **kwargs)
+                response.raise_for_status()
+                return response
+            except Exception:
+                with self.lock:
+                    self.errors += 1
+                raise
+            finally:
+                with self.lock:
+                    self.in_flight -= 1
+                    self.last_latency = time.time() - start_time
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                "in_flight": self.in_flight,
+                "requests": self.requests,
+                "errors": self.errors,
+                "last_latency_ms": round(self.last_latency * 1000, 1),
+            }
+
+
+class CachedValue:
+    """
+    Value looked up by a slow function, get() returns the cached value and starts a refresh in the background when
+    it is outdated. Only one refresh runs at a time.
+    """
+
+    def __init__(self, name, lookup, default, refresh_interval, retry_interval, logger):
+        """
+        Parameters:
+        -----------
+        :param: name: Name of the value, used in the log messages
+        :param: lookup: Function returning the current value, it may raise
+        :param: default: Returned until the first lookup succeeded
+        :param: refresh_interval: Age of the value when it is looked up again [s]
+        :param: retry_interval: Time before the next lookup after a failed one [s]
+        """
+        self.name = name
+        self.lookup = lookup
+        self.value = default
+        self.refresh_interval = refresh_interval
+        self.retry_interval = retry_interval
+        self.logger = logger
+        self.next_refresh_time = 0.0
+        self.refreshing = False
+        self.lock = threading.Lock()
+
+    def get(self):
+        with self.lock:
+            if not self.refreshing and time.time() >= self.next_refresh_time:
+                self.refreshing = True
+                threading.Thread(target=self.refresh, name=f"refresh_{self.name}", daemon=True).start()
+            return self.value
+
+    def refresh(self):
+        try:
+            value = self.lookup()
+            next_refresh_time = time.time() + self.refresh_interval
+        except Exception as e:
+            self.logger.warning(f"Failed to look up the {self.name}: {e}")
+            value = None
+            next_refresh_time = time.time() + self.retry_interval
+        with self.lock:
+            if value is not None:
+                self.value = value
+            self.next_refresh_time = next_refresh_time
+            self.refreshing = False
+
+
+def public_ip_lookup(http_client):
+    """
+    Returns a CachedValue holding the public IP address of the station
+    """
+    return CachedValue(
+        "public IP",
+        lambda: http_client.get(PUBLIC_IP_URL).json()["ip"],
+        PUBLIC_IP_DEFAULT,
+        PUBLIC_IP_REFRESH_INTERVAL,
+        PUBLIC_IP_RETRY_INTERVAL,
+        http_client.logger,
+    )
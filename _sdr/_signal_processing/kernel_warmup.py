@@ -0,0 +1,200 @@
+# KrakenSDR Signal Processor - Numba kernel warmup
+#
+# Copyright (C) 2018-2021  Carl Laufer, Tamás Pető
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#
+# - coding: utf-8 -*-
+
+# The DSP kernels are decorated with @njit(cache=True), so they are compiled on their first call
+# (or loaded from the on-disk cache). Without a warmup the first processed data frame pays for all
+# of that, which can take a minute or more on a Pi. This module calls every kernel once with
+# synthetic data of the same dtypes and layouts the processing chain uses at runtime.
+#
+# It can be run at install time to populate the numba cache:
+#   python3 _sdr/_signal_processing/kernel_warmup.py
+
+import logging
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+DEFAULT_WARMUP_CHANNEL_NUMBER = 5
+WARMUP_SAMPLE_LENGTH = 2**14
+WARMUP_SAMPLING_FREQ = 2_400_000
+WARMUP_VFO_BW = 12500
+
+_kernel_warmup = None
+_kernel_warmup_lock = threading.Lock()
+
+
+def warmup_kernels(channel_number=DEFAULT_WARMUP_CHANNEL_NUMBER):
+    """
+    Compiles (or loads from cache) the numba kernels of the signal processor.
+
+    Parameters:
+    -----------
+    :param: channel_number: Number of antenna channels used to shape the synthetic data
+
+    Returns a dict with the wall time spent in each kernel in seconds.
+    """
+    # Imported here, as the signal processor module starts the warmup itself
+    import kraken_sdr_signal_processor as sp
+
+    logger = logging.getLogger(__name__)
+    timings = {}
+
+    def timed(name, kernel, *args):
+        # A kernel that fails to compile must not keep the others from being warmed up
+        start_time = time.perf_counter()
+        try:
+            result = kernel(*args)
+        except Exception as e:
+            logger.warning(f"Warmup of {name} failed: {str(e).splitlines()[0]}")
+            result = None
+        timings[name] = timings.get(name, 0.0) + time.perf_counter() - start_time
+        return result
+
+    rng = np.random.default_rng(0)
+    iq_samples = (
+        rng.standard_normal((channel_number, WARMUP_SAMPLE_LENGTH))
+        + 1j * rng.standard_normal((channel_number, WARMUP_SAMPLE_LENGTH))
+    ).astype(np.complex64)
+
+    # Channelizer, the shift filter is float64 * complex128, the channel is complex128 * complex128
+    decimation_factor = WARMUP_SAMPLING_FREQ // WARMUP_VFO_BW
+    vfo_channel = timed(
+        "channelize",
+        sp.channelize,
+        iq_samples,
+        100_000.0,
+        decimation_factor,
+        sp.DEFAULT_VFO_FIR_ORDER_FACTOR,
+        WARMUP_SAMPLING_FREQ,
+    )
+
+    # Correlation matrices show up both in single and double precision depending on the decorrelation method
+    R = sp.corr_matrix(iq_samples)
+    R_channel = sp.corr_matrix(vfo_channel)
+    scanning_vectors = sp.gen_scanning_vectors(channel_number, 0.5, "ULA", 0)
+    custom_scanning_vectors = timed(
+        "gen_scanning_vectors_custom",
+        sp.gen_scanning_vectors_custom,
+        channel_number,
+        np.linspace(0.1, 0.5, channel_number),
+        np.linspace(0.1, 0.5, channel_number),
+    )
+
+    DOA_thetas = np.linspace(0, 359, 360)
+    doa_gauss = None
+    for corr in (R, R_channel):
+        doa_music = timed("DOA_MUSIC", sp.DOA_MUSIC, corr, scanning_vectors, 1)
+        timed("DOA_MUSIC", sp.DOA_MUSIC, corr, custom_scanning_vectors, 1)
+        doa_tna = timed("DOA_TNA", sp.DOA_TNA, corr, scanning_vectors)
+        for is_vula, array_offset in ((False, 0.0), (True, 0.0), (False, 0)):
+            doas = timed("doa_root_music", sp.doa_root_music, corr, 1, is_vula, 0.5, array_offset)
+            if doas is not None:
+                doa_gauss = timed(
+                    "normalized_gaussian", sp.normalized_gaussian, DOA_thetas, doas, sp.DEFAULT_ROOT_MUSIC_STD_DEGREES
+                )
+
+        for DOA in (doa_music, doa_tna, doa_gauss):
+            if DOA is None:
+                continue
+            timed("numba_isfinite", sp.numba_isfinite, DOA)
+            timed("DOA_plot_util", sp.DOA_plot_util, DOA)
+            timed("calculate_doa_papr", sp.calculate_doa_papr, DOA)
+
+    spectrum = np.ones((channel_number + 3, 4096), dtype=np.float32)
+    timed("reduce_spectrum", sp.reduce_spectrum, spectrum, 1024, channel_number)
+
+    return timings
+
+
+def get_process_start_time():
+    """
+    Returns the wall clock time when the current process was started or None if it can not be determined.
+    Used to report how long the imports and initialization took before the signal processor was created.
+    """
+    try:
+        with open("/proc/self/stat", "r") as stat_file:
+            # The process name can contain spaces, the fields are counted from its closing bracket
+            start_ticks = int(stat_file.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/stat", "r") as stat_file:
+            boot_time = next(int(line.split()[1]) for line in stat_file if line.startswith("btime"))
+        return boot_time + start_ticks / os.sysconf("SC_CLK_TCK")
+    except Exception:
+        return None
+
+
+class KernelWarmup(threading.Thread):
+    """
+    Runs warmup_kernels() in the background, so the kernels are ready by the time the first data frame arrives.
+    """
+
+    def __init__(self, channel_number=DEFAULT_WARMUP_CHANNEL_NUMBER, logging_level=10):
+        super(KernelWarmup, self).__init__(name="kernel_warmup", daemon=True)
+        self.logger = logging.getLogger(__name__)
+        self.logger.setLevel(logging_level)
+        self.channel_number = channel_number
+        self.timings = {}
+        self.elapsed = None
+        self.finished = threading.Event()
+
+    def run(self):
+        start_time = time.perf_counter()
+        try:
+            self.timings = warmup_kernels(self.channel_number)
+        except Exception:
+            self.logger.exception("Numba kernel warmup failed, kernels will be compiled on first use")
+        finally:
+            self.elapsed = time.perf_counter() - start_time
+            self.finished.set()
+        self.logger.info(f"Numba kernel warmup finished in {self.elapsed:.2f} s")
+
+
+def start_kernel_warmup(logging_level=10):
+    """
+    Starts the background warmup once per process and returns its thread.
+    The signal processor is recreated on DAQ reconfiguration, the kernels only need to be compiled once.
+    """
+    global _kernel_warmup
+    with _kernel_warmup_lock:
+        if _kernel_warmup is None:
+            _kernel_warmup = KernelWarmup(logging_level=logging_level)
+            _kernel_warmup.start()
+    return _kernel_warmup
+
+
+if __name__ == "__main__":
+    # Standalone run, e.g. at install time. The shared UI variables set up the paths of the receiver and the
+    # signal processor modules, they are imported first.
+    current_path = os.path.dirname(os.path.realpath(__file__))
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(current_path)), "_ui/_web_interface"))
+    import variables  # noqa: F401
+
+    import_start_time = time.perf_counter()
+    import kraken_sdr_signal_processor  # noqa: F401
+
+    print(f"Signal processor import: {time.perf_counter() - import_start_time:.2f} s")
+
+    warmup_start_time = time.perf_counter()
+    kernel_timings = warmup_kernels()
+    for kernel_name, kernel_time in sorted(kernel_timings.items(), key=lambda item: -item[1]):
+        print(f"{kernel_name:>28}: {kernel_time:.3f} s")
+    print(f"Kernel warmup: {time.perf_counter() - warmup_start_time:.2f} s")
@@ -0,0 +1,465 @@
+# KrakenSDR Signal Processor - DSP process
+#
+# Copyright (C) 2018-2021  Carl Laufer, Tamás Pető
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#
+# - coding: utf-8 -*-
+
+# Runs the receiver and the signal processor in their own process, so the web interface (plot serialization,
+# callbacks) does not compete with the DSP loop for the GIL.
+#
+# The web interface keeps a receiver and a signal processor object that are never started. They hold the
+# configuration exactly as before, the callbacks keep modifying them, and the changes are forwarded to the
+# DSP process in batches, each batch is applied by the signal processor at the next frame boundary. The results
+# published on the result bus of the DSP process travel back a frame at a time through a shared memory channel,
+# which the web interface reads like a result bus subscription.
+
+import collections
+import logging
+import multiprocessing
+import pickle
+import queue
+import struct
+import threading
+import time
+import zlib
+
+import numpy as np
+from result_bus import FrameStatus
+
+RESULT_CHANNEL_SIZE = 8 * 1024 * 1024  # [byte]
+RESULT_CHANNEL_HEADER_SIZE = 16  # [byte] sequence number and payload length
+# Written after the payload: copy of the sequence number, payload length and CRC-32 of the payload
+RESULT_CHANNEL_TRAILER_FORMAT = "<QII"
+RESULT_CHANNEL_TRAILER_SIZE = struct.calcsize(RESULT_CHANNEL_TRAILER_FORMAT)  # [byte]
+# A packet that is still inconsistent after this many reads is skipped
+RESULT_CHANNEL_MAX_READ_ATTEMPTS = 3
+RESULT_CHANNEL_POLL_INTERVAL = 0.005  # [s]
+CONFIG_SYNC_INTERVAL = 0.05  # [s]
+COMMAND_TIMEOUT = 10  # [s]
+
+# Signal processor fields modified by the web interface at runtime
+SYNCED_SIGNAL_PROCESSOR_ATTRIBUTES = (
+    "run_processing",
+    "spectrum_consumers",
+    "en_DOA_estimation",
+    "DOA_algorithm",
+    "DOA_ant_alignment",
+    "DOA_decorrelation_method",
+    "DOA_expected_num_of_sources",
+    "DOA_inter_elem_space",
+    "DOA_UCA_radius_m",
+    "DOA_data_format",
+    "doa_measure",
+    "ula_direction",
+    "array_offset",
+    "custom_array_x",
+    "custom_array_y",
+    "compass_offset",
+    "station_id",
+    "latitude",
+    "longitude",
+    "heading",
+    "fixed_heading",
+    "usegps",
+    "gps_min_speed_for_valid_heading",
+    "gps_min_duration_for_valid_heading",
+    "krakenpro_key",
+    "RDF_mapper_server",
+    "output_spool_mode",
+    "doa_spectrum_encoding",
+    "en_data_record",
+    "data_recording_file_name",
+    "write_interval",
+    "en_peak_hold",
+    "spectrum_fig_type",
+    "vfo_mode",
+    "vfo_default_squelch_mode",
+    "vfo_default_demod",
+    "vfo_default_iq",
+    "max_demod_timeout",
+    "dsp_decimation",
+    "active_vfos",
+    "output_vfo",
+    "optimize_short_bursts",
+    "vfo_bw",
+    "vfo_fir_order_factor",
+    "vfo_freq",
+    "vfo_squelch_mode",
+    "vfo_squelch",
+    "vfo_demod",
+    "vfo_iq",
+    "overload_steps",
+    "en_scan",
+    "scan_hops",
+    "scan_dwell_frames",
+)
+
+
+class ResultChannel:
+    """
+    Latest-value channel in shared memory between a single writer and a single reader process.
+
+    The writer never waits for the reader: a new packet overwrites the previous one, and a reader that is slower
+    than the writer simply skips packets. Consistency is ensured with a sequence number (seqlock): it is odd
+    while a write is in progress, and the reader retries if it changed during the copy.
+
+    The stores of the writer are not guaranteed to become visible in order to the reader (e.g. on ARM), so the
+    sequence number alone does not prove the payload is complete. The payload is followed by a trailer holding a
+    copy of the sequence number, the length and a checksum, a packet whose trailer does not match is read again
+    and skipped if it still does not match after RESULT_CHANNEL_MAX_READ_ATTEMPTS reads.
+
+    put() and get() follow the queue.Queue interface, so the channel is a drop-in replacement for the signal
+    processor data que.
+    """
+
+    def __init__(self, buffer):
+        """
+        Parameters:
+        -----------
+        :param: buffer: Shared memory buffer created with new_result_buffer()
+        """
+        self.buffer = np.frombuffer(buffer, dtype=np.uint8)
+        self.header = self.buffer[:RESULT_CHANNEL_HEADER_SIZE].view(np.uint64)
+        self.payload = self.buffer[RESULT_CHANNEL_HEADER_SIZE:]
+        self.last_sequence_number = 0
+        self.failed_sequence_number = 0
+        self.failed_reads = 0
+
+        # Metrics
+        self.skipped_packets = 0
+
+    def put(self, item, block=True, timeout=None):
+        data = pickle.dumps(item, protocol=pickle.HIGHEST_PROTOCOL)
+        length = len(data)
+        if length + RESULT_CHANNEL_TRAILER_SIZE > self.payload.size:
+            raise queue.Full(f"Packet size {length} exceeds the channel size {self.payload.size}")
+
+        sequence_number = int(self.header[0])
+        trailer = struct.pack(RESULT_CHANNEL_TRAILER_FORMAT, sequence_number + 2, length, zlib.crc32(data))
+        self.header[0] = sequence_number + 1
+        self.payload[:length] = np.frombuffer(data, dtype=np.uint8)
+        self.payload[length : length + RESULT_CHANNEL_TRAILER_SIZE] = np.frombuffer(trailer, dtype=np.uint8)
+        self.header[1] = length
+        self.header[0] = sequence_number + 2
+
+    def read_packet(self, sequence_number):
+        """
+        Returns the packet written with the given sequence number, raises if it was not read consistently
+        """
+        length = int(self.header[1])
+        if length + RESULT_CHANNEL_TRAILER_SIZE > self.payload.size:
+            raise ValueError(f"Invalid packet length {length}")
+        data = self.payload[:length].tobytes()
+        trailer = self.payload[length : length + RESULT_CHANNEL_TRAILER_SIZE].tobytes()
+        if int(self.header[0]) != sequence_number:
+            raise ValueError("Packet overwritten during the copy")
+        trailer_sequence_number, trailer_length, checksum = struct.unpack(RESULT_CHANNEL_TRAILER_FORMAT, trailer)
+        if trailer_sequence_number != sequence_number or trailer_length != length or zlib.crc32(data) != checksum:
+            raise ValueError("Packet trailer mismatch")
+        return pickle.loads(data)
+
+    def get(self, block=True, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            sequence_number = int(self.header[0])
+            if sequence_number != self.last_sequence_number and sequence_number % 2 == 0:
+                try:
+                    item = self.read_packet(sequence_number)
+                except Exception:
+                    if int(self.header[0]) != sequence_number:
+                        # Overwritten during the copy, read the new packet
+                        continue
+                    if self.failed_sequence_number != sequence_number:
+                        self.failed_sequence_number = sequence_number
+                        self.failed_reads = 0
+                    self.failed_reads += 1
+                    if self.failed_reads >= RESULT_CHANNEL_MAX_READ_ATTEMPTS:
+                        # Still inconsistent, the packet is skipped and the reader waits for the next one
+                        self.last_sequence_number = sequence_number
+                        self.skipped_packets += 1
+                else:
+                    self.last_sequence_number = sequence_number
+                    return item
+            if not block or (deadline is not None and time.monotonic() > deadline):
+                raise queue.Empty
+            time.sleep(RESULT_CHANNEL_POLL_INTERVAL)
+
+
+class ResultChannelReader:
+    """
+    Reads the frames forwarded by forward_frames() one message at a time, like a result bus subscription
+    """
+
+    def __init__(self, channel):
+        self.channel = channel
+        self.messages = collections.deque()
+
+    def get(self, block=True, timeout=None):
+        if not self.messages:
+            self.messages.extend(self.channel.get(block, timeout))
+        return self.messages.popleft()
+
+
+def forward_frames(subscription, channel):
+    """
+    Forwards the messages of a result bus subscription through a result channel, the messages of a frame
+    are written at once when the frame status closes the frame
+    """
+    frame_results = []
+    while True:
+        message = subscription.get()
+        frame_results.append(message)
+        if isinstance(message, FrameStatus):
+            try:
+                channel.put(frame_results, False)
+            except queue.Full:
+                # Discard data, does not fit into the channel
+                pass
+            frame_results = []
+
+
+def new_result_buffer(context):
+    return context.RawArray("B", RESULT_CHANNEL_HEADER_SIZE + RESULT_CHANNEL_SIZE)
+
+
+def copy_value(value):
+    if isinstance(value, np.ndarray):
+        return value.copy()
+    if isinstance(value, (list, set)):
+        return type(value)(value)
+    return value
+
+
+def values_equal(value_a, value_b):
+    if isinstance(value_a, np.ndarray) or isinstance(value_b, np.ndarray):
+        return np.array_equal(value_a, value_b)
+    return value_a == value_b
+
+
+def run_dsp_process(daq_config_filename, result_buffer, rx_data_que, command_que, ack_event):
+    """
+    Entry point of the DSP process, builds the receiver and the signal processor from the settings file
+    (read when the variables module is imported) and applies the commands of the web interface until
+    it is asked to exit.
+    """
+    # Imported here, the web interface process does not need the DSP modules to spawn the process
+    from kraken_sdr_receiver import ReceiverRTLSDR
+    from kraken_sdr_settings import (
+        configure_receiver,
+        configure_signal_processor,
+        read_daq_channel_number,
+    )
+    from kraken_sdr_signal_processor import SignalProcessor
+    from variables import dsp_settings
+
+    logging_level = dsp_settings.get("logging_level", 5) * 10
+    logging.basicConfig(level=logging_level)
+    logger = logging.getLogger(__name__)
+    logger.setLevel(logging_level)
+
+    module_receiver = ReceiverRTLSDR(
+        data_que=rx_data_que, data_interface=dsp_settings.get("data_interface", "shmem"), logging_level=logging_level
+    )
+    configure_receiver(module_receiver, dsp_settings)
+    num_ch = read_daq_channel_number(daq_config_filename)
+    if num_ch is not None:
+        # Required to produce the initial gain configuration message (Only needed in shared-memory mode)
+        module_receiver.M = num_ch
+
+    module_signal_processor = SignalProcessor(module_receiver=module_receiver, logging_level=logging_level)
+    configure_signal_processor(module_signal_processor, dsp_settings, module_receiver.daq_center_freq)
+    threading.Thread(
+        target=forward_frames,
+        args=(module_signal_processor.result_bus.subscribe("web_interface"), ResultChannel(result_buffer)),
+        name="result_forwarder",
+        daemon=True,
+    ).start()
+    # The processing loop never returns, it must not keep the process alive after the exit command
+    module_signal_processor.daemon = True
+    module_signal_processor.start()
+    logger.info("DSP process started")
+
+    while True:
+        command = command_que.get()
+        if command[0] == "set":
+            # Applied between two frames, like the settings snapshots, a frame never sees half of a change
+            attributes = command[1]
+            module_signal_processor.submit_attributes(attributes)
+            if attributes.get("usegps") and not module_signal_processor.gps_connected:
+                # gpsd is connected per process
+                module_signal_processor.enable_gps()
+        elif command[0] == "config_daq_rf":
+            center_freq, gain = command[1:]
+            if module_receiver.receiver_connection_status:
+                module_receiver.set_center_freq(center_freq)
+                module_receiver.set_if_gain(gain)
+            else:
+                # Used when the connection is (re-)established
+                module_receiver.daq_center_freq = center_freq
+                module_receiver.daq_rx_gain = gain
+        elif command[0] == "stop_processing":
+            module_signal_processor.run_processing = False
+            while module_signal_processor.is_running:
+                # Block until signal processor run_processing while loop ends
+                time.sleep(0.01)
+            ack_event.set()
+        elif command[0] == "close_data_interfaces":
+            module_receiver.eth_close()
+            ack_event.set()
+        elif command[0] == "reattach_data_interfaces":
+            module_receiver.reattach_data_iface(command[1])
+            # The channel number and the spectrum buffers are taken from the next frame
+            module_signal_processor.first_frame = 1
+            ack_event.set()
+        elif command[0] == "exit":
+            break
+        else:
+            logger.warning(f"Unknown DSP process command: {command[0]}")
+
+    logger.info("DSP process exited")
+
+
+class DSPProcess:
+    """
+    Web interface side of the DSP process.
+
+    Forwards the changes of the (never started) signal processor held by the web interface to the DSP process,
+    and provides the ques the web interface reads the results from.
+    """
+
+    def __init__(self, module_signal_processor, daq_config_filename, logging_level=10):
+        """
+        Parameters:
+        -----------
+        :param: module_signal_processor: Signal processor object of the web interface holding the configuration
+        :param: daq_config_filename: DAQ ini file, used to read the number of channels
+        """
+        self.logger = logging.getLogger(__name__)
+        self.logger.setLevel(logging_level)
+
+        self.module_signal_processor = module_signal_processor
+        self.daq_config_filename = daq_config_filename
+
+        # Spawn, so the DSP process does not inherit the threads and the UI modules of this process
+        self.context = multiprocessing.get_context("spawn")
+        self.result_buffer = new_result_buffer(self.context)
+        self.sp_data_que = ResultChannelReader(ResultChannel(self.result_buffer))
+        self.rx_data_que = self.context.Queue()
+        self.command_que = self.context.Queue()
+        self.ack_event = self.context.Event()
+        self.process = None
+
+        self.sync_lock = threading.Lock()
+        self.synced_config = {}
+        self.sync_thread = threading.Thread(target=self.sync_config_loop, name="dsp_process_sync", daemon=True)
+
+    def start(self):
+        """
+        Starts the DSP process, it configures itself from the settings file, then the current configuration
+        of the web interface is sent to it. Later changes are forwarded as they happen.
+        """
+        with self.sync_lock:
+            self.process = self.context.Process(
+                target=run_dsp_process,
+                args=(
+                    self.daq_config_filename,
+                    self.result_buffer,
+                    self.rx_data_que,
+                    self.command_que,
+                    self.ack_event,
+                ),
+                name="kraken_dsp",
+                daemon=True,
+            )
+            self.process.start()
+            self.send_config_changes(send_all=True)
+        if not self.sync_thread.is_alive():
+            self.sync_thread.start()
+        self.logger.info(f"DSP process started, pid: {self.process.pid}")
+
+    def restart(self):
+        """
+        Restarts the DSP process, e.g. after the DAQ was reconfigured. The settings file must be up to date.
+        """
+        self.exit()
+        self.start()
+
+    def exit(self):
+        if self.process is None:
+            return
+        self.command_que.put(["exit"])
+        self.process.join(COMMAND_TIMEOUT)
+        if self.process.is_alive():
+            self.logger.warning("DSP process did not exit, terminating it")
+            self.process.terminate()
+            self.process.join()
+        self.process = None
+
+    def send_config_changes(self, send_all=False):
+        # The changes found in one pass are sent together, so they are applied at the same frame boundary
+        changes = {}
+        for name in SYNCED_SIGNAL_PROCESSOR_ATTRIBUTES:
+            value = getattr(self.module_signal_processor, name)
+            if send_all or not values_equal(value, self.synced_config[name]):
+                self.synced_config[name] = copy_value(value)
+                changes[name] = copy_value(value)
+        if changes:
+            self.command_que.put(["set", changes])
+
+    def sync_config(self):
+        with self.sync_lock:
+            if self.process is not None:
+                self.send_config_changes()
+
+    def sync_config_loop(self):
+        while True:
+            time.sleep(CONFIG_SYNC_INTERVAL)
+            try:
+                self.sync_config()
+            except Exception:
+                self.logger.exception("Failed to forward the configuration to the DSP process")
+
+    def run_command(self, *command):
+        """
+        Forwards the pending configuration changes first, then runs the command and waits for its completion.
+        """
+        self.sync_config()
+        self.ack_event.clear()
+        self.command_que.put(list(command))
+        if not self.ack_event.wait(COMMAND_TIMEOUT):
+            self.logger.error(f"DSP process did not complete the {command[0]} command")
+
+    def config_daq_rf(self, center_freq, gain):
+        """
+        Parameters:
+        -----------
+        :param: center_freq: Required center frequency [Hz]
+        :param: gain: Required IF gain [dB]
+        """
+        self.command_que.put(["config_daq_rf", int(center_freq), gain])
+
+    def stop_processing(self):
+        self.run_command("stop_processing")
+
+    def close_data_interfaces(self):
+        self.run_command("close_data_interfaces")
+
+    def reattach_data_interfaces(self, num_ch):
+        """
+        Reopens the data interfaces after the DAQ subsystem has been restarted, the DSP process keeps running
+        """
+        self.run_command("reattach_data_interfaces", num_ch)
@@ -0,0 +1,238 @@
+# KrakenSDR Signal Processor - Headless runner
+#
+# Copyright (C) 2018-2021  Carl Laufer, Tamás Pető
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#
+# - coding: utf-8 -*-
+
+# Runs the receiver and the signal processor without the web interface (no dash / plotly).
+# The DoA outputs (data files, Kraken Pro / RDF mapper posts) are produced by the signal processor itself,
+# the node keeps writing status.json as usual.
+#
+# Control surface:
+#   - settings.json is watched and re-applied when it changes, same as with the web interface
+#   - With "en_control_api" the settings can be changed through a local HTTP API (see control_api.py)
+#   - SIGHUP forces a reload of settings.json
+#   - SIGUSR1 logs the current processing status
+#   - SIGINT / SIGTERM stop the processing and close the DAQ interfaces
+#
+# With --pipeline the processing runs as a multi-process pipeline (see kraken_sdr_pipeline.py),
+# SIGUSR1 then logs the utilization of the pipeline stages.
+#
+# Usage: python3 _sdr/_signal_processing/kraken_sdr_headless.py [--pipeline]
+
+import argparse
+import logging
+import os
+import queue
+import signal
+import sys
+import threading
+import time
+
+current_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(current_path)), "_ui/_web_interface"))
+
+# isort: off
+from variables import daq_config_filename, dsp_settings, settings_file_path, INVALID_SETTINGS_FILE_TIMESTAMP
+
+# isort: on
+
+from control_api import CONTROL_API_DEFAULT_PORT, ControlAPI
+from kraken_sdr_pipeline import DSPPipeline
+from kraken_sdr_receiver import ReceiverRTLSDR
+from kraken_sdr_settings import (
+    RECEIVER_SETTINGS_KEYS,
+    apply_receiver_settings,
+    configure_receiver,
+    configure_signal_processor,
+    read_daq_channel_number,
+)
+from kraken_sdr_signal_processor import SignalProcessor
+from settings_watcher import SettingsFileWatcher
+
+
+class HeadlessRunner:
+    def __init__(self, settings):
+        self.logging_level = settings.get("logging_level", 5) * 10
+        logging.basicConfig(level=self.logging_level)
+        self.logger = logging.getLogger(__name__)
+        self.logger.setLevel(self.logging_level)
+
+        if settings["timestamp"] == INVALID_SETTINGS_FILE_TIMESTAMP:
+            self.logger.warning("Settings file is not found or corrupted, running with defaults!")
+
+        self.settings = settings
+        self.stop_event = threading.Event()
+
+        # The receiver blocks on its que until the connection messages are consumed,
+        # nobody else reads them without the web interface
+        self.rx_data_que = queue.Queue()
+
+        self.module_receiver = ReceiverRTLSDR(
+            data_que=self.rx_data_que,
+            data_interface=settings.get("data_interface", "shmem"),
+            logging_level=self.logging_level,
+        )
+        configure_receiver(self.module_receiver, settings)
+
+        num_ch = read_daq_channel_number(daq_config_filename)
+        if num_ch is not None:
+            # Required to produce the initial gain configuration message (Only needed in shared-memory mode)
+            self.module_receiver.M = num_ch
+
+        self.module_signal_processor = SignalProcessor(
+            module_receiver=self.module_receiver, logging_level=self.logging_level
+        )
+        configure_signal_processor(self.module_signal_processor, settings, self.module_receiver.daq_center_freq)
+
+        self.settings_watcher = SettingsFileWatcher(
+            settings_file_path, self.apply_settings, settings, self.logging_level
+        )
+        self.control_api = None
+        if settings.get("en_control_api", False):
+            self.control_api = ControlAPI(
+                self.module_signal_processor,
+                self.module_receiver,
+                settings,
+                settings_file_path,
+                int(settings.get("control_api_port", CONTROL_API_DEFAULT_PORT)),
+                self.logging_level,
+            )
+        self.threads = [
+            threading.Thread(target=self.consume_receiver_messages, name="rx_que_consumer", daemon=True),
+            self.settings_watcher,
+        ]
+
+    def start(self):
+        self.logger.info("Starting headless signal processing")
+        # The processing loop never returns, it must not keep the process alive after stop()
+        self.module_signal_processor.daemon = True
+        self.module_signal_processor.start()
+        for thread in self.threads:
+            thread.start()
+        if self.control_api is not None:
+            self.control_api.start()
+
+    def stop(self):
+        self.logger.info("Stopping headless signal processing")
+        self.stop_event.set()
+        if self.control_api is not None:
+            self.control_api.stop()
+        self.module_signal_processor.run_processing = False
+        while self.module_signal_processor.is_running:
+            # Block until signal processor run_processing while loop ends
+            time.sleep(0.01)
+        self.module_receiver.eth_close()
+
+    def consume_receiver_messages(self):
+        while not self.stop_event.is_set():
+            try:
+                que_data_packet = self.rx_data_que.get(timeout=1)
+            except queue.Empty:
+                continue
+            for data_entry in que_data_packet:
+                self.logger.info(f"Receiver: {data_entry[0]}")
+
+    def reload(self):
+        self.settings_watcher.reload()
+
+    def apply_settings(self, settings, changed_keys):
+        self.logger.info(f"Applying settings, changed: {', '.join(sorted(changed_keys))}")
+        self.settings = settings
+        if self.control_api is not None:
+            self.control_api.update_settings(settings)
+        configure_signal_processor(self.module_signal_processor, settings)
+        if changed_keys & RECEIVER_SETTINGS_KEYS and apply_receiver_settings(self.module_receiver, settings):
+            self.logger.info("Receiver parameters updated")
+
+    def log_status(self):
+        iq_header = self.module_receiver.iq_header
+        self.logger.info(
+            "Status: connected: {}, frame index: {}, center freq: {:.3f} MHz, dropped frames: {}, processing: {}".format(
+                self.module_receiver.receiver_connection_status,
+                iq_header.cpi_index,
+                self.module_receiver.daq_center_freq / 10**6,
+                self.module_signal_processor.dropped_frames,
+                self.module_signal_processor.is_running,
+            )
+        )
+
+
+class PipelineRunner:
+    def __init__(self, settings):
+        self.logging_level = settings.get("logging_level", 5) * 10
+        logging.basicConfig(level=self.logging_level)
+        self.logger = logging.getLogger(__name__)
+        self.logger.setLevel(self.logging_level)
+
+        if settings["timestamp"] == INVALID_SETTINGS_FILE_TIMESTAMP:
+            self.logger.warning("Settings file is not found or corrupted, running with defaults!")
+
+        self.stop_event = threading.Event()
+        self.pipeline = DSPPipeline(daq_config_filename, self.logging_level)
+        if settings.get("en_control_api", False):
+            # The stages would have to apply the changes in step
+            self.logger.warning("The control API is not supported in pipeline mode")
+
+    def start(self):
+        self.logger.info("Starting headless signal processing pipeline")
+        self.pipeline.start()
+
+    def stop(self):
+        self.logger.info("Stopping headless signal processing pipeline")
+        self.pipeline.stop()
+
+    def reload(self):
+        # Every stage watches the settings file on its own, they pick up the settings file when its modification time changes
+        os.utime(settings_file_path)
+
+    def log_status(self):
+        self.logger.info(
+            "Stage utilization: "
+            + ", ".join(f"{name}: {value:.0%}" for name, value in self.pipeline.get_utilization().items())
+        )
+        self.logger.info(
+            "Ring high-water marks: "
+            + ", ".join(f"{name}: {value}" for name, value in self.pipeline.get_ring_high_water_marks().items())
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="KrakenSDR DoA signal processing without the web interface")
+    parser.add_argument(
+        "--pipeline", action="store_true", help="Run the processing stages in separate processes (multi-core)"
+    )
+    args = parser.parse_args()
+
+    runner = PipelineRunner(dsp_settings) if args.pipeline else HeadlessRunner(dsp_settings)
+
+    def on_stop(signum, frame):
+        runner.stop_event.set()
+
+    signal.signal(signal.SIGINT, on_stop)
+    signal.signal(signal.SIGTERM, on_stop)
+    signal.signal(signal.SIGHUP, lambda signum, frame: runner.reload())
+    signal.signal(signal.SIGUSR1, lambda signum, frame: runner.log_status())
+
+    runner.start()
+    while not runner.stop_event.wait(1):
+        pass
+    runner.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,432 @@
+# KrakenSDR Signal Processor - Multi-process pipeline
+#
+# Copyright (C) 2018-2021  Carl Laufer, Tamás Pető
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#
+# - coding: utf-8 -*-
+
+# Splits the processing loop of the signal processor into stages that run in separate processes:
+#
+#   acquisition -> decimation + spectrum -> channelization + DoA -> outputs
+#
+# Consecutive stages are connected with the shared memory interface used towards the DAQ firmware,
+# with more than two slots, so a stage can work on the next frame while the following one is still busy.
+# Every stage runs its own signal processor object, the state that is needed downstream is handed over
+# with the frame. Each stage measures how busy it is, the utilization is written to status.json,
+# so the bottleneck stage is visible. The high-water mark of each ring shows how much of its depth
+# was needed to absorb the processing time jitter of the next stage.
+
+import logging
+import os
+import pickle
+import queue
+import shutil
+import tempfile
+import time
+from configparser import ConfigParser
+
+import numpy as np
+
+STAGE_ACQUISITION = 0
+STAGE_SPECTRUM = 1
+STAGE_DOA = 2
+STAGE_OUTPUTS = 3
+STAGE_NAMES = ("acquisition", "spectrum", "doa", "outputs")
+
+RING_NUM_SLOTS = 3
+RING_READ_TIMEOUT = 1  # [s]
+# Room for the metadata and the spectrum next to the IQ samples of a frame
+RING_SLOT_RESERVE = 16 * 1024 * 1024  # [byte]
+DEFAULT_CPI_SIZE = 2**20
+DEFAULT_CHANNEL_NUMBER = 5
+
+FRAME_HEADER_SIZE = 16  # [byte] metadata offset and length
+FRAME_ARRAY_ALIGNMENT = 64  # [byte]
+UTILIZATION_WINDOW = 2.0  # [s]
+STAGE_STOP_TIMEOUT = 5  # [s]
+
+# Signal processor state handed over to the next stage, the rest is local to the stage that uses it
+SPECTRUM_STAGE_STATE = (
+    "processed_signal",
+    "sampling_freq",
+    "spectrum",
+    "channel_number",
+    "data_ready",
+    "timestamp",
+    "adc_overdrive",
+    "dropped_frames",
+    "spectrum_plot_enabled",
+)
+DOA_STAGE_STATE = (
+    "data_ready",
+    "timestamp",
+    "adc_overdrive",
+    "dropped_frames",
+    "theta_0_list",
+    "confidence_list",
+    "max_power_level_list",
+    "freq_list",
+    "doa_result_log_list",
+    "number_of_correlated_sources",
+    "snrs",
+    "kerberos_doa_output",
+)
+
+
+def write_frame(buffer, items):
+    """
+    Serializes a frame into a ring slot. Numpy arrays are copied as raw data,
+    everything else is pickled into the metadata placed after the arrays.
+    Returns the number of bytes written.
+
+    Parameters:
+    -----------
+    :param: buffer: Ring slot (uint8 array)
+    :param: items: Dict of the frame items
+    """
+    metadata = {}
+    layout = {}
+    offset = FRAME_HEADER_SIZE
+    for name, value in items.items():
+        if isinstance(value, np.ndarray) and value.dtype != object:
+            value = np.ascontiguousarray(value)
+            offset = -(-offset // FRAME_ARRAY_ALIGNMENT) * FRAME_ARRAY_ALIGNMENT
+            if offset + value.nbytes > buffer.size:
+                raise ValueError(f"Frame does not fit into the {buffer.size} byte ring slot")
+            buffer[offset : offset + value.nbytes] = value.reshape(-1).view(np.uint8)
+            layout[name] = (offset, value.dtype.str, value.shape)
+            offset += value.nbytes
+        else:
+            metadata[name] = value
+
+    metadata_bytes = pickle.dumps((metadata, layout), protocol=pickle.HIGHEST_PROTOCOL)
+    if offset + len(metadata_bytes) > buffer.size:
+        raise ValueError(f"Frame does not fit into the {buffer.size} byte ring slot")
+    buffer[offset : offset + len(metadata_bytes)] = np.frombuffer(metadata_bytes, dtype=np.uint8)
+    buffer[:FRAME_HEADER_SIZE].view(np.uint64)[:] = (offset, len(metadata_bytes))
+    return offset + len(metadata_bytes)
+
+
+def read_frame(buffer):
+    """
+    Deserializes a frame written by write_frame(). The arrays are views into the ring slot,
+    they are only valid until the slot is released.
+    """
+    offset, length = (int(value) for value in buffer[:FRAME_HEADER_SIZE].view(np.uint64))
+    items, layout = pickle.loads(buffer[offset : offset + length].tobytes())
+    for name, (array_offset, dtype, shape) in layout.items():
+        dtype = np.dtype(dtype)
+        count = int(np.prod(shape))
+        items[name] = buffer[array_offset : array_offset + count * dtype.itemsize].view(dtype).reshape(shape)
+    return items
+
+
+def get_ring_slot_size(daq_config_filename):
+    """
+    Returns the ring slot size needed for the IQ frames configured in the DAQ ini file
+    """
+    parser = ConfigParser()
+    channel_number = DEFAULT_CHANNEL_NUMBER
+    cpi_size = DEFAULT_CPI_SIZE
+    if parser.read([daq_config_filename]):
+        channel_number = parser.getint("hw", "num_ch", fallback=channel_number)
+        cpi_size = parser.getint("pre_processing", "cpi_size", fallback=cpi_size)
+    return channel_number * cpi_size * np.dtype(np.complex64).itemsize + RING_SLOT_RESERVE
+
+
+class StageUtilization:
+    """
+    Measures the ratio of the time a stage spends with processing (not waiting for the neighbouring stages)
+    """
+
+    def __init__(self, shared_values, stage):
+        """
+        Parameters:
+        -----------
+        :param: shared_values: Shared array the utilization of all stages is published in
+        :param: stage: Index of the stage
+        """
+        self.shared_values = shared_values
+        self.stage = stage
+        self.window_start = time.monotonic()
+        self.busy_time = 0.0
+        self.busy_start = None
+
+    def begin(self):
+        self.busy_start = time.monotonic()
+
+    def end(self):
+        now = time.monotonic()
+        self.busy_time += now - self.busy_start
+        elapsed = now - self.window_start
+        if elapsed >= UTILIZATION_WINDOW:
+            self.shared_values[self.stage] = self.busy_time / elapsed
+            self.window_start = now
+            self.busy_time = 0.0
+
+
+def run_pipeline_stage(
+    stage, ring_names, ctr_fifo_path, slot_size, utilization_values, high_water_mark_values, stop_event
+):
+    """
+    Entry point of a pipeline stage process
+    """
+    # Imported here, the stage processes are spawned
+    from kraken_sdr_receiver import ReceiverRTLSDR
+    from kraken_sdr_settings import (
+        RECEIVER_SETTINGS_KEYS,
+        apply_receiver_settings,
+        configure_receiver,
+        configure_signal_processor,
+        read_daq_channel_number,
+    )
+    from kraken_sdr_signal_processor import SignalProcessor
+    from settings_watcher import SettingsFileWatcher
+    from shmemIface import inShmemIface, outShmemIface
+    from variables import daq_config_filename, dsp_settings, settings_file_path
+
+    logging_level = dsp_settings.get("logging_level", 5) * 10
+    logging.basicConfig(level=logging_level)
+    logger = logging.getLogger(f"{__name__}.{STAGE_NAMES[stage]}")
+    logger.setLevel(logging_level)
+
+    # Only the acquisition stage talks to the DAQ, the others get the receiver state with the frames
+    module_receiver = ReceiverRTLSDR(
+        data_que=queue.Queue(),
+        data_interface=dsp_settings.get("data_interface", "shmem") if stage == STAGE_ACQUISITION else "eth",
+        logging_level=logging_level,
+    )
+    configure_receiver(module_receiver, dsp_settings)
+    if stage == STAGE_ACQUISITION:
+        num_ch = read_daq_channel_number(daq_config_filename)
+        if num_ch is not None:
+            # Required to produce the initial gain configuration message (Only needed in shared-memory mode)
+            module_receiver.M = num_ch
+
+    # Only the DoA stage runs the numba kernels, the others skip the warmup
+    module_signal_processor = SignalProcessor(
+        module_receiver=module_receiver,
+        logging_level=logging_level,
+        config_only=stage != STAGE_DOA,
+    )
+    configure_signal_processor(module_signal_processor, dsp_settings, module_receiver.daq_center_freq)
+    if stage == STAGE_OUTPUTS:
+        module_signal_processor.init_outputs(logging_level)
+
+    def check_scan_settings(config):
+        # The VFOs of the hops would have to be handed over between the stages
+        if stage == STAGE_ACQUISITION and config.en_scan:
+            logger.warning("The frequency scan is not supported in pipeline mode")
+
+    def apply_settings(settings, changed_keys):
+        # Applied by the stage loop between two frames
+        check_scan_settings(configure_signal_processor(module_signal_processor, settings, defer=True))
+        if stage == STAGE_ACQUISITION and changed_keys & RECEIVER_SETTINGS_KEYS:
+            apply_receiver_settings(module_receiver, settings)
+
+    check_scan_settings(module_signal_processor.config)
+
+    settings_watcher = SettingsFileWatcher(settings_file_path, apply_settings, dsp_settings, logging_level)
+    settings_watcher.start()
+
+    in_ring = None
+    out_ring = None
+    if stage != STAGE_ACQUISITION:
+        in_ring = inShmemIface(
+            ring_names[stage - 1],
+            ctr_fifo_path,
+            read_timeout=RING_READ_TIMEOUT,
+            num_slots=RING_NUM_SLOTS,
+            slot_header=True,
+        )
+        if not in_ring.init_ok:
+            logger.critical("Failed to open the input ring")
+            return
+    if stage != STAGE_OUTPUTS:
+        out_ring = outShmemIface(
+            ring_names[stage], slot_size, ctr_fifo_path=ctr_fifo_path, num_slots=RING_NUM_SLOTS, slot_header=True
+        )
+        if not out_ring.init_ok:
+            logger.critical("Failed to open the output ring")
+            return
+
+    utilization = StageUtilization(utilization_values, stage)
+    logger.info("Pipeline stage started")
+
+    try:
+        while not stop_event.is_set():
+            module_signal_processor.apply_pending_config()
+
+            # -----> INPUT <-----
+            if in_ring is None:
+                get_iq_failed = module_receiver.get_iq_online()
+                utilization.begin()
+                frame = {
+                    "iq_header": module_receiver.iq_header,
+                    "iq_samples": module_receiver.iq_samples,
+                    "daq_center_freq": module_receiver.daq_center_freq,
+                    "get_iq_failed": get_iq_failed,
+                    "start_time": time.time(),
+                }
+                in_slot = None
+            else:
+                in_slot = in_ring.wait_buff_free()
+                if in_slot < 0 or in_slot >= RING_NUM_SLOTS:
+                    continue
+                utilization.begin()
+                frame = read_frame(in_ring.buffers[in_slot])
+                module_receiver.iq_header = frame["iq_header"]
+                module_receiver.daq_center_freq = frame["daq_center_freq"]
+                for name in SPECTRUM_STAGE_STATE if stage == STAGE_DOA else DOA_STAGE_STATE:
+                    if name in frame:
+                        setattr(module_signal_processor, name, frame[name])
+
+            # -----> PROCESSING <-----
+            if stage == STAGE_SPECTRUM:
+                module_receiver.iq_samples = frame.pop("iq_samples")
+                frame["frame_results"] = []
+                frame["en_proc"] = module_signal_processor.process_spectrum(
+                    frame["get_iq_failed"], frame["frame_results"]
+                )
+                frame["dropped_frames"] = module_signal_processor.dropped_frames
+                if frame["en_proc"]:
+                    frame.update({name: getattr(module_signal_processor, name) for name in SPECTRUM_STAGE_STATE})
+            elif stage == STAGE_DOA:
+                for name in SPECTRUM_STAGE_STATE:
+                    frame.pop(name, None)
+                if frame["en_proc"]:
+                    module_signal_processor.process_doa(frame["frame_results"])
+                    frame.update({name: getattr(module_signal_processor, name) for name in DOA_STAGE_STATE})
+            elif stage == STAGE_OUTPUTS:
+                if module_signal_processor.hasgps and module_signal_processor.usegps:
+                    module_signal_processor.update_location_and_timestamp()
+                module_signal_processor.pipeline_status = {
+                    "utilization": {name: round(value, 3) for name, value in zip(STAGE_NAMES, utilization_values)},
+                    # Keyed by the stage reading the ring
+                    "ring_high_water_marks": {
+                        name: int(value) for name, value in zip(STAGE_NAMES[1:], high_water_mark_values)
+                    },
+                }
+                module_signal_processor.save_processing_status()
+                if frame["en_proc"]:
+                    module_signal_processor.process_outputs(frame["start_time"])
+                module_signal_processor.publish_results(
+                    frame["frame_results"], frame["start_time"], frame["get_iq_failed"]
+                )
+            utilization.end()
+
+            # -----> OUTPUT <-----
+            if out_ring is not None:
+                # Blocks until the next stage releases a slot
+                out_slot = out_ring.wait_buff_free()
+                if out_slot < 0:
+                    logger.error("The next pipeline stage has stopped")
+                    break
+                utilization.begin()
+                frame_size = write_frame(out_ring.buffers[out_slot], frame)
+                out_ring.send_ctr_buff_ready(out_slot, frame_size)
+                high_water_mark_values[stage] = out_ring.occupancy_high_water_mark
+                utilization.end()
+
+            if in_slot is not None:
+                in_ring.send_ctr_buff_ready(in_slot)
+    finally:
+        settings_watcher.stop()
+        if in_ring is not None:
+            in_ring.destory_sm_buffer()
+        if out_ring is not None:
+            out_ring.destory_sm_buffer()
+            for memory in out_ring.memories:
+                memory.unlink()
+        if stage == STAGE_ACQUISITION:
+            module_receiver.eth_close()
+        logger.info("Pipeline stage stopped")
+
+
+class DSPPipeline:
+    """
+    Starts and stops the pipeline stage processes
+    """
+
+    def __init__(self, daq_config_filename, logging_level=10):
+        """
+        Parameters:
+        -----------
+        :param: daq_config_filename: DAQ ini file, used to size the ring buffers
+        """
+        # Imported here, so the module can be imported without the receiver modules on the path
+        import multiprocessing
+
+        self.logger = logging.getLogger(__name__)
+        self.logger.setLevel(logging_level)
+
+        # Spawn, so the stages do not inherit the state (threads, open files) of this process
+        self.context = multiprocessing.get_context("spawn")
+        self.slot_size = get_ring_slot_size(daq_config_filename)
+        self.ctr_fifo_path = tempfile.mkdtemp(prefix="kraken_pipeline_") + "/"
+        self.ring_names = [f"kraken_pipeline_{os.getpid()}_{stage}" for stage in range(len(STAGE_NAMES) - 1)]
+        for ring_name in self.ring_names:
+            os.mkfifo(self.ctr_fifo_path + "fw_" + ring_name)
+            os.mkfifo(self.ctr_fifo_path + "bw_" + ring_name)
+
+        self.utilization_values = self.context.RawArray("d", len(STAGE_NAMES))
+        self.high_water_mark_values = self.context.RawArray("d", len(self.ring_names))
+        self.stop_event = self.context.Event()
+        self.processes = []
+
+    def start(self):
+        for stage, stage_name in enumerate(STAGE_NAMES):
+            process = self.context.Process(
+                target=run_pipeline_stage,
+                args=(
+                    stage,
+                    self.ring_names,
+                    self.ctr_fifo_path,
+                    self.slot_size,
+                    self.utilization_values,
+                    self.high_water_mark_values,
+                    self.stop_event,
+                ),
+                name=f"kraken_{stage_name}",
+                daemon=True,
+            )
+            process.start()
+            self.processes.append(process)
+        self.logger.info(f"DSP pipeline started, ring slot size: {self.slot_size / 2**20:.1f} MB")
+
+    def stop(self):
+        self.stop_event.set()
+        for process in self.processes:
+            process.join(STAGE_STOP_TIMEOUT)
+            if process.is_alive():
+                self.logger.warning(f"Pipeline stage {process.name} did not stop, terminating it")
+                process.terminate()
+                process.join()
+        self.processes = []
+        shutil.rmtree(self.ctr_fifo_path, ignore_errors=True)
+
+    def get_utilization(self):
+        """
+        Returns the utilization of each stage in [0, 1], the bottleneck stage is close to 1
+        """
+        return {name: value for name, value in zip(STAGE_NAMES, self.utilization_values)}
+
+    def get_ring_high_water_marks(self):
+        """
+        Returns the highest number of occupied slots of the ring in front of each stage,
+        if it reaches RING_NUM_SLOTS the ring is too shallow to absorb the jitter of that stage
+        """
+        return {name: int(value) for name, value in zip(STAGE_NAMES[1:], self.high_water_mark_values)}
@@ -0,0 +1,324 @@
+# KrakenSDR Signal Processor - settings.json loader
+#
+# Copyright (C) 2018-2021  Carl Laufer, Tamás Pető
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#
+# - coding: utf-8 -*-
+
+# Applies the content of settings.json to the receiver and signal processor modules.
+# Shared by the web interface and the headless runner, so both configure the DSP chain the same way.
+#
+# The signal processor settings are read into an immutable snapshot (SignalProcessorConfig). While the processing
+# thread runs, the snapshot is only queued, the thread applies it between two frames, so a frame never sees half of
+# a reload. Comparing the snapshots tells which settings have changed (changed_fields).
+
+import json
+import os
+from configparser import ConfigParser
+from typing import NamedTuple, Tuple
+
+import numpy as np
+from doa_serializer import DOA_SPECTRUM_TEXT
+from output_spool import SPOOL_MODE_LOG
+from scan_scheduler import SCAN_DEFAULT_DWELL_FRAMES
+from variables import AUTO_GAIN_VALUE
+from vfo_table import DEFAULT_MAX_VFOS, VFO_COLUMNS
+
+DEFAULT_CENTER_FREQ_MHZ = 416.588
+DEFAULT_UNIFORM_GAIN = 15.7
+DEFAULT_CUSTOM_ARRAY_X_METERS = "0.21,0.06,-0.17,-0.17,0.07"
+DEFAULT_CUSTOM_ARRAY_Y_METERS = "0.00,-0.20,-0.12,0.12,0.20"
+# Settings applied by apply_receiver_settings
+RECEIVER_SETTINGS_KEYS = frozenset(("center_freq", "uniform_gain", "default_ip"))
+# The processing loop applies the settings within a frame, or within a second while the processing is stopped
+CONFIG_APPLY_TIMEOUT = 3.0  # [s]
+
+
+def load_settings_file(settings_file_path):
+    """
+    Loads the settings file and stores its modification time under the "timestamp" key.
+    Raises an exception if the file can not be read or parsed.
+    """
+    last_changed_time = os.stat(settings_file_path).st_mtime
+    with open(settings_file_path, "r", encoding="utf-8") as file:
+        settings = json.load(file)
+    if settings is None:
+        raise RuntimeError(f"{settings_file_path} appears empty")
+    settings["timestamp"] = last_changed_time
+    return settings
+
+
+def read_daq_channel_number(daq_config_filename):
+    """
+    Returns the number of channels configured in the DAQ ini file or None if it can not be read.
+    The receiver needs it to produce the initial gain configuration message in shared-memory mode.
+    """
+    parser = ConfigParser()
+    if not parser.read([daq_config_filename]):
+        return None
+    return parser.getint("hw", "num_ch")
+
+
+def get_center_freq_mhz(settings):
+    return float(settings.get("center_freq", DEFAULT_CENTER_FREQ_MHZ))
+
+
+def get_uniform_gain(settings):
+    gain = settings.get("uniform_gain", DEFAULT_UNIFORM_GAIN)
+    return float(gain) if gain != "Auto" else AUTO_GAIN_VALUE
+
+
+def parse_custom_array(coordinates):
+    return np.array(coordinates.split(","), dtype=np.float64)
+
+
+def configure_receiver(module_receiver, settings):
+    module_receiver.daq_center_freq = get_center_freq_mhz(settings) * 10**6
+    module_receiver.daq_rx_gain = get_uniform_gain(settings)
+    module_receiver.rec_ip_addr = settings.get("default_ip", "0.0.0.0")
+
+
+def apply_receiver_settings(module_receiver, settings):
+    """
+    Retunes the receiver if the center frequency or the gain has changed. Without a DAQ connection
+    the values are only stored, they are applied when the connection is (re-)established.
+    """
+    if not module_receiver.receiver_connection_status:
+        configure_receiver(module_receiver, settings)
+        return False
+
+    center_freq = get_center_freq_mhz(settings) * 10**6
+    gain = get_uniform_gain(settings)
+    if abs(center_freq - module_receiver.daq_center_freq) > 1000 or abs(gain - module_receiver.daq_rx_gain) > 0.001:
+        module_receiver.set_center_freq(int(center_freq))
+        module_receiver.set_if_gain(gain)
+        return True
+    return False
+
+
+def get_array_geometry(settings, ant_alignment, channel_number):
+    """
+    Converts the antenna array dimensions given in meters to wavelengths at the configured center frequency.
+    Returns the UCA radius [m], the inter element spacing and the custom array coordinates [wavelength].
+    """
+    wavelength = 300 / get_center_freq_mhz(settings)
+    ant_spacing_meters = float(settings.get("ant_spacing_meters", 0.21))
+
+    if ant_alignment == "UCA":
+        uca_radius_m = ant_spacing_meters
+        # Convert RADIUS to INTERELEMENT SPACING
+        inter_elem_spacing = np.sqrt(2) * ant_spacing_meters * np.sqrt(1 - np.cos(np.deg2rad(360 / channel_number)))
+        inter_elem_space = inter_elem_spacing / wavelength
+    else:
+        uca_radius_m = np.inf
+        inter_elem_space = ant_spacing_meters / wavelength
+
+    custom_array_x_meters = parse_custom_array(settings.get("custom_array_x_meters", DEFAULT_CUSTOM_ARRAY_X_METERS))
+    custom_array_y_meters = parse_custom_array(settings.get("custom_array_y_meters", DEFAULT_CUSTOM_ARRAY_Y_METERS))
+    return (
+        float(uca_radius_m),
+        float(inter_elem_space),
+        tuple(custom_array_x_meters / wavelength),
+        tuple(custom_array_y_meters / wavelength),
+    )
+
+
+class SignalProcessorConfig(NamedTuple):
+    """
+    Snapshot of the signal processor settings, the fields are named after the attributes of the signal processor.
+    The fields are applied in this order. The number of VFOs (max_vfos) is not part of it, the web interface is
+    built for a fixed number of VFOs, it is only set by the first configuration (configure_signal_processor).
+    """
+
+    DOA_ant_alignment: str
+    doa_measure: str
+    DOA_UCA_radius_m: float
+    DOA_inter_elem_space: float
+    custom_array_x: Tuple[float, ...]
+    custom_array_y: Tuple[float, ...]
+    ula_direction: str
+    DOA_algorithm: str
+    DOA_expected_num_of_sources: int
+    array_offset: int
+    en_DOA_estimation: bool
+    DOA_decorrelation_method: str
+    compass_offset: float
+    DOA_data_format: str
+    station_id: str
+    latitude: float
+    longitude: float
+    heading: float
+    fixed_heading: bool
+    gps_min_speed_for_valid_heading: float
+    gps_min_duration_for_valid_heading: float
+    krakenpro_key: str
+    RDF_mapper_server: str
+    output_spool_mode: str
+    doa_spectrum_encoding: str
+    spectrum_fig_type: str
+    vfo_mode: str
+    vfo_default_squelch_mode: str
+    vfo_default_demod: str
+    vfo_default_iq: str
+    max_demod_timeout: int
+    dsp_decimation: int
+    active_vfos: int
+    output_vfo: int
+    optimize_short_bursts: bool
+    en_peak_hold: bool
+    overload_steps: tuple
+    en_scan: bool
+    scan_hops: tuple
+    scan_dwell_frames: int
+    vfo_bw: Tuple[int, ...]
+    vfo_fir_order_factor: Tuple[int, ...]
+    vfo_freq: Tuple[float, ...]
+    vfo_squelch_mode: Tuple[str, ...]
+    vfo_squelch: Tuple[int, ...]
+    vfo_demod: Tuple[str, ...]
+    vfo_iq: Tuple[str, ...]
+
+    def changed_fields(self, previous):
+        """
+        Returns the names of the fields that differ from the previous snapshot, every field if there is none
+        """
+        if previous is None:
+            return frozenset(self._fields)
+        return frozenset(
+            name for name, value, previous_value in zip(self._fields, self, previous) if value != previous_value
+        )
+
+    def apply(self, module_signal_processor):
+        """
+        Copies the fields to the attributes of the signal processor
+        """
+        for name, value in zip(self._fields, self):
+            if name in ("custom_array_x", "custom_array_y"):
+                value = np.array(value)
+            elif name in ("overload_steps", "scan_hops"):
+                value = list(value)
+            setattr(module_signal_processor, name, value)
+
+
+def read_signal_processor_config(module_signal_processor, settings, default_vfo_freq=None):
+    """
+    Reads the signal processor settings into a snapshot, settings missing from the file keep their current value
+    or get their default value.
+
+    Parameters:
+    -----------
+    :param: module_signal_processor: Signal processor the snapshot is made for
+    :param: settings: Content of the settings file
+    :param: default_vfo_freq: VFO frequency [Hz] used when a VFO has no frequency in the settings,
+                              defaults to the configured center frequency
+    """
+    if default_vfo_freq is None:
+        default_vfo_freq = get_center_freq_mhz(settings) * 10**6
+
+    sp = module_signal_processor
+    ant_alignment = settings.get("ant_arrangement", "UCA")
+    uca_radius_m, inter_elem_space, custom_array_x, custom_array_y = get_array_geometry(
+        settings, ant_alignment, sp.channel_number
+    )
+    max_vfos = sp.max_vfos
+    vfo_range = range(max_vfos)
+
+    def vfo_column(column, default_value=None):
+        # Without a default value, the VFOs keep their current setting, the new VFOs get the default of the column
+        current_values = getattr(sp.vfos, column)
+        values = []
+        for i in vfo_range:
+            value = default_value
+            if value is None:
+                value = current_values[i] if i < len(current_values) else VFO_COLUMNS[column][1]
+            values.append(settings.get(f"vfo_{column}_{i}", value))
+        return tuple(values)
+
+    return SignalProcessorConfig(
+        DOA_ant_alignment=ant_alignment,
+        doa_measure=settings.get("doa_fig_type", "Linear"),
+        DOA_UCA_radius_m=uca_radius_m,
+        DOA_inter_elem_space=inter_elem_space,
+        custom_array_x=custom_array_x,
+        custom_array_y=custom_array_y,
+        ula_direction=settings.get("ula_direction", "Both"),
+        DOA_algorithm=settings.get("doa_method", "MUSIC"),
+        DOA_expected_num_of_sources=settings.get("expected_num_of_sources", 1),
+        array_offset=int(settings.get("array_offset", 0)),
+        en_DOA_estimation=settings.get("en_doa", True),
+        DOA_decorrelation_method=settings.get("doa_decorrelation_method", "Off"),
+        compass_offset=settings.get("compass_offset", 0),
+        # Output Data format.
+        DOA_data_format=settings.get("doa_data_format", "Kraken App"),
+        # Station Information
+        station_id=settings.get("station_id", "NOCALL"),
+        latitude=settings.get("latitude", 0.0),
+        longitude=settings.get("longitude", 0.0),
+        heading=settings.get("heading", 0.0),
+        fixed_heading=settings.get("gps_fixed_heading", False),
+        gps_min_speed_for_valid_heading=settings.get("gps_min_speed", 2),
+        gps_min_duration_for_valid_heading=settings.get("gps_min_speed_duration", 3),
+        krakenpro_key=settings.get("krakenpro_key", "0ae4ca6b3"),
+        RDF_mapper_server=settings.get("rdf_mapper_server", sp.RDF_mapper_server),
+        output_spool_mode=settings.get("output_spool", SPOOL_MODE_LOG),
+        doa_spectrum_encoding=settings.get("doa_spectrum_encoding", DOA_SPECTRUM_TEXT),
+        # VFO Configuration
+        spectrum_fig_type=settings.get("spectrum_calculation", "Single"),
+        vfo_mode=settings.get("vfo_mode", "Standard"),
+        vfo_default_squelch_mode=settings.get("vfo_default_squelch_mode", "Auto"),
+        vfo_default_demod=settings.get("vfo_default_demod", "None"),
+        vfo_default_iq=settings.get("vfo_default_iq", "False"),
+        max_demod_timeout=int(settings.get("max_demod_timeout", 60)),
+        dsp_decimation=int(settings.get("dsp_decimation", 1)),
+        active_vfos=min(int(settings.get("active_vfos", 1)), max_vfos),
+        output_vfo=int(settings.get("output_vfo", 0)),
+        optimize_short_bursts=settings.get("en_optimize_short_bursts", False),
+        en_peak_hold=settings.get("en_peak_hold", False),
+        overload_steps=tuple(settings.get("overload_policy", [])),
+        en_scan=settings.get("en_scan", False),
+        scan_hops=tuple(settings.get("scan_hops", [])),
+        scan_dwell_frames=int(settings.get("scan_dwell_frames", SCAN_DEFAULT_DWELL_FRAMES)),
+        vfo_bw=tuple(int(value) for value in vfo_column("bw")),
+        vfo_fir_order_factor=tuple(int(value) for value in vfo_column("fir_order_factor")),
+        vfo_freq=tuple(float(value) for value in vfo_column("freq", default_vfo_freq)),
+        vfo_squelch_mode=vfo_column("squelch_mode", "Default"),
+        vfo_squelch=tuple(int(value) for value in vfo_column("squelch")),
+        vfo_demod=vfo_column("demod", "Default"),
+        vfo_iq=vfo_column("iq", "Default"),
+    )
+
+
+def configure_signal_processor(module_signal_processor, settings, default_vfo_freq=None, defer=None):
+    """
+    Parameters:
+    -----------
+    :param: module_signal_processor: Signal processor to configure
+    :param: settings: Content of the settings file
+    :param: default_vfo_freq: VFO frequency [Hz] used when a VFO has no frequency in the settings,
+                              defaults to the configured center frequency
+    :param: defer: The settings are applied by the processing loop at the next frame boundary
+                   (apply_pending_config), defaults to True while the processing thread is running
+    """
+    if module_signal_processor.config is None and module_signal_processor.pending_config is None:
+        # First configuration, right after the signal processor has been created, later changes need a restart
+        module_signal_processor.max_vfos = int(settings.get("max_vfos", DEFAULT_MAX_VFOS))
+    config = read_signal_processor_config(module_signal_processor, settings, default_vfo_freq)
+    module_signal_processor.submit_config(config)
+    if defer is None:
+        defer = module_signal_processor.is_alive()
+    if not defer:
+        module_signal_processor.apply_pending_config()
+    return config
@@ -30,8 +30,7 @@ import time
 import traceback
 import xml.etree.ElementTree as ET
 from datetime import datetime
-from functools import lru_cache
-from multiprocessing.dummy import Pool
+from functools import lru_cache, partial
 from pathlib import Path
 from typing import Tuple
 
@@ -41,24 +40,59 @@ import numba as nb
 # Math support
 import numpy as np
 import numpy.linalg as lin
-import requests
 
 # Signal processing support
 import scipy
+from cfar import (
+    AUTO_VFO_BW_MARGIN,
+    AUTO_VFO_MIN_BW,
+    AutoVFOTracker,
+    ca_cfar,
+    cluster_detections,
+)
+from doa_serializer import (
+    DOA_SPECTRUM_SEPARATOR,
+    DOA_SPECTRUM_TEXT,
+    serialize_doa_spectrum,
+)
+from http_client import HTTPClient, public_ip_lookup
 from iq_header import IQHeader
+from kernel_warmup import get_process_start_time, start_kernel_warmup
 from kraken_sdr_receiver import ReceiverRTLSDR
+from middleware_link import MiddlewareLink
+from noise_floor import NoiseFloorEstimator, find_nearest_bins
 from numba import float32, njit, vectorize
+from output_dispatcher import OutputDispatcher, SinkConfig, write_file_atomic
+from output_spool import SPOOL_MODE_LOG, SPOOL_MODE_OFF, OutputSpool
+from overload_policy import OverloadPolicy, interpolate_doa_grid
 from pyargus import directionEstimation as de
+from result_bus import (
+    DoAResult,
+    FrameStatus,
+    ResultBus,
+    SignalLevel,
+    SpectrumResult,
+    VFOStatus,
+)
+from scan_scheduler import SCAN_DEFAULT_DWELL_FRAMES, ScanScheduler
 from scipy import fft, signal
 from signal_utils import can_store_file, fm_demod, write_wav
+from spectrum_engine import SpectrumEngine
 from variables import (
     SOFTWARE_GIT_SHORT_HASH,
     SOFTWARE_VERSION,
     SYSTEM_UNAME,
     root_path,
     shared_path,
+    startup_report_file_path,
     status_file_path,
 )
+from vfo_table import (
+    DEFAULT_MAX_VFOS,
+    DEFAULT_VFO_FIR_ORDER_FACTOR,
+    VFOTable,
+    vfo_column_property,
+)
 
 # os.environ['OPENBLAS_NUM_THREADS'] = '4'
 # os.environ['NUMBA_CPU_NAME'] = 'cortex-a72'
@@ -75,31 +109,103 @@ except ModuleNotFoundError:
 
 MIN_SPEED_FOR_VALID_HEADING = 2.0  # m / s
 MIN_DURATION_FOR_VALID_HEADING = 3.0  # s
-DEFAULT_VFO_FIR_ORDER_FACTOR = int(2)
 DEFAULT_ROOT_MUSIC_STD_DEGREES = 1
 
 NEAR_ZERO = 1e-15
 
+# Spectrum consumers registered from outside of the signal processor
+SPECTRUM_CONSUMER_PLOT = "spectrum_plot"  # Spectrum and waterfall graphs, needs every row of the spectrum
+SPECTRUM_CONSUMER_SIGNAL_LEVEL = "signal_level"  # Max amplitude readout, needs the spectrum of the first channel
+SPECTRUM_FLOOR_DB = -200
+ZOOM_SPECTRUM_SIZE = 1024  # FFT size of the high resolution spectrum around the VFOs
+CUSTOM_SCANNING_VECTORS_CACHE_SIZE = 32
+# Outputs written by the output dispatcher
+OUTPUT_DOA_VALUE = "doa_value"  # DOA_value.html, Kraken App and Kerberos App formats
+OUTPUT_DOA_XML = "doa_xml"
+OUTPUT_STATUS = "status"
+OUTPUT_DATA_RECORD = "data_record"
+OUTPUT_KRAKEN_PRO = "kraken_pro"
+OUTPUT_KRAKEN_PRO_REMOTE = "kraken_pro_remote"
+OUTPUT_RDF_MAPPER = "rdf_mapper"
+OUTPUT_FULL_POST = "full_post"
+OUTPUT_SINKS = {
+    # Files holding the current results, outdated results are skipped
+    OUTPUT_DOA_VALUE: SinkConfig(coalesce=True),
+    OUTPUT_DOA_XML: SinkConfig(coalesce=True),
+    OUTPUT_STATUS: SinkConfig(coalesce=True),
+    OUTPUT_DATA_RECORD: SinkConfig(maxsize=256),
+    # Every VFO result is forwarded to the node server
+    OUTPUT_KRAKEN_PRO: SinkConfig(),
+    OUTPUT_KRAKEN_PRO_REMOTE: SinkConfig(),
+    # Uploaded at most once per second, so the servers are not overloaded
+    OUTPUT_RDF_MAPPER: SinkConfig(coalesce=True, min_interval=1.0),
+    OUTPUT_FULL_POST: SinkConfig(coalesce=True, min_interval=1.0),
+}
+# Outputs sent to remote servers, they go through a store-and-forward spool
+SPOOLED_OUTPUTS = (OUTPUT_KRAKEN_PRO_REMOTE, OUTPUT_RDF_MAPPER, OUTPUT_FULL_POST)
+# Outputs sending the results of a frame (or a spooled batch) in one message
+BATCHED_OUTPUTS = (OUTPUT_KRAKEN_PRO, OUTPUT_KRAKEN_PRO_REMOTE)
+OUTPUT_SPOOL_PATH = os.path.join(root_path, "_spool")
+
+# Configuration fields the cached values depend on, the caches are dropped when one of them changes
+STEERING_VECTOR_CONFIG_FIELDS = frozenset(
+    (
+        "DOA_ant_alignment",
+        "DOA_inter_elem_space",
+        "DOA_UCA_radius_m",
+        "custom_array_x",
+        "custom_array_y",
+        "array_offset",
+    )
+)
+VULA_TRANSFORM_CONFIG_FIELDS = frozenset(("DOA_UCA_radius_m",))
+SPECTRUM_HISTORY_CONFIG_FIELDS = frozenset(("spectrum_fig_type", "dsp_decimation"))
+
 
 class SignalProcessor(threading.Thread):
-    def __init__(self, data_que, module_receiver: ReceiverRTLSDR, logging_level=10):
+    def __init__(self, module_receiver: ReceiverRTLSDR, logging_level=10, config_only=False):
         """
         Parameters:
         -----------
-        :param: data_que: Que to communicate with the UI (web iface/Qt GUI)
         :param: module_receiver: Kraken SDR DoA DSP receiver modules
+        :param: config_only: The object only holds the configuration and it is never started,
+                             the processing runs in a separate process (see kraken_sdr_dsp_process)
         """
         super(SignalProcessor, self).__init__()
         self.logger = logging.getLogger(__name__)
         self.logger.setLevel(logging_level)
 
+        # Compile the numba kernels in the background, so the first data frame does not have to wait for them
+        self.init_time = time.time()
+        self.first_frame_time = None
+        self.kernel_warmup = start_kernel_warmup(logging_level) if not config_only else None
+
         self.root_path = root_path
-        doa_res_file_path = os.path.join(shared_path, "DOA_value.html")
-        self.DOA_res_fd = open(doa_res_file_path, "w+")
+        self.doa_res_file_path = os.path.join(shared_path, "DOA_value.html")
+        write_file_atomic(self.doa_res_file_path, "")
+        self.output_dispatcher = None
+        self.http_client = None
+        self.public_ip = None
+        self.middleware_link = None
+        self.output_spools = {}
+        if not config_only:
+            self.init_outputs(logging_level)
 
         self.module_receiver = module_receiver
-        self.data_que = data_que
-        self.en_spectrum = False
+        # The results of every frame are published here, the UI and the other consumers subscribe to it
+        self.result_bus = ResultBus()
+        # Settings snapshot in use and the one waiting for the next frame boundary, see kraken_sdr_settings.py
+        self.config = None
+        self.pending_config = None
+        # Attribute changes forwarded in batches (DSP process), applied with the snapshot at the frame boundary
+        self.pending_attributes = {}
+        self.config_lock = threading.Lock()
+        self.config_applied = threading.Event()
+        self.config_applied.set()
+        # Consumers of the spectrum, the squelch and the Auto VFO mode are added implicitly (see is_spectrum_needed)
+        self.spectrum_consumers = set()
+        # Spectrum layout of the frame being processed, True: rows for plotting, False: squelch spectrum only
+        self.spectrum_plot_enabled = False
         self.en_record = False
         self.wav_record_path = f"{shared_path}/records/fm"
         self.en_iq_files = False
@@ -134,6 +240,8 @@ class SignalProcessor(threading.Thread):
         self.array_offset = 0.0
         self.DOA_expected_num_of_sources = 1
         self.DOA_decorrelation_method = "Off"
+        # Steering vectors of the custom array, keyed by the number of channels, the frequency and the geometry
+        self.custom_scanning_vectors = {}
 
         # Processing parameters
         self.spectrum_window_size = fft.next_fast_len(4096)
@@ -147,34 +255,25 @@ class SignalProcessor(threading.Thread):
         # Result vectors
         self.DOA = np.ones(181)
 
-        # VFO settings
-        self.max_vfos = 16
-        self.vfo_bw = [12500] * self.max_vfos
-        self.vfo_fir_order_factor = [DEFAULT_VFO_FIR_ORDER_FACTOR] * self.max_vfos
-        self.vfo_freq = [self.module_receiver.daq_center_freq] * self.max_vfos
+        # VFO settings and state, the vfo_* attributes are columns of the VFO table
+        self.vfos = VFOTable(DEFAULT_MAX_VFOS, self.module_receiver.daq_center_freq)
         self.vfo_default_squelch_mode = "Auto"
-        self.vfo_squelch_mode = ["Auto"] * self.max_vfos
-        self.vfo_squelch = [-120] * self.max_vfos
         self.vfo_default_demod = "None"
-        self.vfo_demod = ["Default"] * self.max_vfos
         self.vfo_default_iq = "False"
-        self.vfo_iq = ["Default"] * self.max_vfos
-        self.vfo_demod_channel = [np.array([])] * self.max_vfos
-        self.vfo_theta_channel = [[]] * self.max_vfos
-        self.vfo_iq_channel = [np.array([])] * self.max_vfos
-        self.vfo_blocked = [False] * self.max_vfos
-        self.vfo_time = [0] * self.max_vfos
         self.max_demod_timeout = 60
         self.default_auto_db_offset = 5  # 5dB for Auto Squelch
         self.default_auto_channel_db_offset = 3  # 3dB for Auto Channel Squelch and Scan modes
         # Ratio of Auto Channel, mean that how big should be measurement of spectrum outside of vfo_bw
         self.ratio_auto_channel = 3
+        # Tracks the noise floor over the frames for the Auto and Auto Channel squelch modes
+        self.noise_floor_estimator = NoiseFloorEstimator()
+        self.noise_floor_center_freq = None
+        # Assigns the VFOs to the signals detected in the spectrum in the CFAR VFO mode
+        self.auto_vfo_tracker = AutoVFOTracker()
+        self.auto_vfo_center_freq = None
+        self.cfar_threshold_db = 10  # Detection threshold above the local noise level
 
         self.en_fm_demod = False
-        self.vfo_fm_demod = [False] * self.max_vfos
-        self.fm_demod_channels = [None] * self.max_vfos
-        self.fm_demod_channels_thetas = [[]] * self.max_vfos
-        self.iq_channels = [None] * self.max_vfos
 
         self.active_vfos = 1
         self.output_vfo = 0
@@ -183,16 +282,33 @@ class SignalProcessor(threading.Thread):
 
         # self.DOA_theta =  np.linspace(0,359,360)
         self.spectrum = None  # np.ones((self.channel_number+2,N), dtype=np.float32)
-        self.peak_hold_spectrum = np.ones(self.spectrum_window_size) * -200
+        # Reuses its buffers, self.spectrum is overwritten on every frame
+        self.spectrum_engine = SpectrumEngine()
+        self.zoom_spectrum_engine = SpectrumEngine()
+        # High resolution spectrum of each active VFO, None if the VFO was not channelized in the last frame
+        self.zoom_spectra = []
         self.en_peak_hold = False
 
         self.latency = 100
         self.processing_time = 0
+        # Degradation steps the overload policy may take, see overload_policy.py
+        self.overload_steps = []
+        self.overload_policy = OverloadPolicy(logging_level)
+        # Frequency scan, see scan_scheduler.py
+        self.en_scan = False
+        self.scan_hops = []
+        self.scan_dwell_frames = SCAN_DEFAULT_DWELL_FRAMES
+        self.scan_scheduler = ScanScheduler(logging_level)
+        # Center frequency before the scan started, the wavelength normalized array geometry refers to it
+        self.scan_home_freq = None
+        self.sampling_freq = 0
         self.timestamp = int(time.time() * 1000)
         self.gps_timestamp = int(0)
 
         # Output Data format. XML for Kerberos, CSV for Kracken, JSON future
         self.DOA_data_format = "Kraken App"  # XML, CSV, or JSON
+        self.output_spool_mode = SPOOL_MODE_LOG
+        self.doa_spectrum_encoding = DOA_SPECTRUM_TEXT
 
         # Location parameters
         self.gps_status = "Disabled"
@@ -212,9 +328,6 @@ class SignalProcessor(threading.Thread):
         self.krakenpro_key = "0"
         self.RDF_mapper_server = "http://MY_RDF_MAPPER_SERVER.com/save.php"
         self.full_rest_server = "http://MY_REST_SERVER.com/save.php"
-        self.pool = Pool()
-        self.rdf_mapper_last_write_time = time.time()
-        self.doa_max_list = [-1] * self.max_vfos
 
         self.theta_0_list = []
         self.freq_list = []
@@ -225,72 +338,199 @@ class SignalProcessor(threading.Thread):
 
         # TODO: NEED to have a funtion to update the file name if changed in the web ui
         self.data_recording_file_name = "mydata.csv"
-        data_recording_file_path = os.path.join(os.path.join(self.root_path, self.data_recording_file_name))
-        self.data_record_fd = open(data_recording_file_path, "a+")
+        open(self.data_recording_file_path, "a").close()
         self.en_data_record = False
         self.write_interval = 1
-        self.last_write_time = [time.time()] * self.max_vfos
 
         self.adc_overdrive = False
+        self.kerberos_doa_output = ("", "", "")
+        # Stage utilization and ring occupancy, only set when running as a multi-process pipeline
+        self.pipeline_status = None
         self.number_of_correlated_sources = []
         self.snrs = []
         self.dropped_frames = 0
 
+    vfo_freq = vfo_column_property("freq")
+    vfo_bw = vfo_column_property("bw")
+    vfo_fir_order_factor = vfo_column_property("fir_order_factor")
+    vfo_squelch_mode = vfo_column_property("squelch_mode")
+    vfo_squelch = vfo_column_property("squelch")
+    vfo_demod = vfo_column_property("demod")
+    vfo_iq = vfo_column_property("iq")
+
+    @property
+    def max_vfos(self):
+        return len(self.vfos)
+
+    @max_vfos.setter
+    def max_vfos(self, value):
+        if value != len(self.vfos):
+            self.vfos.resize(value)
+            self.active_vfos = min(self.active_vfos, len(self.vfos))
+
     @property
     def vfo_demod_modes(self):
-        vfo_demod = [self.vfo_default_demod] * self.max_vfos
-        for i in range(len(self.vfo_demod)):
-            demod = self.vfo_demod[i]
-            if demod != "Default":
-                vfo_demod[i] = demod
-        return vfo_demod
+        self.vfos.resolve_defaults(self.vfo_default_demod, self.vfo_default_iq)
+        return self.vfos.demod_modes
 
     @property
     def vfo_iq_enabled(self):
-        vfo_iq = [True if self.vfo_default_iq == "True" else False] * self.max_vfos
-        for i in range(len(self.vfo_iq)):
-            demod = self.vfo_iq[i]
-            if demod != "Default":
-                vfo_iq[i] = True if demod == "True" else False
-        return vfo_iq
+        self.vfos.resolve_defaults(self.vfo_default_demod, self.vfo_default_iq)
+        return self.vfos.iq_enabled
+
+    def submit_config(self, config):
+        """
+        Queues a settings snapshot, it replaces the snapshot waiting to be applied (if any)
+        """
+        with self.config_lock:
+            self.pending_config = config
+            self.config_applied.clear()
+
+    def submit_attributes(self, attributes):
+        """
+        Queues attribute changes (name: value), they are applied at the next frame boundary after the queued
+        settings snapshot, in the order they were given. Later changes of an attribute replace the queued value.
+        """
+        with self.config_lock:
+            self.pending_attributes.update(attributes)
+            self.config_applied.clear()
+
+    def wait_config_applied(self, timeout):
+        """
+        Waits until the queued settings snapshot has been applied, returns False on timeout
+        """
+        return self.config_applied.wait(timeout)
+
+    def apply_pending_config(self):
+        """
+        Applies the queued settings snapshot and attribute changes, called between two frames by the processing loop.
+        The caches are only dropped if the fields they depend on have changed.
+        Returns the names of the changed fields.
+        """
+        with self.config_lock:
+            config, self.pending_config = self.pending_config, None
+            attributes, self.pending_attributes = self.pending_attributes, {}
+        if config is None and not attributes:
+            return frozenset()
+
+        changed_fields = frozenset()
+        if config is not None:
+            previous_config, self.config = self.config, config
+            changed_fields = config.changed_fields(previous_config)
+            config.apply(self)
+            if previous_config is not None and changed_fields:
+                self.logger.debug(f"Settings changed: {', '.join(sorted(changed_fields))}")
+                self.invalidate_caches(changed_fields)
+        if attributes:
+            for name, value in attributes.items():
+                setattr(self, name, value)
+            self.logger.debug(f"Attributes changed: {', '.join(sorted(attributes))}")
+            self.invalidate_caches(frozenset(attributes))
+            changed_fields |= frozenset(attributes)
+        with self.config_lock:
+            if self.pending_config is None and not self.pending_attributes:
+                self.config_applied.set()
+        return changed_fields
+
+    def invalidate_caches(self, changed_fields):
+        """
+        Drops the cached values that depend on the changed configuration fields
+        """
+        if changed_fields & STEERING_VECTOR_CONFIG_FIELDS:
+            gen_scanning_vectors.cache_clear()
+            gen_scanning_vectors_phase_modes_space.cache_clear()
+            self.custom_scanning_vectors.clear()
+        if changed_fields & VULA_TRANSFORM_CONFIG_FIELDS:
+            T.cache_clear()
+        if changed_fields & SPECTRUM_HISTORY_CONFIG_FIELDS:
+            # The spectrum bins have changed
+            self.spectrum_engine.reset_hold()
+            self.noise_floor_estimator.reset()
+            self.auto_vfo_tracker.reset()
+
+    @property
+    def en_spectrum(self):
+        return SPECTRUM_CONSUMER_PLOT in self.spectrum_consumers
+
+    @en_spectrum.setter
+    def en_spectrum(self, value):
+        if value:
+            self.add_spectrum_consumer(SPECTRUM_CONSUMER_PLOT)
+        else:
+            self.remove_spectrum_consumer(SPECTRUM_CONSUMER_PLOT)
+
+    def add_spectrum_consumer(self, consumer):
+        self.spectrum_consumers = self.spectrum_consumers | {consumer}
+
+    def remove_spectrum_consumer(self, consumer):
+        self.spectrum_consumers = self.spectrum_consumers - {consumer}
+
+    def is_spectrum_needed(self):
+        """
+        Returns True if the spectrum of the first channel is used. The VFO squelch gates the DoA estimation
+        (and through it the outputs and the recorders), the Auto and CFAR VFO modes tune to the signals
+        in the spectrum.
+        """
+        return bool(self.spectrum_consumers) or self.en_DOA_estimation or self.vfo_mode in ["Auto", "CFAR"]
+
+    @property
+    def effective_spectrum_fig_type(self):
+        """Spectrum calculation mode in use, the overload policy may fall back from Full to Single"""
+        return "Single" if self.overload_policy.single_spectrum else self.spectrum_fig_type
+
+    def is_stale_frame(self):
+        """
+        Returns True if the overload policy skips the acquired frame, because a newer one is already waiting
+        """
+        iq_header = self.module_receiver.iq_header
+        if iq_header.frame_type != iq_header.FRAME_TYPE_DATA or not iq_header.sampling_freq:
+            return False
+        frame_delay = int(time.time() * 10**3) - iq_header.time_stamp
+        cpi_time = iq_header.cpi_length * 10**3 / iq_header.sampling_freq
+        return self.overload_policy.is_stale_frame(frame_delay, cpi_time, self.overload_steps)
 
     def resetPeakHold(self):
         if self.spectrum_fig_type == "Single":
-            self.peak_hold_spectrum = np.ones(self.spectrum_window_size) * -200
+            self.spectrum_engine.reset_hold()
 
-    def mean_spectrum(self, measured_spec):
-        def is_enabled_auto_squelch(v):
-            return v == "Auto" or (v == "Default" and self.vfo_default_squelch_mode == "Auto")
+    def is_auto_squelch_mode(self, vfo_squelch_mode, mode):
+        return vfo_squelch_mode == mode or (vfo_squelch_mode == "Default" and self.vfo_default_squelch_mode == mode)
 
-        auto_squelch = any(is_enabled_auto_squelch(vfo_squelch_mode) for vfo_squelch_mode in self.vfo_squelch_mode)
-        if auto_squelch:
-            measured_spec_mean = np.mean(measured_spec)
-            vfo_auto_squelch = measured_spec_mean + self.default_auto_db_offset
+    def mean_spectrum(self):
+        auto_squelch = [self.is_auto_squelch_mode(mode, "Auto") for mode in self.vfo_squelch_mode]
+        if any(auto_squelch):
+            vfo_auto_squelch = self.noise_floor_estimator.get_noise_floor() + self.default_auto_db_offset
 
             for i in range(len(self.vfo_squelch)):
-                auto_squelch = is_enabled_auto_squelch(self.vfo_squelch_mode[i])
-                if auto_squelch:
+                if auto_squelch[i]:
                     self.vfo_squelch[i] = vfo_auto_squelch
 
     def calculate_squelch(self, sampling_freq, N, measured_spec, real_freqs):
-        def find_nearest(array, value):
-            array = np.asarray(array)
-            idx = (np.abs(array - value)).argmin()
-            return idx, array[idx]
-
-        self.mean_spectrum(measured_spec)
-
-        for i, vfo_squelch_mode in enumerate(self.vfo_squelch_mode[: self.active_vfos]):
-            if vfo_squelch_mode == "Auto Channel" or (
-                vfo_squelch_mode == "Default" and self.vfo_default_squelch_mode == "Auto Channel"
-            ):
-                vfo_bw_freq_window = int(self.vfo_bw[i] / (sampling_freq / N))
-                freq_idx, nearsest = find_nearest(real_freqs, self.vfo_freq[i])
-                vfo_freq_window = int(vfo_bw_freq_window / 2 + self.ratio_auto_channel * vfo_bw_freq_window)
-                vfo_start_measure_spec = freq_idx - min(abs(freq_idx), vfo_freq_window)
-                vfo_end_measure_spec = freq_idx + min(abs(N - freq_idx), vfo_freq_window)
-                measured_spec_mean = np.mean(measured_spec[vfo_start_measure_spec:vfo_end_measure_spec])
-                self.vfo_squelch[i] = measured_spec_mean + self.default_auto_channel_db_offset
+        if self.module_receiver.daq_center_freq != self.noise_floor_center_freq:
+            # The noise floor of the previous band is not relevant anymore
+            self.noise_floor_estimator.reset()
+            self.noise_floor_center_freq = self.module_receiver.daq_center_freq
+        self.noise_floor_estimator.update(measured_spec)
+
+        self.mean_spectrum()
+
+        auto_channel_vfos = [
+            i
+            for i, vfo_squelch_mode in enumerate(self.vfo_squelch_mode[: self.active_vfos])
+            if self.is_auto_squelch_mode(vfo_squelch_mode, "Auto Channel")
+        ]
+        if not auto_channel_vfos:
+            return
+
+        # Mean noise floor around every Auto Channel VFO in one step
+        vfo_bw_freq_window = (np.array(self.vfo_bw)[auto_channel_vfos] / (sampling_freq / N)).astype(int)
+        freq_idx = find_nearest_bins(real_freqs, np.array(self.vfo_freq)[auto_channel_vfos])
+        vfo_freq_window = (vfo_bw_freq_window / 2 + self.ratio_auto_channel * vfo_bw_freq_window).astype(int)
+        measured_spec_means = self.noise_floor_estimator.get_window_means(
+            freq_idx - vfo_freq_window, freq_idx + vfo_freq_window
+        )
+        for i, measured_spec_mean in zip(auto_channel_vfos, measured_spec_means):
+            self.vfo_squelch[i] = measured_spec_mean + self.default_auto_channel_db_offset
 
     def save_processing_status(self) -> None:
         """This method serializes system status to file."""
@@ -337,10 +577,62 @@ class SignalProcessor(threading.Thread):
             and daq_status.get("iq_sync", False)
         )
         status["daq_num_dropped_frames"] = self.dropped_frames
-
+        status["overload"] = self.overload_policy.get_status()
+        if self.scan_scheduler.active:
+            status["scan"] = self.scan_scheduler.get_status()
+        if self.pipeline_status is not None:
+            status["pipeline"] = self.pipeline_status
+        if self.result_bus.subscriptions:
+            status["result_bus"] = self.result_bus.get_stats()
+        status["outputs"] = self.output_dispatcher.get_stats()
+        if self.http_client.requests:
+            status["http"] = self.http_client.get_stats()
+        if self.middleware_link.messages:
+            status["middleware"] = self.middleware_link.get_stats()
+        if self.output_spools:
+            status["spool"] = {name: spool.get_stats() for name, spool in self.output_spools.items()}
+
+        self.output_dispatcher.submit(OUTPUT_STATUS, partial(write_json_file, status_file_path, status))
+
+    def init_outputs(self, logging_level):
+        """
+        Creates the output dispatcher writing the result files and posting the results from worker threads,
+        and the HTTP client shared by the network outputs
+        """
+        self.output_dispatcher = OutputDispatcher(OUTPUT_SINKS, logging_level)
+        self.http_client = HTTPClient(logging_level=logging_level)
+        # Only looked up once the Full POST output asks for it
+        self.public_ip = public_ip_lookup(self.http_client)
+        # Stream to the node middleware, for the Kraken Pro outputs
+        self.middleware_link = MiddlewareLink(logging_level=logging_level)
+        self.output_senders = {
+            OUTPUT_KRAKEN_PRO: self.post_kraken_pro,
+            OUTPUT_KRAKEN_PRO_REMOTE: self.post_kraken_pro,
+            OUTPUT_RDF_MAPPER: self.post_rdf_mapper,
+            OUTPUT_FULL_POST: self.post_full_post,
+        }
+
+    def save_startup_report(self) -> None:
+        """This method logs and saves how long the startup took until the first data frame was processed."""
+
+        report = {}
+        process_start_time = get_process_start_time()
+        if process_start_time is not None:
+            # Python imports and initialization before the signal processor was created
+            report["process_start_to_init_s"] = round(self.init_time - process_start_time, 3)
+        report["init_to_first_frame_s"] = round(self.first_frame_time - self.init_time, 3)
+        report["first_frame_processing_time_ms"] = self.processing_time
+        report["kernel_warmup_finished"] = self.kernel_warmup.finished.is_set()
+        if report["kernel_warmup_finished"]:
+            report["kernel_warmup_s"] = round(self.kernel_warmup.elapsed, 3)
+            report["kernel_warmup_timings_s"] = {
+                name: round(elapsed, 3) for name, elapsed in self.kernel_warmup.timings.items()
+            }
+
+        self.logger.info(f"Startup report: {report}")
         try:
-            with open(status_file_path, "w", encoding="utf-8") as file:
-                json.dump(status, file)
+            with open(startup_report_file_path, "w", encoding="utf-8") as file:
+                json.dump(report, file)
         except Exception:
             pass
 
@@ -352,596 +644,699 @@ class SignalProcessor(threading.Thread):
         while True:
             self.is_running = False
             time.sleep(1)
+            self.apply_pending_config()
             while self.run_processing:
                 self.is_running = True
-                que_data_packet = []
+                frame_results = []
+                self.apply_pending_config()
 
                 if self.hasgps and self.usegps:
                     self.update_location_and_timestamp()
 
+                self.step_scan()
+
                 # -----> ACQUIRE NEW DATA FRAME <-----
                 get_iq_failed = self.module_receiver.get_iq_online()
+                if not get_iq_failed and (self.is_stale_frame() or self.is_scan_dead_time_frame()):
+                    continue
 
                 start_time = time.time()
                 self.save_processing_status()
 
-                que_data_packet.append(["iq_header", self.module_receiver.iq_header])
-                self.logger.debug("IQ header has been put into the data que entity")
-
-                # Check frame type for processing
-                """
-                    You can enable here to process other frame types (such as call type frames)
-                """
-                en_proc = (
-                    self.module_receiver.iq_header.frame_type == self.module_receiver.iq_header.FRAME_TYPE_DATA
-                )  # or \
-                # (self.module_receiver.iq_header.frame_type == self.module_receiver.iq_header.FRAME_TYPE_CAL)# For debug purposes
-
-                self.data_ready = False
-
-                if not self.module_receiver.iq_samples.size and get_iq_failed:
-                    if not self.dropped_frames:
-                        logging.error(
-                            """The data frame was lost while processing was active!
-                            This might indicate issues with USB data cable or USB host,
-                            inadequate power supply, overloaded CPU, wrong host OS settings, etc."""
-                        )
-                    self.dropped_frames += 1
-                elif en_proc:
-                    self.timestamp = self.module_receiver.iq_header.time_stamp
-                    self.adc_overdrive = self.module_receiver.iq_header.adc_overdrive_flags
-
-                    # Configure processing parameteres based on the settings of the DAQ chain
-                    if self.first_frame:
-                        self.channel_number = self.module_receiver.iq_header.active_ant_chs
-                        self.spectrum = np.ones(
-                            (self.channel_number + 4, self.spectrum_window_size),
-                            dtype=np.float32,
-                        )
-                        self.first_frame = 0
+                en_proc = self.process_spectrum(get_iq_failed, frame_results)
+                if en_proc:
+                    self.process_doa(frame_results)
+                    self.process_outputs(start_time)
 
-                    self.processed_signal = np.ascontiguousarray(self.module_receiver.iq_samples)
-                    sampling_freq = self.module_receiver.iq_header.sampling_freq
+                self.publish_results(frame_results, start_time, get_iq_failed)
+                if en_proc:
+                    self.overload_policy.update(self.processing_time, self.latency, self.overload_steps)
+                    self.scan_scheduler.frame_done(len(self.theta_0_list))
 
-                    global_decimation_factor = max(
-                        int(self.dsp_decimation), 1
-                    )  # max(int(self.phasetest[0]), 1) #ps_len // 65536 #int(self.phasetest[0]) + 1
+    def step_scan(self):
+        """
+        Follows the changes of the scan settings and sends the retune commands of the frequency scan
+        """
+        if self.scan_scheduler.configure(self.scan_hops if self.en_scan else [], self.scan_dwell_frames):
+            if self.scan_scheduler.active and self.scan_home_freq is None:
+                self.scan_home_freq = self.module_receiver.daq_center_freq
+            elif not self.scan_scheduler.active and self.scan_home_freq is not None:
+                self.module_receiver.set_center_freq(self.scan_home_freq)
+                self.scan_home_freq = None
+
+        hop = self.scan_scheduler.pop_retune_request()
+        if hop is not None:
+            self.module_receiver.set_center_freq(hop.center_freq)
+            # The DAQ is being reconfigured, prepare the filters and the steering vectors of the hop meanwhile
+            self.warm_up_scan_hop(hop)
+
+    def is_scan_dead_time_frame(self):
+        """
+        Returns True if the data frame was captured before the retune to the current hop has finished.
+        The VFOs of the hop are applied to the frames that are processed.
+        """
+        iq_header = self.module_receiver.iq_header
+        if not self.scan_scheduler.active or iq_header.frame_type != iq_header.FRAME_TYPE_DATA:
+            return False
+        if not self.scan_scheduler.accept_frame(iq_header.rf_center_freq):
+            return True
+
+        hop = self.scan_scheduler.current_hop
+        self.active_vfos = min(len(hop.vfo_freqs), self.max_vfos)
+        for i, (vfo_freq, vfo_bw) in enumerate(zip(hop.vfo_freqs[: self.max_vfos], hop.vfo_bws)):
+            self.vfo_freq[i] = vfo_freq
+            if vfo_bw is not None:
+                self.vfo_bw[i] = vfo_bw
+        return False
+
+    def warm_up_scan_hop(self, hop):
+        """
+        Fills the channelizer filter and the steering vector caches for the VFOs of a scan hop
+        """
+        if not self.sampling_freq:
+            return
+        for i, (vfo_freq, vfo_bw) in enumerate(zip(hop.vfo_freqs[: self.max_vfos], hop.vfo_bws)):
+            if vfo_bw is None:
+                vfo_bw = self.vfo_bw[i]
+            decimation_factor = max((self.sampling_freq // vfo_bw), 1)
+            fir_order_factor = max(self.vfo_fir_order_factor[i], DEFAULT_VFO_FIR_ORDER_FACTOR)
+            shift_filter(decimation_factor, fir_order_factor, vfo_freq - hop.center_freq, self.sampling_freq, 1.1)
+            if self.DOA_ant_alignment in ["ULA", "UCA"] and self.channel_number > 1:
+                inter_element_spacing = self.DOA_inter_elem_space * (vfo_freq / self.scan_home_freq)
+                gen_scanning_vectors(
+                    self.channel_number, inter_element_spacing, self.DOA_ant_alignment, int(self.array_offset)
+                )
 
-                    if global_decimation_factor > 1:
-                        self.processed_signal = signal.decimate(
-                            self.processed_signal,
-                            global_decimation_factor,
-                            n=global_decimation_factor * 5,
-                            ftype="fir",
-                        )
-                        sampling_freq = sampling_freq // global_decimation_factor
+    def assign_auto_vfos(self, sampling_freq):
+        """
+        Tunes the active VFOs to the signals detected by the CFAR detector in the spectrum of the first channel.
+        Returns for each active VFO whether its signal is present in the current frame.
+        """
+        if self.module_receiver.daq_center_freq != self.auto_vfo_center_freq:
+            self.auto_vfo_tracker.reset()
+            self.auto_vfo_center_freq = self.module_receiver.daq_center_freq
+
+        relative_freqs = self.spectrum[0, :]
+        measured_spec = self.spectrum[1, :]
+        detections = ca_cfar(measured_spec, threshold_db=self.cfar_threshold_db)
+        freqs, widths, levels = cluster_detections(detections, measured_spec, relative_freqs)
+        bws = np.clip(widths * AUTO_VFO_BW_MARGIN, AUTO_VFO_MIN_BW, sampling_freq)
+
+        detected = [False] * self.active_vfos
+        for i, vfo in enumerate(self.auto_vfo_tracker.update(freqs, bws, levels, self.active_vfos)):
+            if vfo is not None:
+                freq, bw, detected[i] = vfo
+                self.vfo_freq[i] = int(freq + self.module_receiver.daq_center_freq)
+                self.vfo_bw[i] = int(bw)
+        return detected
+
+    def process_spectrum(self, get_iq_failed, frame_results) -> bool:
+        """
+        Decimates the acquired data frame and calculates its spectrum.
+        Returns False if the frame is not a data frame or it was lost, in this case the rest of the processing
+        is skipped.
+        """
+        # Check frame type for processing
+        """
+            You can enable here to process other frame types (such as call type frames)
+        """
+        en_proc = self.module_receiver.iq_header.frame_type == self.module_receiver.iq_header.FRAME_TYPE_DATA  # or \
+        # (self.module_receiver.iq_header.frame_type == self.module_receiver.iq_header.FRAME_TYPE_CAL)# For debug purposes
 
-                    self.data_ready = True
+        self.data_ready = False
 
-                    if self.spectrum_fig_type == "Single":
-                        m = 0
-                        N = self.spectrum_window_size
-                        self.spectrum = (
-                            np.ones(
-                                (self.channel_number + (self.active_vfos * 2 + 1), N),
-                                dtype=np.float32,
-                            )
-                            * -200
-                        )  # Only 0.1 ms, not performance bottleneck
+        if not self.module_receiver.iq_samples.size and get_iq_failed:
+            if not self.dropped_frames:
+                logging.error(
+                    """The data frame was lost while processing was active!
+                    This might indicate issues with USB data cable or USB host,
+                    inadequate power supply, overloaded CPU, wrong host OS settings, etc."""
+                )
+            self.dropped_frames += 1
+            return False
+        if not en_proc:
+            return False
+
+        self.timestamp = self.module_receiver.iq_header.time_stamp
+        self.adc_overdrive = self.module_receiver.iq_header.adc_overdrive_flags
+
+        # Configure processing parameteres based on the settings of the DAQ chain
+        if self.first_frame:
+            self.channel_number = self.module_receiver.iq_header.active_ant_chs
+            self.spectrum = np.ones(
+                (self.channel_number + 4, self.spectrum_window_size),
+                dtype=np.float32,
+            )
+            self.first_frame = 0
 
-                        single_ch = self.processed_signal[1, :]
+        self.processed_signal = np.ascontiguousarray(self.module_receiver.iq_samples)
+        sampling_freq = self.module_receiver.iq_header.sampling_freq
 
-                        noverlap = int(N * 0)
-                        window = "blackman"
-                        if self.optimize_short_bursts:
-                            noverlap = int(N * 0.5)
-                            window = ("tukey", 0.15)
+        global_decimation_factor = max(
+            int(self.dsp_decimation), 1
+        )  # max(int(self.phasetest[0]), 1) #ps_len // 65536 #int(self.phasetest[0]) + 1
 
-                        f, Pxx_den = signal.welch(
-                            single_ch,
-                            sampling_freq,
-                            nperseg=N,
-                            nfft=N,
-                            noverlap=noverlap,  # int(N_perseg*0.0),
-                            detrend=False,
-                            return_onesided=False,
-                            window=window,
-                            # 'blackman', #('tukey', 0.25), #tukey window gives better time resolution for squelching
-                            scaling="spectrum",
-                        )
-                        self.spectrum[1 + m, :] = fft.fftshift(10 * np.log10(Pxx_den))
-                        if self.en_peak_hold:
-                            self.spectrum[2 + m, :] = np.maximum(self.peak_hold_spectrum, self.spectrum[1 + m, :])
-                            self.peak_hold_spectrum = self.spectrum[2 + m, :]
+        if global_decimation_factor > 1:
+            self.processed_signal = signal.decimate(
+                self.processed_signal,
+                global_decimation_factor,
+                n=global_decimation_factor * 5,
+                ftype="fir",
+            )
+            sampling_freq = sampling_freq // global_decimation_factor
+
+        self.data_ready = True
+
+        # The plot rows, the peak hold and the "Full" periodograms are only calculated for the spectrum graphs,
+        # the squelch needs the spectrum of the first channel only
+        self.spectrum_plot_enabled = self.en_spectrum
+        spectrum_rows = self.channel_number + (self.active_vfos * 2 + 1) if self.spectrum_plot_enabled else 2
+
+        if not self.spectrum_plot_enabled and not self.is_spectrum_needed():
+            N = self.spectrum_window_size
+            self.spectrum = self.spectrum_engine.get_buffer(spectrum_rows, N, SPECTRUM_FLOOR_DB)
+            self.spectrum[0, :] = get_spectrum_freq_axis(N, sampling_freq)
+        elif self.effective_spectrum_fig_type == "Single" or not self.spectrum_plot_enabled:
+            N = self.spectrum_window_size
+            self.spectrum = self.spectrum_engine.get_buffer(spectrum_rows, N, SPECTRUM_FLOOR_DB)
+
+            noverlap = int(N * 0)
+            window = "blackman"
+            if self.optimize_short_bursts:
+                noverlap = int(N * 0.5)
+                window = ("tukey", 0.15)  # tukey window gives better time resolution for squelching
+
+            self.spectrum_engine.welch(self.processed_signal[1, :], N, noverlap, window, self.spectrum[1, :])
+            if self.en_peak_hold and self.spectrum_plot_enabled:
+                self.spectrum[2, :] = self.spectrum_engine.update_hold(self.spectrum[1, :])
+
+            self.spectrum[0, :] = get_spectrum_freq_axis(N, sampling_freq)
+        else:
+            N = 32768
+            self.spectrum = self.spectrum_engine.get_buffer(spectrum_rows, N, 1)
+            # All channels with a single FFT call
+            self.spectrum_engine.periodogram(
+                self.processed_signal, N, "blackman", self.spectrum[1 : self.channel_number + 1, :]
+            )
+            self.spectrum[0, :] = get_spectrum_freq_axis(N, sampling_freq)
+
+        max_amplitude = np.max(self.spectrum[1, :])  # Max amplitude out of all 5 channels
+        frame_results.append(SignalLevel(float(max_amplitude)))
+
+        self.sampling_freq = sampling_freq
+        return True
 
-                        self.spectrum[0, :] = fft.fftshift(f)
+    def process_doa(self, frame_results):
+        """
+        Estimates the spectrum based squelch levels, channelizes the active VFOs and estimates their DoAs
+        """
+        sampling_freq = self.sampling_freq
+
+        # -----> DoA PROCESSING <-----
+        try:
+            if self.data_ready:
+                spectrum_window_size = len(self.spectrum[0, :])
+                active_vfos = self.active_vfos if self.vfo_mode != "Auto" else 1
+                output_vfo = self.output_vfo
+                if output_vfo < 0 and self.overload_policy.output_vfo_only:
+                    output_vfo = 0
+                write_freq = 0
+                update_list = [False] * self.max_vfos
+                conf_val = 0
+                theta_0 = 0
+                DOA_str = ""
+                confidence_str = ""
+                max_power_level_str = ""
+                doa_result_log = np.empty(0)
+
+                self.theta_0_list.clear()
+                self.freq_list.clear()
+                self.doa_result_log_list.clear()
+                self.max_power_level_list.clear()
+                self.confidence_list.clear()
+                self.number_of_correlated_sources.clear()
+                self.snrs.clear()
+                self.fm_demod_channel_list.clear()
+                self.zoom_spectra = [None] * active_vfos
+                # Resolved once per frame, read several times for each VFO below
+                self.vfos.resolve_defaults(self.vfo_default_demod, self.vfo_default_iq)
+                vfo_demod_modes = self.vfos.demod_modes
+                vfo_iq_enabled = self.vfos.iq_enabled
+
+                relative_freqs = self.spectrum[0, ::-1]
+                real_freqs = self.module_receiver.daq_center_freq - relative_freqs
+                measured_spec = self.spectrum[1, :]
+
+                self.calculate_squelch(sampling_freq, spectrum_window_size, measured_spec, real_freqs)
+                if self.vfo_mode == "CFAR":
+                    # The detector replaces the squelch, the DoA is only estimated where a signal is present
+                    auto_vfo_detected = self.assign_auto_vfos(sampling_freq)
+
+                for i in range(active_vfos):
+                    # If chanenl freq is out of bounds for the current tuned bandwidth, reset to the middle freq
+                    if abs(self.vfo_freq[i] - self.module_receiver.daq_center_freq) > sampling_freq / 2:
+                        self.vfo_freq[i] = self.module_receiver.daq_center_freq
+
+                    freq = (
+                        self.vfo_freq[i] - self.module_receiver.daq_center_freq
+                    )  # ch_freq is relative to -sample_freq/2 : sample_freq/2, so correct for that and get the actual freq
+
+                    if self.vfo_mode == "Auto":  # Mode 1 is Auto Max Mode
+                        max_index = self.spectrum[1, :].argmax()
+                        freq = self.spectrum[0, max_index]
+                        self.vfo_freq[i] = freq + self.module_receiver.daq_center_freq
+
+                    decimation_factor = max(
+                        (sampling_freq // self.vfo_bw[i]), 1
+                    )  # How much decimation is required to get to the requested bandwidth
+
+                    # Get max amplitude of the channel from the FFT for squelching
+                    # From channel frequency determine array index of channel
+                    vfo_width_idx = int(
+                        (spectrum_window_size * self.vfo_bw[i]) / (sampling_freq)
+                    )  # Width of channel in array indexes based on FFT size
+                    vfo_width_idx = max(vfo_width_idx, 2)
+
+                    freqMin = -sampling_freq / 2
+
+                    vfo_center_idx = int((((freq - freqMin) * spectrum_window_size) / sampling_freq))
+
+                    vfo_upper_bound = vfo_center_idx + vfo_width_idx // 2
+                    vfo_lower_bound = vfo_center_idx - vfo_width_idx // 2
+
+                    if (
+                        self.effective_spectrum_fig_type == "Single" or not self.spectrum_plot_enabled
+                    ):  # Do CH1 only (or make channel selectable)
+                        spectrum_channel = self.spectrum[
+                            1,
+                            max(vfo_lower_bound, 0) : min(vfo_upper_bound, spectrum_window_size),
+                        ]
+                        max_amplitude = np.max(spectrum_channel)
                     else:
-                        N = 32768
-                        self.spectrum = np.ones(
-                            (self.channel_number + (self.active_vfos * 2 + 1), N),
-                            dtype=np.float32,
+                        spectrum_channel = self.spectrum[
+                            :,
+                            max(vfo_lower_bound, 0) : min(vfo_upper_bound, spectrum_window_size),
+                        ]
+                        max_amplitude = np.max(
+                            spectrum_channel[
+                                1 : self.module_receiver.iq_header.active_ant_chs + 1,
+                                :,
+                            ]
                         )
-                        for m in range(self.channel_number):  # range(1): #range(self.channel_number):
-                            f, Pxx_den = signal.periodogram(
-                                self.processed_signal[m, :],
-                                sampling_freq,
-                                nfft=N,
-                                detrend=False,
-                                return_onesided=False,
-                                window="blackman",
-                                scaling="spectrum",
-                            )
-                            self.spectrum[1 + m, :] = fft.fftshift(10 * np.log10(Pxx_den))
-                        self.spectrum[0, :] = fft.fftshift(f)
-
-                    max_amplitude = np.max(self.spectrum[1, :])  # Max amplitude out of all 5 channels
-                    que_data_packet.append(["max_amplitude", max_amplitude])
-
-                    # -----> DoA PROCESSING <-----
-                    try:
-                        if self.data_ready:
-                            spectrum_window_size = len(self.spectrum[0, :])
-                            active_vfos = self.active_vfos if self.vfo_mode == "Standard" else 1
-                            write_freq = 0
-                            update_list = [False] * self.max_vfos
-                            conf_val = 0
-                            theta_0 = 0
-                            DOA_str = ""
-                            confidence_str = ""
-                            max_power_level_str = ""
-                            doa_result_log = np.empty(0)
-
-                            self.theta_0_list.clear()
-                            self.freq_list.clear()
-                            self.doa_result_log_list.clear()
-                            self.max_power_level_list.clear()
-                            self.confidence_list.clear()
-                            self.number_of_correlated_sources.clear()
-                            self.snrs.clear()
-                            self.fm_demod_channel_list.clear()
-
-                            relative_freqs = self.spectrum[0, ::-1]
-                            real_freqs = self.module_receiver.daq_center_freq - relative_freqs
-                            measured_spec = self.spectrum[1, :]
-
-                            self.calculate_squelch(sampling_freq, N, measured_spec, real_freqs)
-
-                            for i in range(active_vfos):
-                                # If chanenl freq is out of bounds for the current tuned bandwidth, reset to the middle freq
-                                if abs(self.vfo_freq[i] - self.module_receiver.daq_center_freq) > sampling_freq / 2:
-                                    self.vfo_freq[i] = self.module_receiver.daq_center_freq
-
-                                freq = (
-                                    self.vfo_freq[i] - self.module_receiver.daq_center_freq
-                                )  # ch_freq is relative to -sample_freq/2 : sample_freq/2, so correct for that and get the actual freq
-
-                                if self.vfo_mode == "Auto":  # Mode 1 is Auto Max Mode
-                                    max_index = self.spectrum[1, :].argmax()
-                                    freq = self.spectrum[0, max_index]
-                                    self.vfo_freq[i] = freq + self.module_receiver.daq_center_freq
-
-                                decimation_factor = max(
-                                    (sampling_freq // self.vfo_bw[i]), 1
-                                )  # How much decimation is required to get to the requested bandwidth
-
-                                # Get max amplitude of the channel from the FFT for squelching
-                                # From channel frequency determine array index of channel
-                                vfo_width_idx = int(
-                                    (spectrum_window_size * self.vfo_bw[i]) / (sampling_freq)
-                                )  # Width of channel in array indexes based on FFT size
-                                vfo_width_idx = max(vfo_width_idx, 2)
-
-                                freqMin = -sampling_freq / 2
-
-                                vfo_center_idx = int((((freq - freqMin) * spectrum_window_size) / sampling_freq))
-
-                                vfo_upper_bound = vfo_center_idx + vfo_width_idx // 2
-                                vfo_lower_bound = vfo_center_idx - vfo_width_idx // 2
-
-                                if self.spectrum_fig_type == "Single":  # Do CH1 only (or make channel selectable)
-                                    spectrum_channel = self.spectrum[
-                                        1,
-                                        max(vfo_lower_bound, 0) : min(vfo_upper_bound, spectrum_window_size),
-                                    ]
-                                    max_amplitude = np.max(spectrum_channel)
-                                else:
-                                    spectrum_channel = self.spectrum[
-                                        :,
-                                        max(vfo_lower_bound, 0) : min(vfo_upper_bound, spectrum_window_size),
-                                    ]
-                                    max_amplitude = np.max(
-                                        spectrum_channel[
-                                            1 : self.module_receiver.iq_header.active_ant_chs + 1,
-                                            :,
-                                        ]
-                                    )
-
-                                # *** HERE WE NEED TO PERFORM THE SPECTRUM UPDATE TOO ***
-                                if self.en_spectrum:
-                                    # Selected Channel Window
-                                    signal_window = np.zeros(spectrum_window_size) - 120
-                                    signal_window[
-                                        max(vfo_lower_bound, 4) : min(vfo_upper_bound, spectrum_window_size - 4)
-                                    ] = 0  # max_amplitude
-                                    self.spectrum[self.channel_number + (2 * i + 1), :] = (
-                                        signal_window  # np.ones(len(spectrum[1,:])) * self.module_receiver.daq_squelch_th_dB # Plot threshold line
-                                    )
-
-                                    # Squelch Window
-                                    signal_window[
-                                        max(vfo_lower_bound, 4) : min(vfo_upper_bound, spectrum_window_size - 4)
-                                    ] = self.vfo_squelch[i]
-                                    self.spectrum[self.channel_number + (2 * i + 2), :] = (
-                                        signal_window  # np.ones(len(spectrum[1,:])) * self.module_receiver.daq_squelch_th_dB # Plot threshold line
-                                    )
-
-                                # -----> DoA ESIMATION <-----
-
-                                # datetime object containing current date and time
-                                now = datetime.now()
-                                now_dt_str = now.strftime("%d-%b-%Y_%Hh%Mm%Ss")
-                                if (
-                                    self.en_DOA_estimation
-                                    and self.channel_number > 1
-                                    and max_amplitude > self.vfo_squelch[i]
-                                    and (i == self.output_vfo or self.output_vfo < 0)
-                                ):
-                                    write_freq = int(self.vfo_freq[i])
-                                    # Do channelization
-                                    if self.vfo_demod_modes[i] == "FM":
-                                        decimate_sampling_freq = 48_000
-                                        decimation_factor = int(sampling_freq / decimate_sampling_freq)
-
-                                    fir_order_factor = max(self.vfo_fir_order_factor[i], DEFAULT_VFO_FIR_ORDER_FACTOR)
-                                    vfo_channel = channelize(
-                                        self.processed_signal,
-                                        freq,
-                                        decimation_factor,
-                                        fir_order_factor,
-                                        sampling_freq,
-                                    )
-                                    iq_channel = vfo_channel[1]
-
-                                    # Method to check IQ diffs when noise source forced ON
-                                    # iq_diffs = calc_sync(self.processed_signal)
-                                    # print("IQ DIFFS: " + str(iq_diffs))
-                                    # print("IQ DIFFS ANGLE: " + str(np.rad2deg(np.angle(iq_diffs))))
-                                    #
-                                    theta_0 = self.estimate_DOA(vfo_channel, self.vfo_freq[i])
-
-                                    if not numba_isfinite(self.DOA):
-                                        logging.error("""Estimated DOA is not finite.""")
-                                        continue
-
-                                    doa_result_log = DOA_plot_util(self.DOA)
-                                    conf_val = calculate_doa_papr(self.DOA)
-
-                                    self.doa_max_list[i] = theta_0
-                                    update_list[i] = True
-
-                                    # DOA_str = str(int(theta_0))
-                                    DOA_str = str(int(360 - theta_0))  # Change to this, once we upload new Android APK
-                                    confidence_str = "{:.2f}".format(np.max(conf_val))
-                                    max_power_level_str = "{:.1f}".format((np.maximum(-100, max_amplitude)))
-
-                                    self.theta_0_list.append(theta_0)
-                                    self.confidence_list.append(np.max(conf_val))
-                                    self.max_power_level_list.append(np.maximum(-100, max_amplitude))
-                                    self.freq_list.append(write_freq)
-                                    self.doa_result_log_list.append(doa_result_log)
-
-                                    if self.vfo_demod_modes[i] or self.vfo_iq_enabled[i]:
-                                        if theta_0 not in self.vfo_theta_channel[i]:
-                                            self.vfo_theta_channel[i].append(theta_0)
-
-                                    self.vfo_time[i] += self.processed_signal[1].size / sampling_freq
-                                    if 0 < self.max_demod_timeout < self.vfo_time[i] and (
-                                        self.vfo_demod_modes[i] == "FM" or self.vfo_iq_enabled[i]
-                                    ):
-                                        self.vfo_demod_channel[i] = np.array([])
-                                        self.vfo_theta_channel[i] = []
-                                        self.vfo_iq_channel[i] = np.array([])
-                                    elif self.vfo_demod_modes[i] == "FM":
-                                        fm_demod_channel = fm_demod(iq_channel, decimate_sampling_freq, self.vfo_bw[i])
-                                        self.vfo_demod_channel[i] = np.concatenate(
-                                            (self.vfo_demod_channel[i], fm_demod_channel)
-                                        )
-                                    elif self.vfo_iq_enabled[i]:
-                                        self.vfo_iq_channel[i] = np.concatenate((self.vfo_iq_channel[i], iq_channel))
-                                else:
-                                    self.vfo_time[i] = 0
-                                    self.vfo_blocked[i] = False
-                                    fm_demod_channel = self.vfo_demod_channel[i]
-                                    iq_channel = self.vfo_iq_channel[i]
-                                    thetas = self.vfo_theta_channel[i]
-                                    vfo_freq = int(self.vfo_freq[i])
-                                    self.fm_demod_channel_list.append(
-                                        (now_dt_str, vfo_freq, fm_demod_channel, iq_channel, thetas)
-                                    )
-                                    self.vfo_demod_channel[i] = np.array([])
-                                    self.vfo_theta_channel[i] = []
-                                    self.vfo_iq_channel[i] = np.array([])
-
-                            que_data_packet.append(["doa_thetas", self.DOA_theta])
-                            que_data_packet.append(["DoA Result", doa_result_log])
-                            que_data_packet.append(["DoA Max", theta_0])
-                            que_data_packet.append(["DoA Confidence", conf_val])
-                            que_data_packet.append(["DoA Squelch", update_list])
-                            que_data_packet.append(["DoA Max List", self.doa_max_list])
-                            if self.vfo_mode == "Auto":
-                                que_data_packet.append(["VFO-0 Frequency", self.vfo_freq[0]])
-
-                            def adjust_theta(theta):
-                                if self.doa_measure == "Compass":
-                                    return (360 - theta + self.compass_offset) % 360
-                                else:
-                                    return theta
-
-                            def average_thetas(thetas):
-                                avg_theta = sum(thetas) / len(thetas)
-                                diff_thetas = copy.copy(thetas)
-                                for i in range(len(diff_thetas)):
-                                    diff_thetas[i] = abs(diff_thetas[i] - avg_theta)
-
-                                return avg_theta, max(diff_thetas)
-
-                            for (
-                                now_dt_str,
-                                vfo_freq,
-                                fm_demod_channel,
-                                iq_channel,
-                                thetas,
-                            ) in self.fm_demod_channel_list:
-                                store_demod_channel = fm_demod_channel.size > 0
-                                store_iq_channel = iq_channel.size > 0
-                                if ((not store_demod_channel) and (not store_iq_channel)) or (not thetas):
-                                    continue
-                                avg_theta, max_diff_theta = average_thetas(thetas)
-                                if max_diff_theta > 10:
-                                    doa_max_str = []
-                                    for theta in thetas:
-                                        doa_max_str.append(f"{adjust_theta(theta):.1f}")
-                                    doa_max_str = "_".join(doa_max_str)
-                                else:
-                                    doa_max_str = f"{adjust_theta(avg_theta):.1f}"
-
-                                if store_demod_channel:
-                                    record_file_name = f"{now_dt_str},FM_{vfo_freq / 1e6:.3f}MHz"
-                                    filename = f"{self.wav_record_path}/{record_file_name},DOA_{doa_max_str}.wav"
-                                    if can_store_file(self.wav_record_path):
-                                        write_wav(
-                                            filename,
-                                            48_000,
-                                            fm_demod_channel,
-                                        )
-                                    else:
-                                        self.logger.error(
-                                            "No disk space left for storing %s, demodulation and recording disabled.",
-                                            filename,
-                                        )
-                                        self.vfo_demod[:] = ["None"] * len(self.vfo_demod)
-                                if store_iq_channel:
-                                    record_file_name = f"{now_dt_str},IQ_{vfo_freq / 1e6:.3f}MHz"
-                                    filename = f"{self.iq_record_path}/{record_file_name},DOA_{doa_max_str}.iq"
-                                    if can_store_file(self.iq_record_path):
-                                        iq_channel.tofile(filename)
-                                    else:
-                                        self.logger.error(
-                                            "No disk space left for storing %s, IQ recording disabled.", filename
-                                        )
-                                        self.vfo_iq[:] = ["False"] * len(self.vfo_iq)
-                    except Exception:
-                        self.logger.error(traceback.format_exc())
-                        self.data_ready = False
-
-                    # -----> SPECTRUM PROCESSING <-----
-                    if self.en_spectrum and self.data_ready:
-                        spectrum_plot_data = reduce_spectrum(
-                            self.spectrum, self.spectrum_plot_size, self.channel_number
+
+                    # *** HERE WE NEED TO PERFORM THE SPECTRUM UPDATE TOO ***
+                    if self.spectrum_plot_enabled:
+                        # Selected Channel Window
+                        signal_window = np.zeros(spectrum_window_size) - 120
+                        signal_window[max(vfo_lower_bound, 4) : min(vfo_upper_bound, spectrum_window_size - 4)] = (
+                            0  # max_amplitude
+                        )
+                        self.spectrum[self.channel_number + (2 * i + 1), :] = (
+                            signal_window  # np.ones(len(spectrum[1,:])) * self.module_receiver.daq_squelch_th_dB # Plot threshold line
                         )
-                        que_data_packet.append(["spectrum", spectrum_plot_data])
 
-                    daq_cpi = int(
-                        self.module_receiver.iq_header.cpi_length * 1000 / self.module_receiver.iq_header.sampling_freq
-                    )
-                    # We don't include processing latency here, because reported timestamp marks end of the data frame
-                    # so latency is essentially an acquisition time.
-                    self.latency = daq_cpi
-                    self.processing_time = int(1000 * (time.time() - start_time))
-
-                    if self.data_ready and self.theta_0_list:
-                        # Do Kraken App first as currently its the only one supporting multi-vfo out
-                        if self.DOA_data_format != "Kerberos App":
-                            message = ""
-                            for j, freq in enumerate(self.freq_list):
-                                # KrakenSDR Android App Output
-                                sub_message = ""
-                                sub_message += f"{self.timestamp}, {360 - self.theta_0_list[j]}, {self.confidence_list[j]}, {self.max_power_level_list[j]}, "
-                                sub_message += f"{freq}, {self.DOA_ant_alignment}, {self.latency}, {self.station_id}, "
-                                sub_message += f"{self.latitude}, {self.longitude}, {self.heading}, {self.heading}, "
-                                sub_message += "GPS, R, R, R, R"  # Reserve 6 entries for other things # NOTE: Second heading is reserved for GPS heading / compass heading differentiation
-
-                                doa_result_log = self.doa_result_log_list[j] + np.abs(
-                                    np.min(self.doa_result_log_list[j])
-                                )
-                                for i in range(len(doa_result_log)):
-                                    sub_message += ", " + "{:.2f}".format(doa_result_log[i])
-
-                                sub_message += " \n"
-
-                                if self.en_data_record:
-                                    time_elapsed = (
-                                        time.time() - self.last_write_time[j]
-                                    )  # Make a list of 16 last_write_times
-                                    if time_elapsed > self.write_interval:
-                                        self.last_write_time[j] = time.time()
-                                        self.data_record_fd.write(sub_message)
-
-                                message += sub_message
-
-                            self.DOA_res_fd.seek(0)
-                            self.DOA_res_fd.write(message)
-                            self.DOA_res_fd.truncate()
-                        elif self.DOA_data_format == "Kerberos App":
-                            self.wr_kerberos(
-                                DOA_str,
-                                confidence_str,
-                                max_power_level_str,
-                            )
+                        # Squelch Window
+                        signal_window[max(vfo_lower_bound, 4) : min(vfo_upper_bound, spectrum_window_size - 4)] = (
+                            self.vfo_squelch[i]
+                        )
+                        self.spectrum[self.channel_number + (2 * i + 2), :] = (
+                            signal_window  # np.ones(len(spectrum[1,:])) * self.module_receiver.daq_squelch_th_dB # Plot threshold line
+                        )
+
+                    # -----> DoA ESIMATION <-----
 
-                        DOA_str = f"{self.theta_0_list[0]}"
-                        confidence_str = f"{np.max(self.confidence_list[0]):.2f}"
-                        max_power_level_str = f"{np.maximum(-100, self.max_power_level_list[0]):.1f}"
-                        doa_result_log = self.doa_result_log_list[0]
-                        write_freq = self.freq_list[0]
-
-                        # Save XML unconditionally, e.g., used by DF-Aggregator
-                        self.wr_xml(
-                            self.station_id,
-                            DOA_str,
-                            confidence_str,
-                            max_power_level_str,
-                            write_freq,
-                            self.latitude,
-                            self.longitude,
-                            self.heading,
-                            self.speed,
-                            self.adc_overdrive,
-                            self.number_of_correlated_sources[0],
-                            self.snrs[0],
+                    # datetime object containing current date and time
+                    now = datetime.now()
+                    now_dt_str = now.strftime("%d-%b-%Y_%Hh%Mm%Ss")
+                    if self.vfo_mode == "CFAR":
+                        signal_present = auto_vfo_detected[i]
+                    else:
+                        signal_present = max_amplitude > self.vfo_squelch[i]
+                    if (
+                        self.en_DOA_estimation
+                        and self.channel_number > 1
+                        and signal_present
+                        and (i == output_vfo or output_vfo < 0)
+                    ):
+                        write_freq = int(self.vfo_freq[i])
+                        # Do channelization
+                        if vfo_demod_modes[i] == "FM":
+                            decimate_sampling_freq = 48_000
+                            decimation_factor = int(sampling_freq / decimate_sampling_freq)
+
+                        fir_order_factor = max(self.vfo_fir_order_factor[i], DEFAULT_VFO_FIR_ORDER_FACTOR)
+                        vfo_channel = channelize(
+                            self.processed_signal,
+                            freq,
+                            decimation_factor,
+                            fir_order_factor,
+                            sampling_freq,
                         )
+                        iq_channel = vfo_channel[1]
+                        if self.spectrum_plot_enabled:
+                            self.zoom_spectra[i] = self.calculate_zoom_spectrum(
+                                iq_channel, freq, sampling_freq / decimation_factor
+                            )
 
-                        if self.DOA_data_format == "Kraken Pro Local":
-                            self.wr_json(
-                                self.station_id,
-                                DOA_str,
-                                confidence_str,
-                                max_power_level_str,
+                        # Method to check IQ diffs when noise source forced ON
+                        # iq_diffs = calc_sync(self.processed_signal)
+                        # print("IQ DIFFS: " + str(iq_diffs))
+                        # print("IQ DIFFS ANGLE: " + str(np.rad2deg(np.angle(iq_diffs))))
+                        #
+                        theta_0 = self.estimate_DOA(vfo_channel, self.vfo_freq[i])
+
+                        if not numba_isfinite(self.DOA):
+                            logging.error("""Estimated DOA is not finite.""")
+                            continue
+
+                        doa_result_log = DOA_plot_util(self.DOA)
+                        conf_val = calculate_doa_papr(self.DOA)
+
+                        self.vfos.doa_max[i] = theta_0
+                        update_list[i] = True
+
+                        # DOA_str = str(int(theta_0))
+                        DOA_str = str(int(360 - theta_0))  # Change to this, once we upload new Android APK
+                        confidence_str = "{:.2f}".format(np.max(conf_val))
+                        max_power_level_str = "{:.1f}".format((np.maximum(-100, max_amplitude)))
+
+                        self.theta_0_list.append(theta_0)
+                        self.confidence_list.append(np.max(conf_val))
+                        self.max_power_level_list.append(np.maximum(-100, max_amplitude))
+                        self.freq_list.append(write_freq)
+                        self.doa_result_log_list.append(doa_result_log)
+                        frame_results.append(
+                            DoAResult(
+                                self.timestamp,
+                                i,
                                 write_freq,
+                                self.DOA_theta,
                                 doa_result_log,
-                                self.latitude,
-                                self.longitude,
-                                self.heading,
-                                self.speed,
-                                self.adc_overdrive,
-                                self.number_of_correlated_sources[0],
-                                self.snrs[0],
+                                theta_0,
+                                float(np.max(conf_val)),
+                                float(np.maximum(-100, max_amplitude)),
+                                self.snrs[-1],
+                                self.number_of_correlated_sources[-1],
+                            )
+                        )
+
+                        if vfo_demod_modes[i] or vfo_iq_enabled[i]:
+                            if theta_0 not in self.vfos.theta_channel[i]:
+                                self.vfos.theta_channel[i].append(theta_0)
+
+                        self.vfos.time[i] += self.processed_signal[1].size / sampling_freq
+                        if 0 < self.max_demod_timeout < self.vfos.time[i] and (
+                            vfo_demod_modes[i] == "FM" or vfo_iq_enabled[i]
+                        ):
+                            self.vfos.reset_recording(i)
+                        elif vfo_demod_modes[i] == "FM":
+                            fm_demod_channel = fm_demod(iq_channel, decimate_sampling_freq, self.vfo_bw[i])
+                            self.vfos.demod_channel[i] = np.concatenate((self.vfos.demod_channel[i], fm_demod_channel))
+                        elif vfo_iq_enabled[i]:
+                            self.vfos.iq_channel[i] = np.concatenate((self.vfos.iq_channel[i], iq_channel))
+                    else:
+                        self.vfos.time[i] = 0
+                        self.vfos.blocked[i] = False
+                        fm_demod_channel = self.vfos.demod_channel[i]
+                        iq_channel = self.vfos.iq_channel[i]
+                        thetas = self.vfos.theta_channel[i]
+                        vfo_freq = int(self.vfo_freq[i])
+                        self.fm_demod_channel_list.append((now_dt_str, vfo_freq, fm_demod_channel, iq_channel, thetas))
+                        self.vfos.reset_recording(i)
+
+                # The Kerberos output uses the result of the last processed VFO
+                self.kerberos_doa_output = (DOA_str, confidence_str, max_power_level_str)
+
+                auto_vfos = []
+                if self.vfo_mode in ("Auto", "CFAR"):
+                    auto_vfos = list(zip(self.vfo_freq[:active_vfos].tolist(), self.vfo_bw[:active_vfos].tolist()))
+                frame_results.append(VFOStatus(update_list, self.vfos.doa_max.copy(), auto_vfos))
+
+                def adjust_theta(theta):
+                    if self.doa_measure == "Compass":
+                        return (360 - theta + self.compass_offset) % 360
+                    else:
+                        return theta
+
+                def average_thetas(thetas):
+                    avg_theta = sum(thetas) / len(thetas)
+                    diff_thetas = copy.copy(thetas)
+                    for i in range(len(diff_thetas)):
+                        diff_thetas[i] = abs(diff_thetas[i] - avg_theta)
+
+                    return avg_theta, max(diff_thetas)
+
+                for (
+                    now_dt_str,
+                    vfo_freq,
+                    fm_demod_channel,
+                    iq_channel,
+                    thetas,
+                ) in self.fm_demod_channel_list:
+                    store_demod_channel = fm_demod_channel.size > 0
+                    store_iq_channel = iq_channel.size > 0
+                    if ((not store_demod_channel) and (not store_iq_channel)) or (not thetas):
+                        continue
+                    avg_theta, max_diff_theta = average_thetas(thetas)
+                    if max_diff_theta > 10:
+                        doa_max_str = []
+                        for theta in thetas:
+                            doa_max_str.append(f"{adjust_theta(theta):.1f}")
+                        doa_max_str = "_".join(doa_max_str)
+                    else:
+                        doa_max_str = f"{adjust_theta(avg_theta):.1f}"
+
+                    if store_demod_channel:
+                        record_file_name = f"{now_dt_str},FM_{vfo_freq / 1e6:.3f}MHz"
+                        filename = f"{self.wav_record_path}/{record_file_name},DOA_{doa_max_str}.wav"
+                        if can_store_file(self.wav_record_path):
+                            write_wav(
+                                filename,
+                                48_000,
+                                fm_demod_channel,
+                            )
+                        else:
+                            self.logger.error(
+                                "No disk space left for storing %s, demodulation and recording disabled.",
+                                filename,
                             )
-                        elif self.DOA_data_format == "Kraken Pro Remote":
-                            # for multi VFOs: send each VFO as a single Message
-
-                            for j, freq in enumerate(self.freq_list):
-                                # Output one VFO Dataset to the remote Server
-                                self.wr_json(
-                                    self.station_id,
-                                    f"{self.theta_0_list[j]}",
-                                    f"{np.max(self.confidence_list[j]):.2f}",
-                                    f"{np.maximum(-100, self.max_power_level_list[j]):.1f}",
-                                    freq,
-                                    self.doa_result_log_list[j],
-                                    self.latitude,
-                                    self.longitude,
-                                    self.heading,
-                                    self.speed,
-                                    self.adc_overdrive,
-                                    self.number_of_correlated_sources[0],  # maybe needs j as well
-                                    self.snrs[0],  # maybe needs j as well
-                                )
-
-                        elif self.DOA_data_format == "RDF Mapper":
-                            time_elapsed = time.time() - self.rdf_mapper_last_write_time
-                            if (
-                                time_elapsed > 1
-                            ):  # Upload to RDF Mapper server only every 1s to ensure we dont overload his server
-                                self.rdf_mapper_last_write_time = time.time()
-                                elat, elng = calculate_end_lat_lng(
-                                    self.latitude,
-                                    self.longitude,
-                                    int(float(DOA_str)),
-                                    self.heading,  # DOA_str needs to be converted to stop crashing here
-                                )
-                                rdf_post = {
-                                    "id": self.station_id,
-                                    "time": str(self.timestamp),
-                                    "slat": str(self.latitude),
-                                    "slng": str(self.longitude),
-                                    "elat": str(elat),
-                                    "elng": str(elng),
-                                }
-                                try:
-                                    self.pool.apply_async(requests.post, args=[self.RDF_mapper_server, rdf_post])
-                                except Exception as e:
-                                    print(f"NO CONNECTION: Invalid RDF Mapper Server: {e}")
-                        elif self.DOA_data_format == "Full POST":
-                            time_elapsed = time.time() - self.rdf_mapper_last_write_time
-                            if time_elapsed > 1:  # reuse RDF mapper timer, it works the same
-                                self.rdf_mapper_last_write_time = time.time()
-
-                                myip = "127.0.0.1"
-                                try:
-                                    myip = json.loads(requests.get("https://ip.seeip.org/jsonip?").text)["ip"]
-                                except Exception:
-                                    pass
-
-                                message = ""
-                                if doa_result_log.size > 0:
-                                    doa_result_log = doa_result_log + np.abs(np.min(doa_result_log))
-                                    for i in range(len(doa_result_log)):
-                                        message += ", " + "{:.2f}".format(doa_result_log[i])
-
-                                post = {
-                                    "id": self.station_id,
-                                    "ip": myip,
-                                    "time": str(self.timestamp),
-                                    "gps_timestamp": str(self.gps_timestamp),
-                                    "lat": str(self.latitude),
-                                    "lng": str(self.longitude),
-                                    "gpsheading": str(self.heading),
-                                    "speed": str(self.speed),
-                                    "radiobearing": DOA_str,
-                                    "conf": confidence_str,
-                                    "power": max_power_level_str,
-                                    "freq": str(write_freq),
-                                    "anttype": self.DOA_ant_alignment,
-                                    "latency": str(self.latency),
-                                    "processing_time": str(self.processing_time),
-                                    "doaarray": message,
-                                    "adc_overdrive": self.adc_overdrive,
-                                    "num_corr_sources": self.number_of_correlated_sources[0],
-                                    "snr_db": self.snrs[0],
-                                }
-                                try:
-                                    self.pool.apply_async(requests.post, args=[self.RDF_mapper_server, post])
-                                except Exception as e:
-                                    print(f"NO CONNECTION: Invalid Server: {e}")
-                        elif self.DOA_data_format in ("Kraken App", "DF Aggregator", "Kerberos App"):
-                            pass
+                            self.vfo_demod[:] = "None"
+                    if store_iq_channel:
+                        record_file_name = f"{now_dt_str},IQ_{vfo_freq / 1e6:.3f}MHz"
+                        filename = f"{self.iq_record_path}/{record_file_name},DOA_{doa_max_str}.iq"
+                        if can_store_file(self.iq_record_path):
+                            iq_channel.tofile(filename)
                         else:
-                            self.logger.error(f"Invalid DOA Result data format: {self.DOA_data_format}")
-
-                stop_time = time.time()
-
-                que_data_packet.append(["update_rate", stop_time - start_time])
-                que_data_packet.append(
-                    [
-                        "latency",
-                        (
-                            (int(stop_time * 10**3) - self.module_receiver.iq_header.time_stamp)
-                            if not get_iq_failed
-                            else 0
-                        ),
-                    ]
+                            self.logger.error("No disk space left for storing %s, IQ recording disabled.", filename)
+                            self.vfo_iq[:] = "False"
+        except Exception:
+            self.logger.error(traceback.format_exc())
+            self.data_ready = False
+
+        # -----> SPECTRUM PROCESSING <-----
+        if self.spectrum_plot_enabled and self.data_ready:
+            spectrum_plot_data = reduce_spectrum(self.spectrum, self.spectrum_plot_size, self.channel_number)
+            frame_results.append(SpectrumResult(spectrum_plot_data, self.zoom_spectra))
+
+    def calculate_zoom_spectrum(self, iq_channel, freq, channel_sampling_freq):
+        """
+        Calculates a high resolution spectrum around a VFO from its channelized samples,
+        at a fraction of the cost of a full band spectrum with the same resolution.
+
+        Parameters:
+        -----------
+        :param: iq_channel: Channelized (shifted to baseband and decimated) samples of the VFO
+        :param: freq: VFO frequency relative to the center frequency [Hz]
+        :param: channel_sampling_freq: Sampling frequency of the channelized samples [Hz]
+
+        :return: Frequency relative to the center frequency [Hz] and power [dB] in a (2, ZOOM_SPECTRUM_SIZE) array
+        """
+        zoom_spectrum = np.empty((2, ZOOM_SPECTRUM_SIZE), dtype=np.float32)
+        self.zoom_spectrum_engine.welch(iq_channel, ZOOM_SPECTRUM_SIZE, 0, "blackman", zoom_spectrum[1, :])
+        zoom_spectrum[0, :] = get_spectrum_freq_axis(ZOOM_SPECTRUM_SIZE, channel_sampling_freq) + freq
+        return zoom_spectrum
+
+    def process_outputs(self, start_time):
+        """
+        Queues the DoA results of the frame on the configured outputs (files, servers)
+        """
+        daq_cpi = int(self.module_receiver.iq_header.cpi_length * 1000 / self.module_receiver.iq_header.sampling_freq)
+        # We don't include processing latency here, because reported timestamp marks end of the data frame
+        # so latency is essentially an acquisition time.
+        self.latency = daq_cpi
+        self.processing_time = int(1000 * (time.time() - start_time))
+
+        if self.first_frame_time is None:
+            self.first_frame_time = time.time()
+            self.save_startup_report()
+
+        if not (self.data_ready and self.theta_0_list):
+            return
+
+        # The jobs run later on the worker threads of the dispatcher, they get a snapshot of the results
+        dispatcher = self.output_dispatcher
+        # Do Kraken App first as currently its the only one supporting multi-vfo out
+        if self.DOA_data_format != "Kerberos App":
+            # KrakenSDR Android App Output
+            kraken_app_rows = [
+                (
+                    self.timestamp,
+                    self.theta_0_list[j],
+                    self.confidence_list[j],
+                    self.max_power_level_list[j],
+                    freq,
+                    self.DOA_ant_alignment,
+                    self.latency,
+                    self.station_id,
+                    self.latitude,
+                    self.longitude,
+                    self.heading,
+                    self.doa_result_log_list[j],
                 )
+                for j, freq in enumerate(self.freq_list)
+            ]
+            dispatcher.submit(OUTPUT_DOA_VALUE, partial(write_kraken_app_file, self.doa_res_file_path, kraken_app_rows))
+
+            if self.en_data_record:
+                record_rows = []
+                for j, row in enumerate(kraken_app_rows):
+                    time_elapsed = time.time() - self.vfos.last_write_time[j]
+                    if time_elapsed > self.write_interval:
+                        self.vfos.last_write_time[j] = time.time()
+                        record_rows.append(row)
+                if record_rows:
+                    dispatcher.submit(
+                        OUTPUT_DATA_RECORD, partial(append_kraken_app_rows, self.data_recording_file_path, record_rows)
+                    )
+        elif self.DOA_data_format == "Kerberos App":
+            dispatcher.submit(OUTPUT_DOA_VALUE, partial(self.wr_kerberos, *self.kerberos_doa_output))
+
+        DOA_str = f"{self.theta_0_list[0]}"
+        confidence_str = f"{np.max(self.confidence_list[0]):.2f}"
+        max_power_level_str = f"{np.maximum(-100, self.max_power_level_list[0]):.1f}"
+        doa_result_log = self.doa_result_log_list[0]
+        write_freq = self.freq_list[0]
+        frame_info = (self.timestamp, self.gps_timestamp, self.latency, self.processing_time)
+
+        # Save XML unconditionally, e.g., used by DF-Aggregator
+        dispatcher.submit(
+            OUTPUT_DOA_XML,
+            partial(
+                self.wr_xml,
+                self.station_id,
+                DOA_str,
+                confidence_str,
+                max_power_level_str,
+                write_freq,
+                self.latitude,
+                self.longitude,
+                self.heading,
+                self.speed,
+                self.adc_overdrive,
+                self.number_of_correlated_sources[0],
+                self.snrs[0],
+                *frame_info,
+            ),
+        )
 
-                # Put data into buffer, but if there is no data because its a cal/trig wait frame etc, then only write if the buffer is empty
-                # Otherwise just discard the data so that we don't overwrite good DATA frames.
-                try:
-                    self.data_que.put(
-                        que_data_packet, False
-                    )  # Must be non-blocking so DOA can update when dash browser window is closed
-                except Exception:
-                    # Discard data, UI couldn't consume fast enough
-                    pass
+        if self.DOA_data_format == "Kraken Pro Local":
+            vfo_results = [
+                (
+                    self.station_id,
+                    DOA_str,
+                    confidence_str,
+                    max_power_level_str,
+                    write_freq,
+                    doa_result_log,
+                    self.latitude,
+                    self.longitude,
+                    self.heading,
+                    self.speed,
+                    self.adc_overdrive,
+                    self.number_of_correlated_sources[0],
+                    self.snrs[0],
+                    self.DOA_ant_alignment,
+                    *frame_info,
+                    self.doa_spectrum_encoding,
+                )
+            ]
+            dispatcher.submit(OUTPUT_KRAKEN_PRO, partial(self.wr_json, OUTPUT_KRAKEN_PRO, vfo_results))
+        elif self.DOA_data_format == "Kraken Pro Remote":
+            # for multi VFOs: the results of every VFO are sent in one message
+            vfo_results = [
+                (
+                    self.station_id,
+                    f"{self.theta_0_list[j]}",
+                    f"{np.max(self.confidence_list[j]):.2f}",
+                    f"{np.maximum(-100, self.max_power_level_list[j]):.1f}",
+                    freq,
+                    self.doa_result_log_list[j],
+                    self.latitude,
+                    self.longitude,
+                    self.heading,
+                    self.speed,
+                    self.adc_overdrive,
+                    self.number_of_correlated_sources[0],  # maybe needs j as well
+                    self.snrs[0],  # maybe needs j as well
+                    self.DOA_ant_alignment,
+                    *frame_info,
+                    self.doa_spectrum_encoding,
+                )
+                for j, freq in enumerate(self.freq_list)
+            ]
+            dispatcher.submit(OUTPUT_KRAKEN_PRO_REMOTE, partial(self.wr_json, OUTPUT_KRAKEN_PRO_REMOTE, vfo_results))
+
+        elif self.DOA_data_format == "RDF Mapper":
+            dispatcher.submit(
+                OUTPUT_RDF_MAPPER,
+                partial(
+                    self.wr_rdf_mapper,
+                    self.station_id,
+                    write_freq,
+                    self.timestamp,
+                    self.latitude,
+                    self.longitude,
+                    int(float(DOA_str)),  # DOA_str needs to be converted to stop crashing here
+                    self.heading,
+                ),
+            )
+        elif self.DOA_data_format == "Full POST":
+            post = {
+                "id": self.station_id,
+                "time": str(self.timestamp),
+                "gps_timestamp": str(self.gps_timestamp),
+                "lat": str(self.latitude),
+                "lng": str(self.longitude),
+                "gpsheading": str(self.heading),
+                "speed": str(self.speed),
+                "radiobearing": DOA_str,
+                "conf": confidence_str,
+                "power": max_power_level_str,
+                "freq": str(write_freq),
+                "anttype": self.DOA_ant_alignment,
+                "latency": str(self.latency),
+                "processing_time": str(self.processing_time),
+                "adc_overdrive": self.adc_overdrive,
+                "num_corr_sources": self.number_of_correlated_sources[0],
+                "snr_db": self.snrs[0],
+            }
+            dispatcher.submit(
+                OUTPUT_FULL_POST, partial(self.wr_full_post, post, doa_result_log, self.doa_spectrum_encoding)
+            )
+        elif self.DOA_data_format in ("Kraken App", "DF Aggregator", "Kerberos App"):
+            pass
+        else:
+            self.logger.error(f"Invalid DOA Result data format: {self.DOA_data_format}")
+
+    def publish_results(self, frame_results, start_time, get_iq_failed):
+        """
+        Publishes the results of the frame on the result bus, closed by the frame status
+        """
+        stop_time = time.time()
+        latency = (int(stop_time * 10**3) - self.module_receiver.iq_header.time_stamp) if not get_iq_failed else 0
+        for message in frame_results:
+            self.result_bus.publish(message)
+        self.result_bus.publish(FrameStatus(self.module_receiver.iq_header, stop_time - start_time, latency))
 
     def estimate_DOA(self, processed_signal, vfo_freq):
         """
@@ -986,7 +1381,9 @@ class SignalProcessor(threading.Thread):
         snr = SNR(R)
         self.snrs.append(snr)
 
-        frq_ratio = vfo_freq / self.module_receiver.daq_center_freq
+        # The array geometry is normalized to the wavelength of the configured center frequency
+        array_freq = self.scan_home_freq if self.scan_home_freq is not None else self.module_receiver.daq_center_freq
+        frq_ratio = vfo_freq / array_freq
         inter_element_spacing = self.DOA_inter_elem_space * frq_ratio
 
         if antennas_alignment == "ULA":
@@ -1001,12 +1398,23 @@ class SignalProcessor(threading.Thread):
             L = R.shape[0] // 2
             scanning_vectors = gen_scanning_vectors_phase_modes_space(L, self.array_offset)
         elif antennas_alignment == "Custom":
-            scanning_vectors = gen_scanning_vectors_custom(
-                M, self.custom_array_x * frq_ratio, self.custom_array_y * frq_ratio
-            )
+            # The geometry is part of the key, the attributes may also be set directly (DSP process config sync)
+            key = (M, frq_ratio, self.custom_array_x.tobytes(), self.custom_array_y.tobytes())
+            scanning_vectors = self.custom_scanning_vectors.get(key)
+            if scanning_vectors is None:
+                if len(self.custom_scanning_vectors) >= CUSTOM_SCANNING_VECTORS_CACHE_SIZE:
+                    self.custom_scanning_vectors.clear()
+                scanning_vectors = gen_scanning_vectors_custom(
+                    M, self.custom_array_x * frq_ratio, self.custom_array_y * frq_ratio
+                )
+                self.custom_scanning_vectors[key] = scanning_vectors
         else:
             scanning_vectors = np.empty((0, 0))
 
+        doa_grid_step = self.overload_policy.doa_grid_step if self.DOA_algorithm != "ROOT-MUSIC" else 1
+        if doa_grid_step > 1:
+            scanning_vectors = np.ascontiguousarray(scanning_vectors[:, ::doa_grid_step])
+
         # DOA estimation
         if self.DOA_algorithm == "Bartlett":  # self.en_DOA_Bartlett:
             DOA_Bartlett_res = de.DOA_Bartlett(R, scanning_vectors)
@@ -1035,6 +1443,9 @@ class SignalProcessor(threading.Thread):
             # then the last element should correspond to the strongest signal
             theta_0 = doas[-1]
 
+        if doa_grid_step > 1:
+            self.DOA = interpolate_doa_grid(self.DOA, doa_grid_step)
+
         # ULA Array, choose bewteen the full omnidirecitonal 360 data, or forward/backward data only
         if self.DOA_ant_alignment == "ULA":
             thetas = (
@@ -1103,6 +1514,10 @@ class SignalProcessor(threading.Thread):
         adc_overdrive,
         num_corr_sources,
         snr_db,
+        timestamp,
+        gps_timestamp,
+        latency,
+        processing_time,
     ):
         # Kerberos-ify the data
         confidence_str = "{}".format(np.max(int(float(conf) * 100)))
@@ -1129,8 +1544,8 @@ class SignalProcessor(threading.Thread):
         xml_snr = ET.SubElement(data, "SNR_DB")
 
         xml_st_id.text = str(station_id)
-        xml_time.text = str(self.timestamp)
-        xml_gps_time.text = str(self.gps_timestamp)
+        xml_time.text = str(timestamp)
+        xml_gps_time.text = str(gps_timestamp)
         xml_freq.text = str(freq / 1000000)
         xml_latitide.text = str(latitude)
         xml_longitude.text = str(longitude)
@@ -1139,8 +1554,8 @@ class SignalProcessor(threading.Thread):
         xml_doa.text = doa
         xml_pwr.text = max_power_level_str
         xml_conf.text = confidence_str
-        xml_latency.text = f"{self.latency}"
-        xml_processing_time.text = f"{self.processing_time}"
+        xml_latency.text = f"{latency}"
+        xml_processing_time.text = f"{processing_time}"
         xml_adc_overdrive.text = str(adc_overdrive)
         xml_num_corr_sources.text = str(num_corr_sources)
         xml_snr.text = str(snr_db)
@@ -1148,8 +1563,7 @@ class SignalProcessor(threading.Thread):
         # create a new XML file with the results
         html_str = ET.tostring(data, encoding="unicode")
 
-        with open(os.path.join(shared_path, "doa.xml"), "w+", encoding="utf-8") as file:
-            file.write(html_str)
+        write_file_atomic(os.path.join(shared_path, "doa.xml"), html_str)
 
     def wr_kerberos(
         self,
@@ -1169,80 +1583,201 @@ class SignalProcessor(threading.Thread):
             + max_power_level_str
             + "</PWR>\n</DATA>"
         )
-        self.DOA_res_fd.seek(0)
-        self.DOA_res_fd.write(html_str)
-        self.DOA_res_fd.truncate()
+        write_file_atomic(self.doa_res_file_path, html_str)
         self.logger.debug("DoA results writen: {:s}".format(html_str))
 
-    def wr_json(
-        self,
-        station_id,
-        DOA_str,
-        confidence_str,
-        max_power_level_str,
-        freq,
-        doa_result_log,
-        latitude,
-        longitude,
-        heading,
-        speed,
-        adc_overdrive,
-        num_corr_sources,
-        snr_db,
-    ):
-        # KrakenSDR Flutter app out
-        doaString = str("")
-        for i in range(len(doa_result_log)):
-            doaString += (
-                "{:.2f}".format(doa_result_log[i] + np.abs(np.min(doa_result_log))) + ","
-            )  # TODO: After confirmed to work, optimize
-
-        # doaString = str('')
-        # doa_result_log = doa_result_log + np.abs(np.min(doa_result_log))
-        # for i in range(len(doa_result_log)):
-        #    doaString += ", " + "{:.2f}".format(doa_result_log[i])
-
-        jsonDict = {}
-        jsonDict["station_id"] = station_id
-        jsonDict["tStamp"] = self.timestamp
-        jsonDict["gps_timestamp"] = self.gps_timestamp
-        jsonDict["latitude"] = str(latitude)
-        jsonDict["longitude"] = str(longitude)
-        jsonDict["gpsBearing"] = str(heading)
-        jsonDict["speed"] = str(speed)
-        jsonDict["radioBearing"] = DOA_str
-        jsonDict["conf"] = confidence_str
-        jsonDict["power"] = max_power_level_str
-        jsonDict["freq"] = freq  # self.module_receiver.daq_center_freq
-        jsonDict["antType"] = self.DOA_ant_alignment
-        jsonDict["latency"] = self.latency
-        jsonDict["processing_time"] = self.processing_time
-        jsonDict["doaArray"] = doaString
-        jsonDict["adc_overdrive"] = adc_overdrive
-        jsonDict["num_corr_sources"] = str(num_corr_sources)
-        jsonDict["snr_db"] = snr_db
+    def wr_json(self, output_name, vfo_results):
+        """
+        Kraken Pro outputs, the results of the VFOs of a frame are sent together
 
-        try:
-            self.pool.apply_async(
-                requests.post,
-                kwds={"url": "http://127.0.0.1:8042/doapost", "json": jsonDict},
+        Parameters:
+        -----------
+        :param: output_name: OUTPUT_KRAKEN_PRO or OUTPUT_KRAKEN_PRO_REMOTE
+        :param: vfo_results: Arguments of format_kraken_pro_result() for each VFO
+        """
+        results = [format_kraken_pro_result(*args) for args in vfo_results]
+        self.send_output(output_name, [result["freq"] for result in results], results)
+
+    def wr_rdf_mapper(self, station_id, freq, timestamp, latitude, longitude, doa, heading):
+        elat, elng = calculate_end_lat_lng(latitude, longitude, doa, heading)
+        rdf_post = {
+            "id": station_id,
+            "time": str(timestamp),
+            "slat": str(latitude),
+            "slng": str(longitude),
+            "elat": str(elat),
+            "elng": str(elng),
+        }
+        self.send_output(OUTPUT_RDF_MAPPER, [freq], [rdf_post])
+
+    def wr_full_post(self, post, doa_result_log, encoding):
+        post = {**post, "ip": self.public_ip.get(), "doaarray": ""}
+        if doa_result_log.size > 0:
+            if encoding == DOA_SPECTRUM_TEXT:
+                post["doaarray"] = DOA_SPECTRUM_SEPARATOR + serialize_doa_spectrum(doa_result_log)
+            else:
+                post["doaarray"] = serialize_doa_spectrum(doa_result_log, encoding)
+                post["doaarray_encoding"] = encoding
+
+        self.send_output(OUTPUT_FULL_POST, [post["freq"]], [post])
+
+    def send_output(self, output_name, keys, records):
+        """
+        Sends the records of a network output, the outputs to remote servers go through their spool
+
+        Parameters:
+        -----------
+        :param: output_name: Name of the output sink
+        :param: keys: Key of each record in the "latest" spool mode, the frequency of the VFO
+        :param: records: Records sent to the server
+        """
+        if output_name in SPOOLED_OUTPUTS and self.output_spool_mode != SPOOL_MODE_OFF:
+            spool = self.get_output_spool(output_name)
+            for key, record in zip(keys, records):
+                spool.append(key, record)
+        elif output_name in BATCHED_OUTPUTS:
+            self.output_senders[output_name](records)
+        else:
+            for record in records:
+                self.output_senders[output_name](record)
+
+    def get_output_spool(self, output_name):
+        """
+        Returns the spool of an output, it is opened on first use and reopened when the spool mode has changed
+        """
+        spool = self.output_spools.get(output_name)
+        if spool is None or spool.mode != self.output_spool_mode:
+            if spool is not None:
+                spool.stop()
+            spool = OutputSpool(
+                output_name,
+                os.path.join(OUTPUT_SPOOL_PATH, output_name),
+                self.output_senders[output_name],
+                self.output_spool_mode,
+                batch=output_name in BATCHED_OUTPUTS,
+                logging_level=self.logger.level,
             )
-            # r = requests.post('http://127.0.0.1:8042/doapost', json=jsonDict)
-        except requests.exceptions.RequestException as e:
-            self.logger.error(f"Error while posting to local websocket server: {e}")
+            self.output_spools[output_name] = spool
+        return spool
+
+    # The senders read the server addresses when the record is delivered, the spooled records go to the current server
+
+    def post_kraken_pro(self, results):
+        self.middleware_link.send_results(results)
+
+    def post_rdf_mapper(self, record):
+        self.http_client.post(self.RDF_mapper_server, data=record)
+
+    def post_full_post(self, record):
+        self.http_client.post(self.RDF_mapper_server, data=record)
+
+    @property
+    def data_recording_file_path(self):
+        return os.path.join(self.root_path, self.data_recording_file_name)
 
     def update_recording_filename(self, filename):
-        self.data_record_fd.close()
         self.data_recording_file_name = filename
-        data_recording_file_path = os.path.join(os.path.join(self.root_path, self.data_recording_file_name))
-        self.data_record_fd = open(data_recording_file_path, "a+")
+        open(self.data_recording_file_path, "a").close()
         self.en_data_record = False
 
     def get_recording_filesize(self):
-        return round(
-            os.path.getsize(os.path.join(os.path.join(self.root_path, self.data_recording_file_name))) / 1048576,
-            2,
-        )  # Convert to MB
+        return round(os.path.getsize(self.data_recording_file_path) / 1048576, 2)  # Convert to MB
+
+
+def format_kraken_pro_result(
+    station_id,
+    DOA_str,
+    confidence_str,
+    max_power_level_str,
+    freq,
+    doa_result_log,
+    latitude,
+    longitude,
+    heading,
+    speed,
+    adc_overdrive,
+    num_corr_sources,
+    snr_db,
+    ant_alignment,
+    timestamp,
+    gps_timestamp,
+    latency,
+    processing_time,
+    encoding=DOA_SPECTRUM_TEXT,
+):
+    """
+    Returns the Kraken Pro result of a VFO, the DoA spectrum is serialized with the given encoding
+    """
+    # KrakenSDR Flutter app out
+    doaString = serialize_doa_spectrum(doa_result_log, encoding)
+    if encoding == DOA_SPECTRUM_TEXT and doaString:
+        # Comma terminated values without spaces
+        doaString = doaString.replace(DOA_SPECTRUM_SEPARATOR, ",") + ","
+
+    jsonDict = {}
+    jsonDict["station_id"] = station_id
+    jsonDict["tStamp"] = timestamp
+    jsonDict["gps_timestamp"] = gps_timestamp
+    jsonDict["latitude"] = str(latitude)
+    jsonDict["longitude"] = str(longitude)
+    jsonDict["gpsBearing"] = str(heading)
+    jsonDict["speed"] = str(speed)
+    jsonDict["radioBearing"] = DOA_str
+    jsonDict["conf"] = confidence_str
+    jsonDict["power"] = max_power_level_str
+    jsonDict["freq"] = freq  # self.module_receiver.daq_center_freq
+    jsonDict["antType"] = ant_alignment
+    jsonDict["latency"] = latency
+    jsonDict["processing_time"] = processing_time
+    jsonDict["doaArray"] = doaString
+    if encoding != DOA_SPECTRUM_TEXT:
+        jsonDict["doaArrayEncoding"] = encoding
+    jsonDict["adc_overdrive"] = adc_overdrive
+    jsonDict["num_corr_sources"] = str(num_corr_sources)
+    jsonDict["snr_db"] = snr_db
+
+    return jsonDict
+
+
+def format_kraken_app_row(
+    timestamp,
+    theta_0,
+    confidence,
+    max_power_level,
+    freq,
+    ant_alignment,
+    latency,
+    station_id,
+    latitude,
+    longitude,
+    heading,
+    doa_result_log,
+):
+    """
+    Formats the result of a VFO as a line of the KrakenSDR Android App output
+    """
+    message = ""
+    message += f"{timestamp}, {360 - theta_0}, {confidence}, {max_power_level}, "
+    message += f"{freq}, {ant_alignment}, {latency}, {station_id}, "
+    message += f"{latitude}, {longitude}, {heading}, {heading}, "
+    message += "GPS, R, R, R, R"  # Reserve 6 entries for other things # NOTE: Second heading is reserved for GPS heading / compass heading differentiation
+
+    message += ", " + serialize_doa_spectrum(doa_result_log)
+    message += " \n"
+    return message
+
+
+def write_kraken_app_file(file_path, rows):
+    write_file_atomic(file_path, "".join(format_kraken_app_row(*row) for row in rows))
+
+
+def append_kraken_app_rows(file_path, rows):
+    with open(file_path, "a", encoding="utf-8") as file:
+        file.write("".join(format_kraken_app_row(*row) for row in rows))
+
+
+def write_json_file(file_path, content):
+    write_file_atomic(file_path, json.dumps(content))
 
 
 def calculate_end_lat_lng(s_lat: float, s_lng: float, doa: float, my_bearing: float) -> Tuple[float, float]:
@@ -1292,6 +1827,16 @@ def reduce_spectrum(spectrum, spectrum_size, channel_number):
     return spectrum_plot_data
 
 
+@lru_cache(maxsize=8)
+def get_spectrum_freq_axis(spectrum_size, sampling_freq):
+    """
+    Frequency axis of the fftshift-ed spectrum, cached since it only changes with the DAQ configuration
+    """
+    freqs = fft.fftshift(fft.fftfreq(spectrum_size, 1 / sampling_freq))
+    freqs.setflags(write=False)
+    return freqs
+
+
 # Get the FIR filter
 @lru_cache(maxsize=32)
 def get_fir(n, q, padd):
@@ -1442,7 +1987,7 @@ def DOA_MUSIC(R, scanning_vectors, signal_dimension, angle_resolution=1):
 
 
 # transform angle defined in [-pi, pi) range to [0, 2pi) interval
-@vectorize([float32(float32)])
+@vectorize([float32(float32)], cache=True)
 def to_zero_to_2pi(angle):
     if angle < np.float32(0.0):
         angle *= np.float32(-1.0)
@@ -1454,7 +1999,7 @@ def to_zero_to_2pi(angle):
 
 
 # transform angle defined in [-pi/2, pi/2) range to [0, pi) interval
-@vectorize([float32(float32)])
+@vectorize([float32(float32)], cache=True)
 def to_zero_to_pi(angle):
     if angle < np.float32(0.0):
         angle *= np.float32(-1.0)
@@ -0,0 +1,111 @@
+# KrakenSDR Signal Processor - Middleware link
+#
+# Copyright (C) 2018-2021  Carl Laufer, Tamás Pető
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#
+# - coding: utf-8 -*-
+
+# Persistent stream to the node middleware (_nodejs/index.js) for the Kraken Pro outputs.
+#
+# The results are sent over a Unix socket as newline delimited JSON messages, one message holding the results of
+# every VFO of a frame: {"type": "doa", "data": [...]}. The middleware answers each message with a line
+# {"ok": true} once it has forwarded the results, or {"ok": false, "error": "..."} when it could not (e.g. the map
+# server is unreachable in remote mode), so the spool knows whether to send them again.
+
+import json
+import logging
+import os
+import socket
+import threading
+
+from output_spool import json_default
+from variables import shared_path
+
+MIDDLEWARE_SOCKET_PATH = os.path.join(shared_path, "middleware.sock")
+MIDDLEWARE_TIMEOUT = 5.0  # [s]
+
+
+class MiddlewareLink:
+    def __init__(self, socket_path=MIDDLEWARE_SOCKET_PATH, timeout=MIDDLEWARE_TIMEOUT, logging_level=10):
+        """
+        Parameters:
+        -----------
+        :param: socket_path: Unix socket of the middleware
+        :param: timeout: Timeout of the connection and of the answer of the middleware [s]
+        """
+        self.logger = logging.getLogger(__name__)
+        self.logger.setLevel(logging_level)
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self.sock = None
+        self.reader = None
+        self.lock = threading.Lock()
+
+        # Metrics
+        self.messages = 0
+        self.results = 0
+        self.connections = 0
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        self.sock = sock
+        self.reader = sock.makefile("rb")
+        self.connections += 1
+        self.logger.info(f"Connected to the middleware at {self.socket_path}")
+
+    def close(self):
+        if self.sock is not None:
+            self.reader.close()
+            self.sock.close()
+            self.sock = None
+            self.reader = None
+
+    def send_results(self, results):
+        """
+        Sends the results of a frame in one message and waits for the answer of the middleware.
+        Raises if the connection failed or the middleware could not forward the results, the connection is
+        reopened by the next call.
+
+        Parameters:
+        -----------
+        :param: results: List of the Kraken Pro result dicts, one per VFO
+        """
+        message = json.dumps({"type": "doa", "data": results}, default=json_default) + "\n"
+        with self.lock:
+            try:
+                if self.sock is None:
+                    self.connect()
+                self.sock.sendall(message.encode())
+                answer = self.reader.readline()
+                if not answer:
+                    raise ConnectionError("connection closed by the middleware")
+            except OSError:
+                self.close()
+                raise
+            self.messages += 1
+        answer = json.loads(answer)
+        if not answer.get("ok", False):
+            raise ConnectionError(f"middleware could not forward the results: {answer.get('error', 'unknown error')}")
+        self.results += len(results)
+
+    def get_stats(self):
+        return {"messages": self.messages, "results": self.results, "connections": self.connections}
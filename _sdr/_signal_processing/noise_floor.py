@@ -0,0 +1,96 @@
+# KrakenSDR Signal Processor - Noise floor estimator
+#
+# Copyright (C) 2018-2021  Carl Laufer, Tamás Pető
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#
+# - coding: utf-8 -*-
+
+# Streaming noise floor estimation for the automatic squelch modes.
+#
+# Every spectrum bin tracks a running quantile of its own level over the frames (frugal streaming quantile):
+# the estimate moves up by step * quantile if the new level is above it, and down by step * (1 - quantile) otherwise.
+# Bursts shorter than the tracking time do not lift the floor, unlike the mean of the dB spectrum.
+# The floor of the band is the median of the bins, so narrow band carriers do not lift it either.
+
+import numpy as np
+
+NOISE_FLOOR_QUANTILE = 0.5  # Running median
+NOISE_FLOOR_STEP = 1.0  # [dB / frame]
+
+
+def find_nearest_bins(bin_freqs, freqs):
+    """
+    Returns the index of the bin nearest to each frequency
+
+    Parameters:
+    -----------
+    :param: bin_freqs: Increasing center frequencies of the bins
+    :param: freqs: Frequencies to look up
+    """
+    freqs = np.asarray(freqs)
+    indices = np.clip(np.searchsorted(bin_freqs, freqs), 1, len(bin_freqs) - 1)
+    nearer_lower = np.abs(freqs - bin_freqs[indices - 1]) <= np.abs(bin_freqs[indices] - freqs)
+    return indices - nearer_lower
+
+
+class NoiseFloorEstimator:
+    def __init__(self, quantile=NOISE_FLOOR_QUANTILE, step=NOISE_FLOOR_STEP):
+        """
+        Parameters:
+        -----------
+        :param: quantile: Quantile of the spectrum levels tracked in each bin
+        :param: step: Adaptation step of the estimate [dB / frame]
+        """
+        self.quantile = quantile
+        self.step = step
+        self.floor = None
+        self.prefix_sum = None
+
+    def reset(self):
+        """Restarts the estimation from the next spectrum, e.g. after retuning"""
+        self.floor = None
+
+    def update(self, spectrum):
+        """
+        Updates the per bin noise floor with a new spectrum [dB]
+        """
+        if self.floor is None or self.floor.shape != spectrum.shape:
+            self.floor = np.array(spectrum, dtype=np.float64)
+        else:
+            above = spectrum > self.floor
+            self.floor += np.where(above, self.step * self.quantile, -self.step * (1 - self.quantile))
+        self.prefix_sum = np.concatenate(([0.0], np.cumsum(self.floor)))
+        return self.floor
+
+    def get_noise_floor(self):
+        """
+        Returns the noise floor of the whole band [dB]
+        """
+        return float(np.median(self.floor))
+
+    def get_window_means(self, start_indices, end_indices):
+        """
+        Returns the mean noise floor of the [start, end) bin windows [dB], for any number of windows at once
+
+        Parameters:
+        -----------
+        :param: start_indices: First bin of each window
+        :param: end_indices: End bin (exclusive) of each window
+        """
+        start_indices = np.clip(start_indices, 0, len(self.floor))
+        end_indices = np.clip(end_indices, start_indices, len(self.floor))
+        lengths = np.maximum(end_indices - start_indices, 1)
+        return (self.prefix_sum[end_indices] - self.prefix_sum[start_indices]) / lengths
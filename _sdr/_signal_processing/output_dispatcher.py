@@ -0,0 +1,193 @@
+# KrakenSDR Signal Processor - Output dispatcher
+#
+# Copyright (C) 2018-2021  Carl Laufer, Tamás Pető
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#
+# - coding: utf-8 -*-
+
+# Writes the outputs of the signal processor (result files, recordings, HTTP posts) from worker threads, so a slow
+# disk or server never delays the processing of the next frame.
+#
+# Every sink has its own worker thread and runs the jobs submitted to it (callables holding a snapshot of the
+# results) in order. A coalescing sink only keeps the newest pending job, which suits the files holding the current
+# bearing: when the sink falls behind, the outdated results are skipped instead of written late. A sink can also be
+# rate limited, the jobs then run at most once per its minimum interval.
+
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+from typing import NamedTuple
+
+DEFAULT_SINK_BACKLOG = 64  # [job]
+
+
+class SinkConfig(NamedTuple):
+    coalesce: bool = False  # Only the newest pending job is kept
+    min_interval: float = 0.0  # Minimum time between the start of two jobs [s]
+    maxsize: int = DEFAULT_SINK_BACKLOG  # The oldest pending job is dropped beyond this
+
+
+def write_file_atomic(file_path, content):
+    """
+    Replaces the content of a file atomically, the readers of the file never see a partially written file.
+    The file is readable by the other users, like the files written with open().
+    """
+    directory = os.path.dirname(os.path.abspath(file_path))
+    with tempfile.NamedTemporaryFile("w", dir=directory, suffix=".tmp", delete=False, encoding="utf-8") as file:
+        file.write(content)
+    try:
+        os.chmod(file.name, 0o644)
+        os.replace(file.name, file_path)
+    except OSError:
+        os.unlink(file.name)
+        raise
+
+
+class OutputSink(threading.Thread):
+    def __init__(self, name, config, logger):
+        """
+        Parameters:
+        -----------
+        :param: name: Name of the sink, reported in the statistics
+        :param: config: SinkConfig of the sink
+        :param: logger: Logger of the dispatcher
+        """
+        super(OutputSink, self).__init__(name=f"output_{name}", daemon=True)
+        self.sink_name = name
+        self.config = config
+        self.logger = logger
+        # (submit time, job)
+        self.jobs = deque()
+        self.condition = threading.Condition()
+        self.stopped = False
+        self.last_start_time = 0.0
+
+        # Metrics
+        self.completed = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.last_error = None
+        self.last_latency = 0.0  # From the submission to the end of the last job [s]
+        self.max_latency = 0.0
+
+    def submit(self, job):
+        """
+        Queues a job, never blocks. The worker thread is started with the first job.
+        """
+        with self.condition:
+            if self.stopped:
+                return
+            if not self.is_alive():
+                self.start()
+            if self.config.coalesce and self.jobs:
+                self.jobs.clear()
+                self.coalesced += 1
+            elif len(self.jobs) >= self.config.maxsize:
+                self.jobs.popleft()
+                self.dropped += 1
+            self.jobs.append((time.time(), job))
+            self.condition.notify()
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
+
+    def run(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.jobs or self.stopped)
+                if self.stopped:
+                    return
+                # Rate limit, a coalescing sink may still get a newer job while waiting
+                next_start_time = self.last_start_time + self.config.min_interval
+                if time.time() < next_start_time:
+                    self.condition.wait_for(lambda: self.stopped, next_start_time - time.time())
+                    continue
+                submit_time, job = self.jobs.popleft()
+                self.last_start_time = time.time()
+
+            try:
+                job()
+                error = None
+            except Exception as e:
+                error = e
+            self.finish_job(submit_time, error)
+
+    def finish_job(self, submit_time, error):
+        with self.condition:
+            self.completed += 1
+            self.last_latency = time.time() - submit_time
+            self.max_latency = max(self.max_latency, self.last_latency)
+            if error is not None:
+                self.errors += 1
+                # Only the first error of a series is logged, a broken output would flood the log otherwise
+                if self.last_error is None:
+                    self.logger.error(f"Output {self.sink_name} failed: {error}")
+                self.last_error = str(error)
+            elif self.last_error is not None:
+                self.logger.info(f"Output {self.sink_name} recovered")
+                self.last_error = None
+
+    def get_stats(self):
+        with self.condition:
+            return {
+                "backlog": len(self.jobs),
+                "completed": self.completed,
+                "dropped": self.dropped,
+                "coalesced": self.coalesced,
+                "errors": self.errors,
+                "last_error": self.last_error,
+                "last_latency_ms": round(self.last_latency * 1000, 1),
+                "max_latency_ms": round(self.max_latency * 1000, 1),
+            }
+
+
+class OutputDispatcher:
+    def __init__(self, sink_configs, logging_level=10):
+        """
+        Parameters:
+        -----------
+        :param: sink_configs: Dict of the sink names and their SinkConfig
+        """
+        self.logger = logging.getLogger(__name__)
+        self.logger.setLevel(logging_level)
+        self.sinks = {name: OutputSink(name, config, self.logger) for name, config in sink_configs.items()}
+
+    def submit(self, sink_name, job):
+        """
+        Queues a job on a sink, never blocks
+
+        Parameters:
+        -----------
+        :param: sink_name: Name of the sink
+        :param: job: Callable without arguments, it must not refer to state that changes after the submission
+        """
+        self.sinks[sink_name].submit(job)
+
+    def stop(self):
+        for sink in self.sinks.values():
+            sink.stop()
+
+    def get_stats(self):
+        """
+        Returns the metrics of the sinks that have been used, keyed by the sink name
+        """
+        return {name: sink.get_stats() for name, sink in self.sinks.items() if sink.is_alive()}
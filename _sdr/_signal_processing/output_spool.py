@@ -0,0 +1,367 @@
+# KrakenSDR Signal Processor - Output spool
+#
+# Copyright (C) 2018-2021  Carl Laufer, Tamás Pető
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#
+# - coding: utf-8 -*-
+
+# Store-and-forward spool of the results sent to remote servers (Kraken Pro Remote, RDF Mapper, Full POST).
+#
+# The results are stored on disk first and delivered by a sender thread, so a station on a flaky link loses nothing
+# while the server is unreachable and the processing never waits for the network. Two modes are supported:
+#
+#   log     Every result is appended to segment files (one JSON record per line) and delivered in order, in batches.
+#           The delivered position is kept in a cursor file, so the backlog is replayed after a restart too. When
+#           the spool exceeds its size limit, the oldest segment is dropped.
+#   latest  Only the latest result of each VFO is kept (compacted), in a snapshot file. After an outage the
+#           current bearings are delivered instead of the whole track.
+#
+# A failed delivery is retried with exponential backoff. The records are delivered at least once: after a crash
+# the records sent since the last save of the cursor are sent again.
+
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+from output_dispatcher import write_file_atomic
+
+SPOOL_MODE_OFF = "off"  # The results are sent directly, they are lost while the server is unreachable
+SPOOL_MODE_LOG = "log"
+SPOOL_MODE_LATEST = "latest"
+SPOOL_MODES = (SPOOL_MODE_OFF, SPOOL_MODE_LOG, SPOOL_MODE_LATEST)
+
+SPOOL_SEGMENT_SIZE = 1024 * 1024  # [byte]
+SPOOL_MAX_SIZE = 32 * 1024 * 1024  # [byte] per output
+SPOOL_BATCH_SIZE = 32  # [record]
+SPOOL_RETRY_MIN_INTERVAL = 1.0  # [s]
+SPOOL_RETRY_MAX_INTERVAL = 60.0  # [s]
+SPOOL_SAVE_INTERVAL = 1.0  # Minimum time between two saves of the cursor or the snapshot [s]
+
+SPOOL_SEGMENT_SUFFIX = ".ndjson"
+SPOOL_CURSOR_FILENAME = "cursor.json"
+SPOOL_SNAPSHOT_FILENAME = "latest.json"
+
+
+def json_default(value):
+    """
+    JSON conversion of the NumPy scalars of the results, the other values are stored as text
+    """
+    return value.item() if hasattr(value, "item") else str(value)
+
+
+class OutputSpool(threading.Thread):
+    def __init__(
+        self, name, directory, send, mode=SPOOL_MODE_LOG, batch=False, max_size=SPOOL_MAX_SIZE, logging_level=10
+    ):
+        """
+        Parameters:
+        -----------
+        :param: name: Name of the output, used in the log messages
+        :param: directory: Directory of the spool files, created if missing
+        :param: send: Function delivering a record to the server, it must raise if the delivery failed
+        :param: mode: SPOOL_MODE_LOG or SPOOL_MODE_LATEST
+        :param: batch: send is called with the list of the records of a batch, delivered in one go
+        :param: max_size: Disk space limit of the segments [byte]
+        """
+        if mode not in (SPOOL_MODE_LOG, SPOOL_MODE_LATEST):
+            raise ValueError(f"Invalid spool mode: {mode}")
+        super(OutputSpool, self).__init__(name=f"spool_{name}", daemon=True)
+        self.logger = logging.getLogger(__name__)
+        self.logger.setLevel(logging_level)
+        self.spool_name = name
+        self.directory = directory
+        self.send = send
+        self.mode = mode
+        self.batch = batch
+        self.max_size = max_size
+        self.condition = threading.Condition()
+        self.stopped = False
+        self.retry_interval = 0.0
+        self.last_save_time = 0.0
+        self.unsaved = False
+
+        # Log mode: segment numbers in order, (segment number, byte offset) of the next record to deliver
+        self.segments = []
+        self.segment_sizes = {}
+        self.cursor = (0, 0)
+        self.segment_file = None
+        self.new_segment = False
+        # Latest mode: key -> record, in the order of the updates
+        self.latest = {}
+
+        # Metrics
+        self.pending = 0
+        self.sent = 0
+        self.dropped = 0
+        self.failures = 0
+        self.last_error = None
+
+        os.makedirs(directory, exist_ok=True)
+        if mode == SPOOL_MODE_LOG:
+            self.load_log()
+        else:
+            self.load_snapshot()
+        if self.pending:
+            self.logger.info(f"Spool {name}: {self.pending} results left from the last run")
+        self.start()
+
+    # Storage
+
+    def segment_path(self, segment):
+        return os.path.join(self.directory, f"{segment:012d}{SPOOL_SEGMENT_SUFFIX}")
+
+    def load_log(self):
+        for filename in os.listdir(self.directory):
+            if filename.endswith(SPOOL_SEGMENT_SUFFIX):
+                segment = int(filename[: -len(SPOOL_SEGMENT_SUFFIX)])
+                self.segments.append(segment)
+                self.segment_sizes[segment] = os.path.getsize(self.segment_path(segment))
+        self.segments.sort()
+        try:
+            with open(os.path.join(self.directory, SPOOL_CURSOR_FILENAME)) as file:
+                segment, offset = json.load(file)
+            self.cursor = (int(segment), int(offset))
+        except (OSError, ValueError, TypeError):
+            self.cursor = (self.segments[0], 0) if self.segments else (0, 0)
+        # Segments before the cursor have been delivered
+        for segment in [segment for segment in self.segments if segment < self.cursor[0]]:
+            self.segments.remove(segment)
+            del self.segment_sizes[segment]
+            os.remove(self.segment_path(segment))
+        if self.cursor[0] not in self.segment_sizes:
+            # The segment of the cursor has been dropped
+            self.cursor = (self.segments[0], 0) if self.segments else (self.cursor[0], 0)
+        self.pending = sum(self.count_records(segment) for segment in self.segments)
+        # The last segment may end with a line cut by a crash, the new records go to a new segment
+        self.new_segment = True
+
+    def count_records(self, segment):
+        """
+        Number of records of a segment not delivered yet
+        """
+        if segment < self.cursor[0]:
+            return 0
+        with open(self.segment_path(segment), "rb") as file:
+            if segment == self.cursor[0]:
+                file.seek(self.cursor[1])
+            return file.read().count(b"\n")
+
+    def load_snapshot(self):
+        try:
+            with open(os.path.join(self.directory, SPOOL_SNAPSHOT_FILENAME)) as file:
+                self.latest = dict(json.load(file))
+        except (OSError, ValueError):
+            self.latest = {}
+        self.pending = len(self.latest)
+
+    def append(self, key, record):
+        """
+        Stores a record for delivery, only blocks for the write to the local disk
+
+        Parameters:
+        -----------
+        :param: key: Key of the record in the latest mode, e.g. the frequency of the VFO
+        :param: record: JSON serializable record, passed to the send function
+        """
+        with self.condition:
+            if self.mode == SPOOL_MODE_LOG:
+                self.append_log(json.dumps(record, default=json_default) + "\n")
+            else:
+                if self.latest.pop(str(key), None) is None:
+                    self.pending += 1
+                self.latest[str(key)] = record
+                self.unsaved = True
+            self.condition.notify()
+
+    def append_log(self, line):
+        data = line.encode()
+        segment = self.segments[-1] if self.segments else None
+        if segment is None or self.new_segment or self.segment_sizes[segment] + len(data) > SPOOL_SEGMENT_SIZE:
+            self.new_segment = False
+            segment = self.segments[-1] + 1 if self.segments else self.cursor[0]
+            if self.segment_file is not None:
+                self.segment_file.close()
+                self.segment_file = None
+            self.segments.append(segment)
+            self.segment_sizes[segment] = 0
+        if self.segment_file is None:
+            self.segment_file = open(self.segment_path(segment), "ab")
+        self.segment_file.write(data)
+        self.segment_file.flush()
+        self.segment_sizes[segment] += len(data)
+        self.pending += 1
+
+        # Disk space limit, the oldest results are dropped
+        while len(self.segments) > 1 and sum(self.segment_sizes.values()) > self.max_size:
+            dropped = self.count_records(self.segments[0])
+            self.remove_segment(self.segments[0])
+            self.pending -= dropped
+            self.dropped += dropped
+            self.logger.warning(f"Spool {self.spool_name} is full, {dropped} results dropped")
+
+    def remove_segment(self, segment):
+        self.segments.remove(segment)
+        del self.segment_sizes[segment]
+        os.remove(self.segment_path(segment))
+        if self.cursor[0] <= segment:
+            self.cursor = (self.segments[0], 0)
+            self.unsaved = True
+
+    def read_batch(self):
+        """
+        Returns the next records to deliver, with their end positions for commit_batch()
+        """
+        if self.mode == SPOOL_MODE_LATEST:
+            return [(key, record) for key, record in list(self.latest.items())[:SPOOL_BATCH_SIZE]]
+
+        batch = []
+        while not batch and self.segments:
+            segment, offset = self.cursor
+            with open(self.segment_path(segment), "rb") as file:
+                file.seek(offset)
+                while len(batch) < SPOOL_BATCH_SIZE:
+                    line = file.readline()
+                    # A line without end is being written, or was cut by a crash in an older segment
+                    if not line.endswith(b"\n"):
+                        break
+                    offset += len(line)
+                    try:
+                        batch.append(((segment, offset), json.loads(line)))
+                    except ValueError:
+                        # Corrupted record, skipped
+                        self.cursor = (segment, offset)
+                        self.pending -= 1
+                        self.dropped += 1
+            if not batch:
+                if segment == self.segments[-1]:
+                    break
+                # Fully delivered segment
+                self.remove_segment(segment)
+        return batch
+
+    def commit_batch(self, batch, count):
+        """
+        Marks the first count records of a batch delivered
+        """
+        if not count:
+            return
+        if self.mode == SPOOL_MODE_LATEST:
+            for key, record in batch[:count]:
+                # Unless a newer result arrived meanwhile
+                if self.latest.get(key) is record:
+                    del self.latest[key]
+                    self.pending -= 1
+        else:
+            position = batch[count - 1][0]
+            if position[0] != self.cursor[0] or position[1] <= self.cursor[1]:
+                # The segment has been dropped meanwhile
+                return
+            self.cursor = position
+            self.pending -= count
+        self.sent += count
+        self.unsaved = True
+
+    def save(self, force=False):
+        """
+        Saves the cursor or the snapshot, at most once per SPOOL_SAVE_INTERVAL unless forced
+        """
+        now = time.time()
+        if not self.unsaved or (not force and now - self.last_save_time < SPOOL_SAVE_INTERVAL):
+            return
+        self.unsaved = False
+        self.last_save_time = now
+        try:
+            if self.mode == SPOOL_MODE_LOG:
+                write_file_atomic(os.path.join(self.directory, SPOOL_CURSOR_FILENAME), json.dumps(self.cursor))
+            else:
+                content = json.dumps(list(self.latest.items()), default=json_default)
+                write_file_atomic(os.path.join(self.directory, SPOOL_SNAPSHOT_FILENAME), content)
+        except OSError as e:
+            self.logger.error(f"Failed to save the spool {self.spool_name}: {e}")
+
+    # Delivery
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
+
+    def run(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.pending or self.stopped, SPOOL_SAVE_INTERVAL)
+                self.save(force=self.stopped)
+                if self.stopped:
+                    if self.segment_file is not None:
+                        self.segment_file.close()
+                    return
+                try:
+                    batch = self.read_batch()
+                except OSError as e:
+                    self.logger.error(f"Failed to read the spool {self.spool_name}: {e}")
+                    batch = []
+                    self.condition.wait_for(lambda: self.stopped, SPOOL_RETRY_MAX_INTERVAL)
+            if not batch:
+                continue
+
+            count = 0
+            error = None
+            try:
+                if self.batch:
+                    self.send([record for _, record in batch])
+                    count = len(batch)
+                else:
+                    for _, record in batch:
+                        self.send(record)
+                        count += 1
+            except Exception as e:
+                error = e
+
+            with self.condition:
+                self.commit_batch(batch, count)
+                if error is None:
+                    if self.last_error is not None:
+                        self.logger.info(f"Spool {self.spool_name} delivering again, {self.pending} results pending")
+                        self.last_error = None
+                    self.retry_interval = 0.0
+                    continue
+                self.failures += 1
+                if self.last_error is None:
+                    self.logger.warning(f"Spool {self.spool_name} delivery failed, retrying: {error}")
+                self.last_error = str(error)
+                self.retry_interval = min(
+                    max(self.retry_interval * 2, SPOOL_RETRY_MIN_INTERVAL), SPOOL_RETRY_MAX_INTERVAL
+                )
+                # The jitter spreads the retries of the stations after a server outage
+                self.condition.wait_for(lambda: self.stopped, self.retry_interval * random.uniform(0.8, 1.2))
+
+    def get_stats(self):
+        with self.condition:
+            stats = {
+                "mode": self.mode,
+                "pending": self.pending,
+                "sent": self.sent,
+                "dropped": self.dropped,
+                "failures": self.failures,
+                "last_error": self.last_error,
+                "retry_interval_s": round(self.retry_interval, 1),
+            }
+            if self.mode == SPOOL_MODE_LOG:
+                stats["size_kb"] = round(sum(self.segment_sizes.values()) / 1024, 1)
+            return stats
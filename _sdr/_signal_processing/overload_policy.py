@@ -0,0 +1,180 @@
+# KrakenSDR Signal Processor - Overload policy
+#
+# Copyright (C) 2018-2021  Carl Laufer, Tamás Pető
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#
+# - coding: utf-8 -*-
+
+# When the processing of a frame takes longer than the frame itself (CPI), the signal processor falls behind the DAQ
+# and the latency keeps growing. The overload policy walks a ladder of degradation steps while the load is too high,
+# and steps back once it has recovered. Only the steps enabled in the settings ("overload_policy" list) are used,
+# in the order below.
+
+import logging
+from collections import deque
+
+import numpy as np
+
+# Drop frames that are older than STALE_FRAME_CPI_COUNT CPIs, so the newest frame is processed
+STEP_SKIP_STALE_FRAMES = "skip_stale_frames"
+# Evaluate the DoA spectrum on every COARSE_DOA_GRID_STEP-th degree and interpolate in between
+STEP_COARSE_DOA_GRID = "coarse_doa_grid"
+# Calculate the spectrum of a single channel even if "Full" spectrum calculation is selected
+STEP_SINGLE_SPECTRUM = "single_spectrum"
+# Estimate the DoA of the output VFO only, even if all VFOs are selected for output
+STEP_OUTPUT_VFO_ONLY = "output_vfo_only"
+OVERLOAD_STEPS = (STEP_SKIP_STALE_FRAMES, STEP_COARSE_DOA_GRID, STEP_SINGLE_SPECTRUM, STEP_OUTPUT_VFO_ONLY)
+
+OVERLOAD_LOAD_THRESHOLD = 0.95  # Processing time / CPI time above which a frame counts as overloaded
+RECOVERY_LOAD_THRESHOLD = 0.7  # Processing time / CPI time below which a frame counts as recovered
+OVERLOAD_FRAME_COUNT = 3  # Consecutive overloaded frames before the next step is taken
+RECOVERY_FRAME_COUNT = 20  # Consecutive recovered frames before the last step is undone
+STALE_FRAME_CPI_COUNT = 2
+# The DAQ and the host clocks are not synchronized, the age of a frame is its delay (host time - DAQ time stamp)
+# above the lowest delay of the last STALE_FRAME_DELAY_WINDOW data frames
+STALE_FRAME_DELAY_WINDOW = 100
+# At most this many frames are skipped in a row, the next one is processed whatever its age
+MAX_CONSECUTIVE_STALE_FRAMES = 4
+COARSE_DOA_GRID_STEP = 4  # [deg]
+DOA_GRID_SIZE = 360
+
+
+def interpolate_doa_grid(doa, grid_step, grid_size=DOA_GRID_SIZE):
+    """
+    Interpolates a DoA spectrum evaluated on every grid_step-th degree back to the full grid (circularly)
+
+    Parameters:
+    -----------
+    :param: doa: DoA spectrum on the coarse grid
+    :param: grid_step: Step of the coarse grid [deg]
+    """
+    thetas = np.arange(grid_size)
+    coarse_thetas = thetas[::grid_step]
+    if np.iscomplexobj(doa):
+        return np.interp(thetas, coarse_thetas, doa.real, period=grid_size) + 1j * np.interp(
+            thetas, coarse_thetas, doa.imag, period=grid_size
+        )
+    return np.interp(thetas, coarse_thetas, doa, period=grid_size)
+
+
+class OverloadPolicy:
+    def __init__(self, logging_level=10):
+        self.logger = logging.getLogger(__name__)
+        self.logger.setLevel(logging_level)
+
+        self.active_steps = []
+        self.load = 0.0
+        self.overloaded_frames = 0
+        self.recovered_frames = 0
+        self.skipped_stale_frames = 0
+        self.consecutive_stale_frames = 0
+        self.frame_delays = deque(maxlen=STALE_FRAME_DELAY_WINDOW)
+
+    def prune_steps(self, enabled_steps):
+        # Steps disabled in the meantime are undone immediately
+        self.active_steps = [step for step in self.active_steps if step in enabled_steps]
+
+    def count_recovered_frame(self):
+        self.recovered_frames += 1
+        if self.recovered_frames >= RECOVERY_FRAME_COUNT:
+            self.recovered_frames = 0
+            if self.active_steps:
+                step = self.active_steps.pop()
+                self.logger.info(f"Processing recovered (load: {self.load:.2f}), disabling {step}")
+
+    def update(self, processing_time, cpi_time, enabled_steps):
+        """
+        Updates the degradation level with the load of the last processed frame
+
+        Parameters:
+        -----------
+        :param: processing_time: Processing time of the frame [ms]
+        :param: cpi_time: Length of the frame [ms]
+        :param: enabled_steps: Degradation steps that may be used
+        """
+        self.prune_steps(enabled_steps)
+        if cpi_time <= 0:
+            return
+
+        self.load = processing_time / cpi_time
+        if self.load > OVERLOAD_LOAD_THRESHOLD:
+            self.overloaded_frames += 1
+            self.recovered_frames = 0
+        elif self.load < RECOVERY_LOAD_THRESHOLD:
+            self.overloaded_frames = 0
+            self.count_recovered_frame()
+            return
+        else:
+            self.overloaded_frames = 0
+            self.recovered_frames = 0
+
+        if self.overloaded_frames >= OVERLOAD_FRAME_COUNT:
+            self.overloaded_frames = 0
+            next_steps = [step for step in OVERLOAD_STEPS if step in enabled_steps and step not in self.active_steps]
+            if next_steps:
+                self.active_steps.append(next_steps[0])
+                self.logger.warning(f"Processing overloaded (load: {self.load:.2f}), enabling {next_steps[0]}")
+
+    def is_stale_frame(self, frame_delay, cpi_time, enabled_steps):
+        """
+        Returns True if the frame should be skipped in favour of a newer one. A skipped frame costs no processing
+        time, it counts toward the recovery.
+
+        Parameters:
+        -----------
+        :param: frame_delay: Host time when the frame is read minus the DAQ time stamp of the frame [ms]
+        :param: cpi_time: Length of the frame [ms]
+        :param: enabled_steps: Degradation steps that may be used
+        """
+        self.prune_steps(enabled_steps)
+        # The delays are tracked while the step is inactive too, the clock offset is known when it is taken
+        self.frame_delays.append(frame_delay)
+        if STEP_SKIP_STALE_FRAMES not in self.active_steps or cpi_time <= 0:
+            self.consecutive_stale_frames = 0
+            return False
+
+        if self.consecutive_stale_frames >= MAX_CONSECUTIVE_STALE_FRAMES:
+            # Keep the results flowing even if the processing never catches up
+            self.consecutive_stale_frames = 0
+            return False
+        frame_age = frame_delay - min(self.frame_delays)
+        if frame_age > STALE_FRAME_CPI_COUNT * cpi_time:
+            self.consecutive_stale_frames += 1
+            self.skipped_stale_frames += 1
+            self.count_recovered_frame()
+            return True
+        self.consecutive_stale_frames = 0
+        return False
+
+    @property
+    def doa_grid_step(self):
+        return COARSE_DOA_GRID_STEP if STEP_COARSE_DOA_GRID in self.active_steps else 1
+
+    @property
+    def single_spectrum(self):
+        return STEP_SINGLE_SPECTRUM in self.active_steps
+
+    @property
+    def output_vfo_only(self):
+        return STEP_OUTPUT_VFO_ONLY in self.active_steps
+
+    def get_status(self):
+        return {
+            "level": len(self.active_steps),
+            "active_steps": list(self.active_steps),
+            "load": round(self.load, 3),
+            "skipped_stale_frames": self.skipped_stale_frames,
+        }
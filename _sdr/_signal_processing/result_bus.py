@@ -0,0 +1,191 @@
+# KrakenSDR Signal Processor - Result bus
+#
+# Copyright (C) 2018-2021  Carl Laufer, Tamás Pető
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#
+# - coding: utf-8 -*-
+
+# In-process publish/subscribe bus for the results of the signal processor.
+#
+# The signal processor publishes typed messages for every frame: the spectrum, the DoA of each VFO and the VFO
+# state, followed by the frame status, which closes the frame. Every subscriber (web interface, recorders, network
+# outputs) has its own bounded que and consumes it at its own pace. Publishing never blocks, when a que is full
+# the message is dropped according to the drop policy of the subscription and counted.
+
+import collections
+import queue
+import threading
+import time
+from typing import NamedTuple
+
+import numpy as np
+
+DEFAULT_SUBSCRIPTION_SIZE = 64  # [message]
+
+# Drop policies of a full subscription que
+DROP_OLDEST = "drop_oldest"  # The newest results are kept, for live displays
+DROP_NEWEST = "drop_newest"  # The results are kept in order without gaps until the que overflows
+
+
+class SignalLevel(NamedTuple):
+    """Published for every processed frame"""
+
+    max_amplitude: float  # Max amplitude of the first channel [dB]
+
+
+class SpectrumResult(NamedTuple):
+    """Spectrum of a processed frame, only published while the spectrum graphs are shown"""
+
+    spectrum: np.ndarray  # Rows for plotting, see reduce_spectrum()
+    zoom_spectra: list  # High resolution spectrum of each active VFO, None if the VFO was not channelized
+
+
+class DoAResult(NamedTuple):
+    """DoA estimate of a VFO whose squelch was open"""
+
+    timestamp: int  # Frame timestamp [ms]
+    vfo_index: int
+    freq: int  # [Hz]
+    thetas: np.ndarray  # Incident angles of the DoA spectrum [deg]
+    doa_result_log: np.ndarray  # DoA spectrum [dB]
+    theta_0: float  # Estimated DoA [deg]
+    confidence: float
+    max_power_level: float  # [dB]
+    snr: float  # [dB]
+    number_of_correlated_sources: int
+
+
+class VFOStatus(NamedTuple):
+    """State of the VFOs after the DoA processing of a frame"""
+
+    squelch_update: list  # True for the VFOs with a new DoA estimate
+    doa_max: np.ndarray  # Last DoA estimate of each VFO [deg]
+    auto_vfos: list  # (freq [Hz], bw [Hz]) of the VFOs placed by the "Auto" and "CFAR" VFO modes
+
+
+class FrameStatus(NamedTuple):
+    """Published for every frame, processed or not, after the other results of the frame"""
+
+    iq_header: object
+    update_rate: float  # Processing time of the frame [s]
+    latency: int  # [ms]
+
+
+class Subscription:
+    """
+    Bounded que of the messages delivered to a subscriber, get() follows the queue.Queue interface
+    """
+
+    def __init__(self, name, maxsize, drop_policy, message_types):
+        """
+        Parameters:
+        -----------
+        :param: name: Name of the subscriber, reported in the statistics
+        :param: maxsize: Maximum number of messages waiting in the que
+        :param: drop_policy: DROP_OLDEST or DROP_NEWEST
+        :param: message_types: Tuple of the message types to deliver, None delivers every message
+        """
+        if drop_policy not in (DROP_OLDEST, DROP_NEWEST):
+            raise ValueError(f"Invalid drop policy: {drop_policy}")
+        self.name = name
+        self.maxsize = max(int(maxsize), 1)
+        self.drop_policy = drop_policy
+        self.message_types = message_types
+        # (publish time, message)
+        self.messages = collections.deque()
+        self.condition = threading.Condition()
+        # Lag counters
+        self.published = 0
+        self.dropped = 0
+        self.max_backlog = 0
+        self.last_lag = 0.0  # Time the last message taken spent in the que [s]
+
+    def wants(self, message):
+        return self.message_types is None or isinstance(message, self.message_types)
+
+    def offer(self, message):
+        """
+        Enqueues a message, never blocks
+        """
+        with self.condition:
+            self.published += 1
+            if len(self.messages) >= self.maxsize:
+                self.dropped += 1
+                if self.drop_policy == DROP_NEWEST:
+                    return
+                self.messages.popleft()
+            self.messages.append((time.monotonic(), message))
+            self.max_backlog = max(self.max_backlog, len(self.messages))
+            self.condition.notify()
+
+    def get(self, block=True, timeout=None):
+        with self.condition:
+            if not block:
+                if not self.messages:
+                    raise queue.Empty
+            elif not self.condition.wait_for(lambda: self.messages, timeout):
+                raise queue.Empty
+            publish_time, message = self.messages.popleft()
+            self.last_lag = time.monotonic() - publish_time
+            return message
+
+    def get_stats(self):
+        with self.condition:
+            return {
+                "backlog": len(self.messages),
+                "max_backlog": self.max_backlog,
+                "published": self.published,
+                "dropped": self.dropped,
+                "last_lag_ms": round(self.last_lag * 1000, 1),
+            }
+
+
+class ResultBus:
+    def __init__(self):
+        # Replaced on every change, so publish() can iterate it without holding the lock
+        self.subscriptions = ()
+        self.lock = threading.Lock()
+
+    def subscribe(self, name, maxsize=DEFAULT_SUBSCRIPTION_SIZE, drop_policy=DROP_OLDEST, message_types=None):
+        """
+        Returns a new subscription, the messages are delivered from the next publish() call
+
+        Parameters:
+        -----------
+        :param: name: Name of the subscriber, reported in the statistics
+        :param: maxsize: Maximum number of messages waiting in the que
+        :param: drop_policy: What to drop when the que is full, DROP_OLDEST or DROP_NEWEST
+        :param: message_types: Tuple of the message types to deliver, None delivers every message
+        """
+        subscription = Subscription(name, maxsize, drop_policy, message_types)
+        with self.lock:
+            self.subscriptions = self.subscriptions + (subscription,)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscriptions = tuple(s for s in self.subscriptions if s is not subscription)
+
+    def publish(self, message):
+        for subscription in self.subscriptions:
+            if subscription.wants(message):
+                subscription.offer(message)
+
+    def get_stats(self):
+        """
+        Returns the lag counters of the subscriptions, keyed by the subscriber name
+        """
+        return {subscription.name: subscription.get_stats() for subscription in self.subscriptions}
@@ -0,0 +1,220 @@
+# KrakenSDR Signal Processor - Frequency scan scheduler
+#
+# Copyright (C) 2018-2021  Carl Laufer, Tamás Pető
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#
+# - coding: utf-8 -*-
+
+# Scan mode: the receiver steps through a list of center frequencies (hops), each with its own set of VFOs, and
+# dwells on every hop for a given number of data frames.
+#
+# Retuning is asynchronous, the DAQ keeps delivering frames of the previous frequency for a while. These frames are
+# recognised by the RF center frequency in their IQ header and discarded, together with SCAN_SETTLE_FRAMES frames
+# after the new frequency shows up. If the new frequency does not show up in SCAN_RETUNE_TIMEOUT, the retune
+# command is sent again.
+
+import logging
+import time
+
+SCAN_DEFAULT_DWELL_FRAMES = 10
+SCAN_SETTLE_FRAMES = 1  # Frames discarded after the retune, they may still contain samples of the transition
+SCAN_RETUNE_TIMEOUT = 5.0  # [s]
+SCAN_FREQ_TOLERANCE = 1000  # [Hz]
+
+
+class ScanHop:
+    def __init__(self, center_freq, vfo_freqs, vfo_bws):
+        """
+        Parameters:
+        -----------
+        :param: center_freq: Center frequency of the receiver [Hz]
+        :param: vfo_freqs: Frequencies of the VFOs [Hz]
+        :param: vfo_bws: Bandwidths of the VFOs [Hz], None keeps the configured bandwidth
+        """
+        self.center_freq = center_freq
+        self.vfo_freqs = vfo_freqs
+        self.vfo_bws = vfo_bws
+
+
+def parse_scan_hops(scan_hops):
+    """
+    Converts the "scan_hops" list of the settings file to ScanHop objects. Every entry is a dictionary with
+    "center_freq" [MHz], and optionally "vfo_freqs" [MHz] and "vfo_bws" [Hz] lists. Without VFO frequencies a single
+    VFO is placed at the center frequency.
+    """
+    hops = []
+    for scan_hop in scan_hops:
+        center_freq = int(float(scan_hop["center_freq"]) * 10**6)
+        vfo_freqs = [float(freq) * 10**6 for freq in scan_hop.get("vfo_freqs", [])] or [float(center_freq)]
+        vfo_bws = [int(bw) for bw in scan_hop.get("vfo_bws", [])]
+        vfo_bws += [None] * (len(vfo_freqs) - len(vfo_bws))
+        hops.append(ScanHop(center_freq, vfo_freqs, vfo_bws[: len(vfo_freqs)]))
+    return hops
+
+
+class ScanScheduler:
+    def __init__(self, logging_level=10):
+        self.logger = logging.getLogger(__name__)
+        self.logger.setLevel(logging_level)
+
+        self.scan_hops = []  # Hop list of the settings file, the hops are parsed from it
+        self.hops = []
+        self.dwell_frames = SCAN_DEFAULT_DWELL_FRAMES
+        self.reset()
+
+    def reset(self):
+        self.hop_index = -1
+        self.retune_request = None
+        self.retuning = False
+        self.retune_time = 0.0
+        self.settle_frames = 0
+        self.dwell_count = 0
+        self.discarded_frames = 0
+        self.retune_dead_time_sum = 0.0
+        self.retune_count = 0
+        self.start_time = None
+        self.doa_results = 0
+        self.cycle_start_time = None
+        self.cycle_doa_results = 0
+        self.last_cycle_time = 0.0
+        self.last_cycle_doa_results = 0
+
+    @property
+    def active(self):
+        return bool(self.hops)
+
+    @property
+    def current_hop(self):
+        return self.hops[self.hop_index] if 0 <= self.hop_index < len(self.hops) else None
+
+    def configure(self, scan_hops, dwell_frames):
+        """
+        Updates the hop list, the scan restarts from the first hop if the list has changed.
+        Returns True if the scan was started, stopped or restarted.
+
+        Parameters:
+        -----------
+        :param: scan_hops: "scan_hops" list of the settings file, empty to stop scanning
+        :param: dwell_frames: Number of processed data frames on each hop
+        """
+        self.dwell_frames = max(int(dwell_frames), 1)
+        if scan_hops == self.scan_hops:
+            return False
+
+        self.scan_hops = list(scan_hops)
+        try:
+            self.hops = parse_scan_hops(self.scan_hops)
+        except (KeyError, TypeError, ValueError, AttributeError) as error:
+            self.logger.error(f"Invalid scan hop list, scanning disabled: {error}")
+            self.hops = []
+        self.reset()
+        if self.hops:
+            self.logger.info(f"Scanning {len(self.hops)} center frequencies")
+            self.start_time = time.time()
+            self.cycle_start_time = self.start_time
+            self.next_hop()
+        return True
+
+    def next_hop(self):
+        previous_hop = self.current_hop
+        cycle_completed = self.hop_index == len(self.hops) - 1
+        self.hop_index = (self.hop_index + 1) % len(self.hops)
+        if cycle_completed:
+            now = time.time()
+            self.last_cycle_time = now - self.cycle_start_time
+            self.last_cycle_doa_results = self.cycle_doa_results
+            self.cycle_start_time = now
+            self.cycle_doa_results = 0
+        self.dwell_count = 0
+        if previous_hop is not None and previous_hop.center_freq == self.current_hop.center_freq:
+            # Only the VFOs change, no dead time
+            return
+        self.retune_request = self.current_hop
+        self.retuning = True
+        self.retune_time = time.time()
+
+    def pop_retune_request(self):
+        """
+        Returns the hop the receiver has to be tuned to, or None if no retune is needed
+        """
+        hop = self.retune_request
+        self.retune_request = None
+        return hop
+
+    def accept_frame(self, rf_center_freq):
+        """
+        Returns True if the data frame belongs to the current hop and it can be processed
+
+        Parameters:
+        -----------
+        :param: rf_center_freq: RF center frequency from the IQ header of the frame [Hz]
+        """
+        hop = self.current_hop
+        if hop is None:
+            return True
+
+        if self.retuning:
+            if abs(rf_center_freq - hop.center_freq) > SCAN_FREQ_TOLERANCE:
+                self.discarded_frames += 1
+                if time.time() - self.retune_time > SCAN_RETUNE_TIMEOUT:
+                    self.logger.warning(f"Retuning to {hop.center_freq / 10**6:.3f} MHz timed out, retrying")
+                    self.retune_request = hop
+                    self.retune_time = time.time()
+                return False
+            self.retuning = False
+            self.retune_dead_time_sum += time.time() - self.retune_time
+            self.retune_count += 1
+            self.settle_frames = SCAN_SETTLE_FRAMES
+
+        if self.settle_frames > 0:
+            self.settle_frames -= 1
+            self.discarded_frames += 1
+            return False
+        return True
+
+    def frame_done(self, doa_result_number):
+        """
+        Counts a processed frame of the current hop, moves to the next hop after dwell_frames frames
+
+        Parameters:
+        -----------
+        :param: doa_result_number: Number of DoA results (VFOs above the squelch) of the frame
+        """
+        if self.current_hop is None:
+            return
+        self.doa_results += doa_result_number
+        self.cycle_doa_results += doa_result_number
+        self.dwell_count += 1
+        if self.dwell_count >= self.dwell_frames:
+            self.next_hop()
+
+    def get_status(self):
+        elapsed = time.time() - self.start_time if self.start_time is not None else 0.0
+        return {
+            "hop_index": self.hop_index,
+            "hop_number": len(self.hops),
+            "center_freq_hz": self.current_hop.center_freq if self.current_hop is not None else 0,
+            "retuning": self.retuning,
+            "discarded_frames": self.discarded_frames,
+            "mean_retune_dead_time_ms": (
+                round(1000 * self.retune_dead_time_sum / self.retune_count, 1) if self.retune_count else 0.0
+            ),
+            "doa_results_per_second": round(self.doa_results / elapsed, 3) if elapsed > 0 else 0.0,
+            "last_cycle_s": round(self.last_cycle_time, 3),
+            "last_cycle_doa_results_per_second": (
+                round(self.last_cycle_doa_results / self.last_cycle_time, 3) if self.last_cycle_time > 0 else 0.0
+            ),
+        }
@@ -0,0 +1,215 @@
+# KrakenSDR Signal Processor - Settings file watcher
+#
+# Copyright (C) 2018-2021  Carl Laufer, Tamás Pető
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#
+# - coding: utf-8 -*-
+
+# Watches settings.json and reports the settings that have changed.
+#
+# On Linux the directory of the file is watched with inotify (through ctypes, there is no Python binding in the
+# standard library), so the changes written by the node middleware or remote tools are picked up right after the
+# file is closed. The directory is watched instead of the file, because editors and atomic writers replace the file
+# by renaming a new one over it. Where inotify is not available, the modification time of the file is polled.
+#
+# A writer may touch the file several times in a row, the file is only read once the events have stopped for
+# SETTINGS_DEBOUNCE_TIME. Touching the file without changing its content requests a reload of every setting, the
+# pipeline runner uses this to forward SIGHUP to its stages.
+
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import threading
+
+from kraken_sdr_settings import load_settings_file
+
+SETTINGS_POLL_INTERVAL = 0.5  # [s] Without inotify
+SETTINGS_DEBOUNCE_TIME = 0.05  # [s]
+
+# inotify constants, see <sys/inotify.h>
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+INOTIFY_EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+INOTIFY_READ_SIZE = 4096
+
+
+class InotifyWatch:
+    """
+    inotify watch of a directory, raises OSError if inotify is not available
+    """
+
+    def __init__(self, directory, mask=IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE):
+        libc_name = ctypes.util.find_library("c")
+        if libc_name is None:
+            raise OSError("libc not found")
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError("inotify is not supported")
+
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory), mask) < 0:
+            error = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(error, os.strerror(error))
+
+    def fileno(self):
+        return self.fd
+
+    def read_names(self):
+        """
+        Returns the names of the files with pending events
+        """
+        try:
+            buffer = os.read(self.fd, INOTIFY_READ_SIZE)
+        except BlockingIOError:
+            return set()
+
+        names = set()
+        offset = 0
+        while offset + INOTIFY_EVENT_HEADER.size <= len(buffer):
+            _, _, _, name_length = INOTIFY_EVENT_HEADER.unpack_from(buffer, offset)
+            offset += INOTIFY_EVENT_HEADER.size
+            names.add(os.fsdecode(buffer[offset : offset + name_length].rstrip(b"\0")))
+            offset += name_length
+        return names
+
+    def close(self):
+        os.close(self.fd)
+
+
+def get_changed_keys(settings, previous_settings):
+    """
+    Returns the keys of the settings that were added, removed or changed, the "timestamp" key is ignored
+    """
+    keys = (settings.keys() | previous_settings.keys()) - {"timestamp"}
+    return frozenset(key for key in keys if settings.get(key) != previous_settings.get(key))
+
+
+class SettingsFileWatcher(threading.Thread):
+    """
+    Calls on_change with the new settings and the set of changed keys when the settings file changes
+    """
+
+    def __init__(self, settings_file_path, on_change, settings, logging_level=10):
+        """
+        Parameters:
+        -----------
+        :param: settings_file_path: Settings file to watch
+        :param: on_change: Called with the loaded settings and the changed keys, from the watcher thread
+        :param: settings: Settings that are already applied, with the "timestamp" key (see load_settings_file)
+        """
+        super(SettingsFileWatcher, self).__init__(name="settings_watcher", daemon=True)
+        self.logger = logging.getLogger(__name__)
+        self.logger.setLevel(logging_level)
+        self.settings_file_path = settings_file_path
+        self.file_name = os.path.basename(settings_file_path)
+        self.on_change = on_change
+        self.settings = dict(settings)
+        self.reload_event = threading.Event()
+        self.stop_event = threading.Event()
+        # Wakes the thread up for reload and stop
+        self.wakeup_read_fd, self.wakeup_write_fd = os.pipe()
+
+    def reload(self):
+        """Applies every setting of the file, even if the file has not changed"""
+        self.reload_event.set()
+        self.wake_up()
+
+    def stop(self):
+        self.stop_event.set()
+        self.wake_up()
+
+    def wake_up(self):
+        try:
+            os.write(self.wakeup_write_fd, b"\0")
+        except OSError:
+            pass
+
+    def run(self):
+        try:
+            watch = InotifyWatch(os.path.dirname(os.path.abspath(self.settings_file_path)))
+            self.logger.debug("Watching the settings file with inotify")
+        except OSError as e:
+            watch = None
+            self.logger.info(f"inotify is not available ({e}), polling the settings file")
+
+        last_attempt_failed = False
+        try:
+            # The file may have changed since the settings were loaded
+            file_event = True
+            while not self.stop_event.is_set():
+                force_reload = self.reload_event.is_set()
+                self.reload_event.clear()
+                if file_event or force_reload:
+                    last_attempt_failed = self.check_file(force_reload, last_attempt_failed)
+                file_event = self.wait_for_change(watch)
+        finally:
+            if watch is not None:
+                watch.close()
+            os.close(self.wakeup_read_fd)
+            os.close(self.wakeup_write_fd)
+
+    def wait_for_change(self, watch):
+        """
+        Blocks until the settings file changes or the thread is woken up.
+        Returns True if the file has to be checked.
+        """
+        if watch is None:
+            readable, _, _ = select.select([self.wakeup_read_fd], [], [], SETTINGS_POLL_INTERVAL)
+            if readable:
+                os.read(self.wakeup_read_fd, INOTIFY_READ_SIZE)
+            return True
+
+        readable, _, _ = select.select([watch, self.wakeup_read_fd], [], [])
+        if self.wakeup_read_fd in readable:
+            os.read(self.wakeup_read_fd, INOTIFY_READ_SIZE)
+        if watch not in readable or self.file_name not in watch.read_names():
+            return False
+        # Debounce, wait for the writes to settle
+        while select.select([watch], [], [], SETTINGS_DEBOUNCE_TIME)[0]:
+            watch.read_names()
+        return True
+
+    def check_file(self, force_reload, last_attempt_failed):
+        """
+        Loads the settings file if it has changed and calls on_change, returns True if the file could not be loaded
+        """
+        try:
+            if not force_reload and os.stat(self.settings_file_path).st_mtime == self.settings["timestamp"]:
+                return False
+            settings = load_settings_file(self.settings_file_path)
+        except Exception as e:
+            if not last_attempt_failed:
+                self.logger.error(f"Problem loading settings file: {e}")
+            return True
+
+        changed_keys = get_changed_keys(settings, self.settings)
+        if force_reload or (not changed_keys and settings["timestamp"] != self.settings["timestamp"]):
+            changed_keys = frozenset(settings.keys() - {"timestamp"})
+        self.settings = settings
+        if changed_keys:
+            self.on_change(settings, changed_keys)
+        return False
@@ -0,0 +1,159 @@
+# KrakenSDR Signal Processor - Spectrum engine
+#
+# Copyright (C) 2018-2021  Carl Laufer, Tamás Pető
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#
+# - coding: utf-8 -*-
+
+# Power spectrum estimation of all channels with one batched FFT call, as a replacement of the per channel
+# scipy.signal.welch / periodogram calls. The results match scipy.signal with detrend=False,
+# return_onesided=False and scaling="spectrum", converted to dB and fftshift-ed.
+
+from functools import lru_cache
+
+import numpy as np
+from scipy import fft, signal
+
+FFT_WORKERS = -1  # Use all CPU cores
+HOLD_MODE_PEAK = "peak"
+HOLD_MODE_AVERAGE = "average"
+DEFAULT_AVERAGE_HOLD_FACTOR = 0.1  # Weight of the new spectrum in the exponential average
+
+
+@lru_cache(maxsize=16)
+def get_spectrum_window(window, size):
+    """
+    Returns the (cached, read-only) window and its power spectrum scaling factor
+
+    Parameters:
+    -----------
+    :param: window: Window name or tuple, as accepted by scipy.signal.get_window
+    :param: size: Window length
+    """
+    win = signal.get_window(window, size).astype(np.float32)
+    win.setflags(write=False)
+    return win, 1.0 / float(np.sum(win, dtype=np.float64)) ** 2
+
+
+class SpectrumEngine:
+    def __init__(self, workers=FFT_WORKERS):
+        self.workers = workers
+        self.buffer = None
+        self.windowed_buffer = None
+        self.power_buffer = None
+        self.hold = None
+
+    def get_buffer(self, rows, size, fill_value):
+        """
+        Returns the preallocated (rows, size) spectrum buffer filled with fill_value.
+        The buffer is reused in the next call, the caller must not keep a reference to it across frames.
+        """
+        if self.buffer is None or self.buffer.shape != (rows, size):
+            self.buffer = np.empty((rows, size), dtype=np.float32)
+        self.buffer.fill(fill_value)
+        return self.buffer
+
+    def welch(self, x, nperseg, noverlap, window, out):
+        """
+        Averaged power spectrum of each row of x [dB], written into out
+
+        Parameters:
+        -----------
+        :param: x: Complex samples, shape: (..., samples)
+        :param: nperseg: Segment and FFT length
+        :param: noverlap: Number of overlapping samples between the segments
+        :param: out: Output rows, shape: (..., nperseg)
+        """
+        x = np.asarray(x)
+        if x.shape[-1] < nperseg:
+            # Too short for a single segment, it is zero padded (same as scipy.signal.welch)
+            return self.periodogram(x, nperseg, window, out)
+
+        step = nperseg - noverlap
+        if noverlap == 0:
+            segment_number = x.shape[-1] // nperseg
+            segments = x[..., : segment_number * nperseg].reshape(x.shape[:-1] + (segment_number, nperseg))
+        else:
+            segments = np.lib.stride_tricks.sliding_window_view(x, nperseg, axis=-1)[..., ::step, :]
+
+        win, scale = get_spectrum_window(window, nperseg)
+        power = self.power_spectrum(segments, win, nperseg)
+        self.to_db(np.mean(power, axis=-2), scale, out)
+        return out
+
+    def periodogram(self, x, nfft, window, out):
+        """
+        Power spectrum of each row of x [dB] from its first nfft samples (zero padded if shorter), written into out
+
+        Parameters:
+        -----------
+        :param: x: Complex samples, shape: (..., samples)
+        :param: nfft: FFT length
+        :param: out: Output rows, shape: (..., nfft)
+        """
+        x = np.asarray(x)[..., :nfft]
+        win, scale = get_spectrum_window(window, x.shape[-1])
+        power = self.power_spectrum(x, win, nfft)
+        self.to_db(power, scale, out)
+        return out
+
+    def power_spectrum(self, x, win, nfft):
+        """
+        |FFT(x * win)|^2 along the last axis, calculated with a single (multi-threaded) FFT call
+        """
+        if self.windowed_buffer is None or self.windowed_buffer.shape != x.shape:
+            self.windowed_buffer = np.empty(x.shape, dtype=np.complex64)
+        np.multiply(x, win, out=self.windowed_buffer)
+        spectrum = fft.fft(self.windowed_buffer, n=nfft, axis=-1, workers=self.workers)
+
+        if self.power_buffer is None or self.power_buffer.shape != spectrum.shape:
+            self.power_buffer = np.empty(spectrum.shape, dtype=np.float32)
+        np.multiply(spectrum.real, spectrum.real, out=self.power_buffer)
+        self.power_buffer += spectrum.imag**2
+        return self.power_buffer
+
+    @staticmethod
+    def to_db(power, scale, out):
+        """
+        Writes 10 * log10(power * scale) into out, fftshift-ed along the last axis
+        """
+        size = power.shape[-1]
+        half = size // 2
+        out[..., :half] = power[..., size - half :]
+        out[..., half:] = power[..., : size - half]
+        out *= scale
+        np.log10(out, out=out)
+        out *= 10
+
+    def update_hold(self, spectrum, mode=HOLD_MODE_PEAK, average_factor=DEFAULT_AVERAGE_HOLD_FACTOR):
+        """
+        Updates the hold spectrum in place with a new spectrum and returns it
+
+        Parameters:
+        -----------
+        :param: spectrum: New spectrum [dB]
+        :param: mode: HOLD_MODE_PEAK (max hold) or HOLD_MODE_AVERAGE (exponential average)
+        """
+        if self.hold is None or self.hold.shape != spectrum.shape:
+            self.hold = spectrum.astype(np.float32)
+        elif mode == HOLD_MODE_PEAK:
+            np.maximum(self.hold, spectrum, out=self.hold)
+        else:
+            self.hold += average_factor * (spectrum - self.hold)
+        return self.hold
+
+    def reset_hold(self):
+        self.hold = None
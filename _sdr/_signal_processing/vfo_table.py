@@ -0,0 +1,139 @@
+# KrakenSDR Signal Processor - VFO table
+#
+# Copyright (C) 2018-2021  Carl Laufer, Tamás Pető
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#
+# - coding: utf-8 -*-
+
+# Configuration and runtime state of the VFOs as a struct of arrays: every field is a NumPy array (column) indexed
+# by the VFO. The number of VFOs is only limited by the table size, which can be changed at runtime (resize).
+#
+# The "Default" demodulation and IQ recording settings are resolved against the global defaults once per frame
+# (resolve_defaults), the results are kept in the demod_modes and iq_enabled columns.
+
+import time
+
+import numpy as np
+
+DEFAULT_MAX_VFOS = 16
+DEFAULT_VFO_BW = 12500  # [Hz]
+DEFAULT_VFO_SQUELCH = -120  # [dB]
+DEFAULT_VFO_FIR_ORDER_FACTOR = int(2)
+
+# Column name: (dtype, default value)
+VFO_COLUMNS = {
+    # Configuration
+    "freq": (np.float64, 0.0),
+    "bw": (np.int64, DEFAULT_VFO_BW),
+    "fir_order_factor": (np.int64, DEFAULT_VFO_FIR_ORDER_FACTOR),
+    "squelch_mode": (object, "Default"),
+    "squelch": (np.float64, DEFAULT_VFO_SQUELCH),
+    "demod": (object, "Default"),
+    "iq": (object, "Default"),
+    # Resolved "Default" settings
+    "demod_modes": (object, "None"),
+    "iq_enabled": (np.bool_, False),
+    # Runtime state
+    "time": (np.float64, 0.0),  # Time the squelch has been open for [s]
+    "blocked": (np.bool_, False),
+    "doa_max": (np.float64, -1),
+    "last_write_time": (np.float64, 0.0),
+}
+
+
+class VFOTable:
+    def __init__(self, size=DEFAULT_MAX_VFOS, default_freq=0.0):
+        """
+        Parameters:
+        -----------
+        :param: size: Number of VFOs
+        :param: default_freq: Frequency of the VFOs [Hz] until they are configured
+        """
+        self.size = 0
+        for name, (dtype, _) in VFO_COLUMNS.items():
+            setattr(self, name, np.empty(0, dtype=dtype))
+        # Samples collected for recording, the arrays are appended to, so they are kept in lists
+        self.demod_channel = []
+        self.theta_channel = []
+        self.iq_channel = []
+        self.resize(size, default_freq)
+
+    def __len__(self):
+        return self.size
+
+    def resize(self, size, default_freq=None):
+        """
+        Changes the number of VFOs, the fields of the remaining VFOs are kept
+
+        Parameters:
+        -----------
+        :param: size: New number of VFOs
+        :param: default_freq: Frequency of the new VFOs [Hz], defaults to the frequency of the first VFO
+        """
+        size = max(int(size), 1)
+        if default_freq is None:
+            default_freq = self.freq[0] if self.size else 0.0
+        kept = min(self.size, size)
+        for name, (dtype, default_value) in VFO_COLUMNS.items():
+            column = np.full(size, default_freq if name == "freq" else default_value, dtype=dtype)
+            column[:kept] = getattr(self, name)[:kept]
+            setattr(self, name, column)
+        self.last_write_time[kept:] = time.time()
+
+        for name in ("demod_channel", "theta_channel", "iq_channel"):
+            del getattr(self, name)[size:]
+        for _ in range(kept, size):
+            self.demod_channel.append(np.array([]))
+            self.theta_channel.append([])
+            self.iq_channel.append(np.array([]))
+        self.size = size
+
+    def set_column(self, name, values):
+        """
+        Overwrites a column with a sequence of values, values beyond the table size are ignored
+        """
+        column = getattr(self, name)
+        count = min(len(values), self.size)
+        column[:count] = list(values)[:count]
+
+    def resolve_defaults(self, default_demod, default_iq):
+        """
+        Resolves the "Default" demodulation and IQ recording settings of the VFOs
+
+        Parameters:
+        -----------
+        :param: default_demod: Demodulation of the VFOs set to "Default"
+        :param: default_iq: IQ recording ("True" or "False") of the VFOs set to "Default"
+        """
+        self.demod_modes[:] = np.where(self.demod == "Default", default_demod, self.demod)
+        self.iq_enabled[:] = np.where(self.iq == "Default", default_iq == "True", self.iq == "True")
+
+    def reset_recording(self, i):
+        """Drops the samples collected for recording of the i-th VFO"""
+        self.demod_channel[i] = np.array([])
+        self.theta_channel[i] = []
+        self.iq_channel[i] = np.array([])
+
+
+def vfo_column_property(name):
+    """
+    Exposes a column of the VFO table (self.vfos) as an attribute, e.g. vfo_bw = vfo_column_property("bw").
+    Assigning a sequence to the attribute overwrites the column.
+    """
+    return property(
+        lambda self: getattr(self.vfos, name),
+        lambda self, values: self.vfos.set_column(name, values),
+    )
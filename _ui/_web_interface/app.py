@@ -18,19 +18,20 @@
 #
 # - coding: utf-8 -*-
 
-# isort: off
-from maindash import app
+# The DSP process mode spawns a new interpreter that imports this module again, so nothing may run on import
+if __name__ == "__main__":
+    # isort: off
+    from maindash import app
 
-# isort: on
+    # isort: on
 
-from views import main
+    from views import main
 
-app.layout = main.layout
+    app.layout = main.layout
 
-# It is workaround for splitting callbacks in separate files (run callbacks after layout)
-from callbacks import display_page, main, update_daq_params  # noqa: F401
+    # It is workaround for splitting callbacks in separate files (run callbacks after layout)
+    from callbacks import display_page, main, update_daq_params  # noqa: F401
 
-if __name__ == "__main__":
     # Debug mode does not work when the data interface is set to shared-memory
     # "shmem"!
     app.run_server(debug=False, host="0.0.0.0", port=8080)
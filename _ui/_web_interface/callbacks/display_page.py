@@ -6,8 +6,7 @@ from maindash import app, web_interface
 from dash_devices.dependencies import Input, Output
 from kraken_web_config import generate_config_page_layout
 from kraken_web_doa import plot_doa
-from variables import doa_fig
-from views import generate_doa_page, spectrum_page
+from kraken_web_figures import doa_fig
 
 
 @app.callback(
@@ -33,10 +32,15 @@ def display_page(pathname):
         web_interface.module_signal_processor.en_spectrum = False
         return [generate_config_page_layout(web_interface), "header_active", "header_inactive", "header_inactive"]
     elif pathname == "/spectrum":
+        # Page views are loaded when the page is first opened, not at start up
+        from views import spectrum_page
+
         web_interface.module_signal_processor.en_spectrum = True
         web_interface.reset_spectrum_graph_flag = True
         return [spectrum_page.layout, "header_inactive", "header_active", "header_inactive"]
     elif pathname == "/doa":
+        from views import generate_doa_page
+
         web_interface.module_signal_processor.en_spectrum = False
         web_interface.reset_doa_graph_flag = True
         plot_doa(app, web_interface, doa_fig)
@@ -11,33 +11,25 @@ from maindash import app, spectrum_fig, waterfall_fig, web_interface
 
 # isort: on
 
+from daq_reconfig import DAQReconfiguration
 from dash_devices.dependencies import Input, Output, State
-from kraken_sdr_receiver import ReceiverRTLSDR
-from kraken_sdr_signal_processor import SignalProcessor, xi
+from data_pump import UIDataPump
+from kraken_sdr_signal_processor import xi
 from kraken_web_config import write_config_file_dict
+from kraken_web_figures import fig_layout, trace_colors
 from kraken_web_spectrum import init_spectrum_fig
 from utils import (
-    fetch_dsp_data,
-    fetch_gps_data,
     is_float,
     is_int,
     read_config_file_dict,
     set_clicked,
-    settings_change_watcher,
 )
 from variables import (
     DECORRELATION_OPTIONS,
     DOA_METHODS,
     current_path,
     daq_config_filename,
-    daq_start_filename,
-    daq_stop_filename,
-    daq_subsystem_path,
     dsp_settings,
-    fig_layout,
-    root_path,
-    settings_file_path,
-    trace_colors,
 )
 
 
@@ -46,12 +38,10 @@ from variables import (
 # ============================================
 @app.callback_connect
 def func(client, connect):
-    if connect and len(app.clients) == 1:
-        fetch_dsp_data(app, web_interface, spectrum_fig, waterfall_fig)
-        fetch_gps_data(app, web_interface)
-    elif not connect and len(app.clients) == 0:
-        web_interface.dsp_timer.cancel()
-        web_interface.gps_timer.cancel()
+    # The data pump keeps running when the last client disconnects, it only stops pushing updates
+    if connect and web_interface.data_pump is None:
+        web_interface.data_pump = UIDataPump(app, web_interface, spectrum_fig, waterfall_fig)
+        web_interface.data_pump.start()
 
 
 @app.callback_shared(
@@ -1049,6 +1039,10 @@ def reconfig_daq_chain(input_value, freq, gain):
         # [no_update, no_update, no_update, no_update]
         return Output("dummy_output", "children", "")
 
+    if web_interface.daq_restart:
+        web_interface.logger.warning("The DAQ subsystem is already being reconfigured")
+        return Output("dummy_output", "children", "")
+
     # TODO: Check data interface mode here !
     #    Update DAQ Subsystem config file
     config_res, config_err = write_config_file_dict(web_interface, web_interface.daq_ini_cfg_dict, dsp_settings)
@@ -1058,135 +1052,24 @@ def reconfig_daq_chain(input_value, freq, gain):
     else:
         web_interface.logger.info("DAQ Subsystem configuration file edited")
 
+    num_ch = web_interface.daq_ini_cfg_dict["num_ch"]
+    previous_num_ch = web_interface.module_receiver.M
+
+    def on_reconfig_done(daq_reconfig):
+        if daq_reconfig.error is None and num_ch != previous_num_ch:
+            # Reinit the spectrum fig, because the number of traces depends on the number of channels
+            global spectrum_fig
+            spectrum_fig = init_spectrum_fig(web_interface, fig_layout, trace_colors)
+        web_interface.daq_cfg_ini_error = "" if daq_reconfig.error is None else daq_reconfig.error
+        web_interface.daq_restart = 0
+
+    # The restart takes a while (DAQ calibration), it runs in the background, the status card shows its progress.
+    # The reconfiguration is in place before the flag is raised, the data pump reads its status as soon as it is set,
+    # and the flag is raised before the start, as a failing reconfiguration clears it right away.
+    web_interface.daq_reconfig = DAQReconfiguration(web_interface, num_ch, on_reconfig_done)
     web_interface.daq_restart = 1
-    #    Restart DAQ Subsystem
-
-    # Stop settings file watcher
-    web_interface.settings_change_timer.cancel()
-
-    # Stop signal processing
-    web_interface.stop_processing()
-    web_interface.logger.debug("Signal processing stopped")
-
-    # time.sleep(2)
-
-    # Close control and IQ data interfaces
-    web_interface.close_data_interfaces()
-    web_interface.logger.debug("Data interfaces are closed")
-
-    os.chdir(daq_subsystem_path)
-    # Kill DAQ subsystem
-    # , stdout=subprocess.DEVNULL)
-    daq_stop_script = subprocess.Popen(["bash", daq_stop_filename])
-    daq_stop_script.wait()
-    web_interface.logger.debug("DAQ Subsystem halted")
-
-    # Start DAQ subsystem
-    # , stdout=subprocess.DEVNULL)
-    daq_start_script = subprocess.Popen(["bash", daq_start_filename])
-    daq_start_script.wait()
-    web_interface.logger.debug("DAQ Subsystem restarted")
-
-    # time.sleep(3)
-
-    os.chdir(root_path)
-
-    # TODO: Try this reinit method again, if it works it would save us needing
-    # to restore variable states
-
-    # Reinitialize receiver data interface
-    # if web_interface.module_receiver.init_data_iface() == -1:
-    #    web_interface.logger.critical("Failed to restart the DAQ data interface")
-    #    web_interface.daq_cfg_ini_error = "Failed to restart the DAQ data interface"
-    # return Output('dummy_output', 'children', '') #[no_update, no_update,
-    # no_update, no_update]
-
-    # return [-1]
-
-    # Reset channel number count
-    # web_interface.module_receiver.M = web_interface.daq_ini_cfg_params[1]
-
-    # web_interface.module_receiver.M = 0
-    # web_interface.module_signal_processor.first_frame = 1
-
-    # web_interface.module_receiver.eth_connect()
-    # time.sleep(2)
-    # web_interface.config_daq_rf(web_interface.daq_center_freq, web_interface.module_receiver.daq_rx_gain)
-
-    # Recreate and reinit the receiver and signal processor modules from
-    # scratch, keeping current setting values
-    daq_center_freq = web_interface.module_receiver.daq_center_freq
-    daq_rx_gain = web_interface.module_receiver.daq_rx_gain
-    rec_ip_addr = web_interface.module_receiver.rec_ip_addr
-
-    DOA_ant_alignment = web_interface.module_signal_processor.DOA_ant_alignment
-    DOA_inter_elem_space = web_interface.module_signal_processor.DOA_inter_elem_space
-    en_DOA_estimation = web_interface.module_signal_processor.en_DOA_estimation
-    doa_decorrelation_method = web_interface.module_signal_processor.DOA_decorrelation_method
-    ula_direction = web_interface.module_signal_processor.ula_direction
-
-    doa_format = web_interface.module_signal_processor.DOA_data_format
-    doa_station_id = web_interface.module_signal_processor.station_id
-    doa_lat = web_interface.module_signal_processor.latitude
-    doa_lon = web_interface.module_signal_processor.longitude
-    doa_fixed_heading = web_interface.module_signal_processor.fixed_heading
-    doa_heading = web_interface.module_signal_processor.heading
-    # alt
-    # speed
-    doa_hasgps = web_interface.module_signal_processor.hasgps
-    doa_usegps = web_interface.module_signal_processor.usegps
-    doa_gps_connected = web_interface.module_signal_processor.gps_connected
-    logging_level = web_interface.logging_level
-    data_interface = web_interface.data_interface
-
-    web_interface.module_receiver = ReceiverRTLSDR(
-        data_que=web_interface.rx_data_que, data_interface=data_interface, logging_level=logging_level
-    )
-    web_interface.module_receiver.daq_center_freq = daq_center_freq
-    # settings.uniform_gain #daq_rx_gain
-    web_interface.module_receiver.daq_rx_gain = daq_rx_gain
-    web_interface.module_receiver.rec_ip_addr = rec_ip_addr
-
-    web_interface.module_signal_processor = SignalProcessor(
-        data_que=web_interface.sp_data_que,
-        module_receiver=web_interface.module_receiver,
-        logging_level=logging_level,
-    )
-    web_interface.module_signal_processor.DOA_ant_alignment = DOA_ant_alignment
-    web_interface.module_signal_processor.DOA_inter_elem_space = DOA_inter_elem_space
-    web_interface.module_signal_processor.en_DOA_estimation = en_DOA_estimation
-    web_interface.module_signal_processor.DOA_decorrelation_method = doa_decorrelation_method
-    web_interface.module_signal_processor.ula_direction = ula_direction
-
-    web_interface.module_signal_processor.DOA_data_format = doa_format
-    web_interface.module_signal_processor.station_id = doa_station_id
-    web_interface.module_signal_processor.latitude = doa_lat
-    web_interface.module_signal_processor.longitude = doa_lon
-    web_interface.module_signal_processor.fixed_heading = doa_fixed_heading
-    web_interface.module_signal_processor.heading = doa_heading
-    web_interface.module_signal_processor.hasgps = doa_hasgps
-    web_interface.module_signal_processor.usegps = doa_usegps
-    web_interface.module_signal_processor.gps_connected = doa_gps_connected
-
-    # This must be here, otherwise the gains dont reinit properly?
-    web_interface.module_receiver.M = web_interface.daq_ini_cfg_dict["num_ch"]
-    print("M: " + str(web_interface.module_receiver.M))
-
-    web_interface.module_signal_processor.start()
-
-    settings_change_watcher(web_interface, settings_file_path)
-
-    # Reinit the spectrum fig, because number of traces may have changed if
-    # tuner count is different
-    global spectrum_fig
-    spectrum_fig = init_spectrum_fig(web_interface, fig_layout, trace_colors)
-
-    # Restart signal processing
-    web_interface.start_processing()
-    web_interface.logger.debug("Signal processing started")
-    web_interface.daq_restart = 0
+    web_interface.daq_reconfig.start()
 
-    web_interface.daq_cfg_ini_error = ""
     # web_interface.tmp_daq_ini_cfg
     web_interface.active_daq_ini_cfg = web_interface.daq_ini_cfg_dict["config_name"]
 
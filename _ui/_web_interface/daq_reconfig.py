@@ -0,0 +1,103 @@
+import subprocess
+import threading
+import time
+
+from variables import daq_start_filename, daq_stop_filename, daq_subsystem_path
+
+# Waiting for the first data frame, the DAQ runs its calibration after the restart
+FIRST_DATA_FRAME_TIMEOUT = 120  # [s]
+
+DAQ_RECONFIG_STAGES = (
+    "Stopping processing",
+    "Stopping DAQ",
+    "Starting DAQ",
+    "Reattaching",
+    "Waiting for data",
+)
+
+
+class DAQReconfiguration(threading.Thread):
+    """
+    Restarts the DAQ subsystem with the new configuration file in the background.
+
+    The receiver and the signal processor are kept, only their data interfaces are reopened, so the settings and the
+    warm caches (filters, steering vectors, compiled kernels) survive the restart. The downtime is measured from
+    stopping the processing to the first data frame received after the restart.
+    """
+
+    def __init__(self, web_interface, num_ch, on_done=None):
+        """
+        Parameters:
+        -----------
+        :param: web_interface: Web interface object holding the DSP modules
+        :param: num_ch: Number of channels of the new DAQ configuration
+        :param: on_done: Called with this object when the reconfiguration has finished (also on failure)
+        """
+        super(DAQReconfiguration, self).__init__(name="daq_reconfig", daemon=True)
+        self.web_interface = web_interface
+        self.num_ch = num_ch
+        self.on_done = on_done
+        self.stage_index = -1
+        self.start_time = None
+        self.downtime = None
+        self.error = None
+        self.first_data_frame = threading.Event()
+
+    @property
+    def stage(self):
+        return DAQ_RECONFIG_STAGES[self.stage_index] if self.stage_index >= 0 else ""
+
+    def get_status_text(self):
+        if self.error is not None:
+            return f"Restart failed: {self.error}"
+        if self.stage_index < 0:
+            # Not started yet
+            return "Restarting.."
+        if self.downtime is None:
+            return f"Restarting.. ({self.stage_index + 1}/{len(DAQ_RECONFIG_STAGES)} {self.stage})"
+        return f"Restarted, downtime: {self.downtime:.1f} s"
+
+    def frame_received(self, iq_header):
+        """
+        Called with the header of every frame the web interface receives
+        """
+        if self.stage_index == len(DAQ_RECONFIG_STAGES) - 1 and iq_header.frame_type == iq_header.FRAME_TYPE_DATA:
+            self.first_data_frame.set()
+
+    def next_stage(self):
+        self.stage_index += 1
+        self.web_interface.logger.info(f"DAQ reconfiguration: {self.stage}")
+
+    def run_daq_script(self, script_filename):
+        # The working directory of the web interface is left unchanged, the callbacks rely on it
+        subprocess.run(["bash", script_filename], cwd=daq_subsystem_path, check=True)
+
+    def run(self):
+        web_interface = self.web_interface
+        self.start_time = time.time()
+        try:
+            self.next_stage()
+            web_interface.stop_processing()
+            web_interface.close_data_interfaces()
+
+            self.next_stage()
+            self.run_daq_script(daq_stop_filename)
+
+            self.next_stage()
+            self.run_daq_script(daq_start_filename)
+
+            self.next_stage()
+            web_interface.reattach_data_interfaces(self.num_ch)
+            web_interface.start_processing()
+
+            self.next_stage()
+            if not self.first_data_frame.wait(FIRST_DATA_FRAME_TIMEOUT):
+                raise TimeoutError("no data frame received from the DAQ")
+            self.downtime = time.time() - self.start_time
+            web_interface.logger.info(f"DAQ reconfigured, downtime: {self.downtime:.2f} s")
+        except Exception as e:
+            self.error = str(e)
+            web_interface.logger.error(f"DAQ reconfiguration failed at {self.stage}: {e}")
+        finally:
+            if self.on_done is not None:
+                self.on_done(self)
@@ -0,0 +1,259 @@
+import queue
+import threading
+import time
+
+from iq_header import IQHeader
+from kraken_web_doa import plot_doa
+from kraken_web_figures import doa_fig
+from kraken_web_spectrum import plot_spectrum
+from result_bus import DoAResult, FrameStatus, SignalLevel, SpectrumResult, VFOStatus
+from utils import update_daq_status
+from variables import HZ_TO_MHZ
+
+# Longest wait for a signal processor result, the receiver messages are checked at least this often
+DATA_PUMP_WAIT_TIMEOUT = 0.1  # [s]
+GPS_UPDATE_INTERVAL = 1.0  # [s]
+# Minimum time between two pushes of the VFO inputs updated by the signal processor (auto VFOs)
+VFO_PUSH_INTERVAL = 0.2  # [s]
+
+# Page updates reported by the message handlers
+UPDATE_DAQ_STATUS = "daq_status"
+UPDATE_SPECTRUM = "spectrum"
+UPDATE_DOA = "doa"
+
+# Page: (update shown on the page, minimum time between two pushes to the page [s])
+PAGE_UPDATES = {
+    "/": (UPDATE_DAQ_STATUS, 0.2),
+    "/init": (UPDATE_DAQ_STATUS, 0.2),
+    "/config": (UPDATE_DAQ_STATUS, 0.2),
+    "/spectrum": (UPDATE_SPECTRUM, 0.05),
+    "/doa": (UPDATE_DOA, 0.05),
+}
+
+FRAME_TYPE_NAMES = {
+    IQHeader.FRAME_TYPE_DATA: "Data",
+    IQHeader.FRAME_TYPE_DUMMY: "Dummy",
+    IQHeader.FRAME_TYPE_CAL: "Calibration",
+    IQHeader.FRAME_TYPE_TRIGW: "Trigger wait",
+    IQHeader.FRAME_TYPE_EMPTY: "Empty",
+}
+
+
+class UIDataPump(threading.Thread):
+    """
+    Long-lived consumer of the receiver que and the result bus subscription of the signal processor, started with
+    the first client connection.
+
+    The result messages are dispatched to the handlers by type, the receiver messages by name. The handlers only
+    update the state of the web interface and report the page update they require, the page shown is redrawn from
+    the newest state at most once per its push interval. The ques are consumed while no client is connected too,
+    so the modules never block on a full que, but nothing is pushed.
+    """
+
+    def __init__(self, app, web_interface, spectrum_fig, waterfall_fig):
+        """
+        Parameters:
+        -----------
+        :param: app: Dash application, the updates are pushed to its clients
+        :param: web_interface: Web interface object holding the ques and the displayed state
+        :param: spectrum_fig: Spectrum figure of the spectrum page
+        :param: waterfall_fig: Waterfall figure of the spectrum page
+        """
+        super(UIDataPump, self).__init__(name="ui_data_pump", daemon=True)
+        self.app = app
+        self.web_interface = web_interface
+        self.spectrum_fig = spectrum_fig
+        self.waterfall_fig = waterfall_fig
+        self.stop_event = threading.Event()
+
+        self.pending_updates = set()
+        self.last_push_times = {}
+        self.next_page_push = 0.0
+        self.pending_vfo_mods = {}
+        self.next_vfo_push = 0.0
+        self.next_gps_update = 0.0
+
+        self.rx_handlers = {
+            "conn-ok": self.on_conn_ok,
+            "disconn-ok": self.on_disconn_ok,
+            "config-ok": self.on_config_ok,
+        }
+        self.result_handlers = {
+            FrameStatus: self.on_frame_status,
+            SignalLevel: self.on_signal_level,
+            SpectrumResult: self.on_spectrum_result,
+            DoAResult: self.on_doa_result,
+            VFOStatus: self.on_vfo_status,
+        }
+
+    def stop(self):
+        self.stop_event.set()
+
+    def run(self):
+        web_interface = self.web_interface
+        while not self.stop_event.is_set():
+            try:
+                try:
+                    self.handle_result(web_interface.sp_data_que.get(timeout=self.get_wait_timeout()))
+                except queue.Empty:
+                    pass
+                self.consume_receiver_que()
+                if web_interface.daq_restart:  # Set by the restarting script
+                    self.pending_updates.add(UPDATE_DAQ_STATUS)
+                self.push_updates()
+            except Exception as e:
+                # A failed update must not stop the pump, the next packet redraws the page
+                web_interface.logger.exception(f"UI data pump error: {e}")
+
+    def get_wait_timeout(self):
+        now = time.time()
+        deadline = min(now + DATA_PUMP_WAIT_TIMEOUT, self.next_gps_update)
+        if self.pending_updates:
+            deadline = min(deadline, self.next_page_push)
+        if self.pending_vfo_mods:
+            deadline = min(deadline, self.next_vfo_push)
+        return max(deadline - now, 0)
+
+    def consume_receiver_que(self):
+        while True:
+            try:
+                que_data_packet = self.web_interface.rx_data_que.get(False)
+            except queue.Empty:
+                return
+            for data_entry in que_data_packet:
+                handler = self.rx_handlers.get(data_entry[0])
+                if handler is None:
+                    self.web_interface.logger.warning("Unknown data entry: {:s}".format(data_entry[0]))
+                    continue
+                self.add_update(handler())
+
+    def handle_result(self, message):
+        handler = self.result_handlers.get(type(message))
+        if handler is None:
+            self.web_interface.logger.warning(f"Unknown result message: {type(message).__name__}")
+            return
+        self.add_update(handler(message))
+
+    def add_update(self, update):
+        if update is not None:
+            self.pending_updates.add(update)
+
+    def push_updates(self):
+        now = time.time()
+        if not self.app.clients:
+            self.pending_updates.clear()
+            self.pending_vfo_mods.clear()
+            return
+
+        if now >= self.next_gps_update:
+            self.next_gps_update = now + GPS_UPDATE_INTERVAL
+            self.push_gps_data()
+
+        if self.pending_vfo_mods and now >= self.next_vfo_push:
+            self.next_vfo_push = now + VFO_PUSH_INTERVAL
+            self.app.push_mods(self.pending_vfo_mods)
+            self.pending_vfo_mods = {}
+
+        pathname = self.web_interface.pathname
+        if pathname not in PAGE_UPDATES:
+            self.pending_updates.clear()
+            return
+        update, push_interval = PAGE_UPDATES[pathname]
+        # Updates of the other pages are dropped, the page is redrawn when it is opened
+        self.pending_updates &= {update}
+        if not self.pending_updates:
+            return
+        self.next_page_push = self.last_push_times.get(pathname, 0.0) + push_interval
+        if now < self.next_page_push:
+            return
+
+        self.pending_updates.clear()
+        self.last_push_times[pathname] = now
+        if update == UPDATE_DAQ_STATUS:
+            update_daq_status(self.app, self.web_interface)
+        elif update == UPDATE_SPECTRUM:
+            plot_spectrum(self.app, self.web_interface, self.spectrum_fig, self.waterfall_fig)
+        elif update == UPDATE_DOA:
+            plot_doa(self.app, self.web_interface, doa_fig)
+
+    def push_gps_data(self):
+        module_signal_processor = self.web_interface.module_signal_processor
+        self.app.push_mods(
+            {
+                "body_gps_latitude": {"children": module_signal_processor.latitude},
+                "body_gps_longitude": {"children": module_signal_processor.longitude},
+                "body_gps_heading": {"children": module_signal_processor.heading},
+            }
+        )
+
+    # Receiver messages
+
+    def on_conn_ok(self):
+        self.web_interface.daq_conn_status = 1
+        return UPDATE_DAQ_STATUS
+
+    def on_disconn_ok(self):
+        self.web_interface.daq_conn_status = 0
+        return UPDATE_DAQ_STATUS
+
+    def on_config_ok(self):
+        self.web_interface.daq_cfg_iface_status = 0
+        return UPDATE_DAQ_STATUS
+
+    # Signal processor messages
+
+    def on_frame_status(self, status):
+        web_interface = self.web_interface
+        iq_header = status.iq_header
+        web_interface.logger.debug("Iq header data fetched from signal processing que")
+        if web_interface.daq_reconfig is not None:
+            web_interface.daq_reconfig.frame_received(iq_header)
+        web_interface.daq_update_rate = status.update_rate
+        # Unpack header
+        web_interface.daq_frame_index = iq_header.cpi_index
+        web_interface.daq_frame_type = FRAME_TYPE_NAMES.get(iq_header.frame_type, "Unknown")
+        if iq_header.frame_type != iq_header.FRAME_TYPE_EMPTY:
+            web_interface.daq_frame_sync = iq_header.check_sync_word()
+            web_interface.daq_power_level = iq_header.adc_overdrive_flags
+            web_interface.daq_sample_delay_sync = iq_header.delay_sync_flag
+            web_interface.daq_iq_sync = iq_header.iq_sync_flag
+            web_interface.daq_noise_source_state = iq_header.noise_source_state
+
+            web_interface.daq_center_freq = iq_header.rf_center_freq / 10**6
+            web_interface.daq_adc_fs = iq_header.adc_sampling_freq / 10**6
+            web_interface.daq_fs = iq_header.sampling_freq / 10**6
+            web_interface.daq_cpi = (
+                int(iq_header.cpi_length * 10**3 / iq_header.sampling_freq) if iq_header.sampling_freq else 0
+            )
+            web_interface.daq_if_gains = ", ".join(
+                str(iq_header.if_gains[m] / 10) for m in range(iq_header.active_ant_chs)
+            )
+        web_interface.daq_dsp_latency = status.latency + web_interface.daq_cpi
+        return UPDATE_DAQ_STATUS
+
+    def on_signal_level(self, signal_level):
+        self.web_interface.max_amplitude = signal_level.max_amplitude
+
+    def on_spectrum_result(self, result):
+        self.web_interface.logger.debug("Spectrum data fetched from signal processing que")
+        self.web_interface.spectrum = result.spectrum
+        self.web_interface.zoom_spectra = result.zoom_spectra
+        return UPDATE_SPECTRUM
+
+    def on_doa_result(self, result):
+        # The DoA graph shows the result of the last VFO processed
+        web_interface = self.web_interface
+        web_interface.doa_thetas = result.thetas
+        web_interface.doa_results = [result.doa_result_log]
+        web_interface.doa_labels = ["DoA Result"]
+        web_interface.doas = [result.theta_0]
+        web_interface.doa_confidences = [result.confidence]
+        web_interface.logger.debug("DoA estimation data fetched from signal processing que")
+        return UPDATE_DOA
+
+    def on_vfo_status(self, status):
+        self.web_interface.squelch_update = status.squelch_update
+        self.web_interface.max_doas_list = status.doa_max
+        for i, (vfo_freq, vfo_bw) in enumerate(status.auto_vfos):
+            self.pending_vfo_mods[f"vfo_{i}_freq"] = {"value": vfo_freq * HZ_TO_MHZ}
+            self.pending_vfo_mods[f"vfo_{i}_bw"] = {"value": vfo_bw}
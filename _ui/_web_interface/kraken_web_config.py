@@ -3,15 +3,6 @@ from configparser import ConfigParser
 import dash_html_components as html
 import ini_checker
 from variables import daq_config_filename
-from views import daq_status_card, start_stop_card, tooltips
-from views.daq_config_card import get_daq_config_card_layout
-from views.display_options_card import get_display_options_card_layout
-from views.dsp_config_card import get_dsp_config_card_layout
-from views.recording_config_card import get_recording_config_card_layout
-from views.station_config_card import get_station_config_card_layout
-from views.system_control_card import get_system_control_card_layout
-from views.vfo_card import get_vfo_card_layout
-from views.vfo_config_card import get_vfo_config_card_layout
 
 
 def write_config_file_dict(web_interface, param_dict, dsp_settings):
@@ -69,6 +60,17 @@ def write_config_file_dict(web_interface, param_dict, dsp_settings):
 
 
 def generate_config_page_layout(web_interface):
+    # The config page views are loaded when the page is first opened, not at start up
+    from views import daq_status_card, start_stop_card, tooltips
+    from views.daq_config_card import get_daq_config_card_layout
+    from views.display_options_card import get_display_options_card_layout
+    from views.dsp_config_card import get_dsp_config_card_layout
+    from views.recording_config_card import get_recording_config_card_layout
+    from views.station_config_card import get_station_config_card_layout
+    from views.system_control_card import get_system_control_card_layout
+    from views.vfo_card import get_vfo_card_layout
+    from views.vfo_config_card import get_vfo_config_card_layout
+
     vfo_card = get_vfo_card_layout()
     config_page_component_list = [
         start_stop_card.layout,
@@ -0,0 +1,14 @@
+import plotly.express as px
+import plotly.graph_objects as go
+
+trace_colors = px.colors.qualitative.Plotly
+trace_colors[3] = "rgb(255,255,51)"
+
+fig_layout = go.Layout(
+    paper_bgcolor="rgba(0,0,0,0)",
+    plot_bgcolor="rgba(0,0,0,0)",
+    template="plotly_dark",
+    showlegend=True,
+    margin=go.layout.Margin(t=0),  # top margin
+)
+doa_fig = go.Figure(layout=fig_layout)
@@ -3,10 +3,9 @@ import logging
 import queue
 import time
 
-import numpy as np
-
 # isort: off
 from variables import (
+    daq_config_filename,
     settings_file_path,
     dsp_settings,
     DEFAULT_MAPPING_SERVER_ENDPOINT,
@@ -16,12 +15,21 @@ from variables import (
 
 # isort: on
 
-from dash_devices.dependencies import Input
+from control_api import CONTROL_API_DEFAULT_PORT
+from doa_serializer import DOA_SPECTRUM_TEXT
+from kraken_sdr_dsp_process import DSPProcess
 from kraken_sdr_receiver import ReceiverRTLSDR
+from kraken_sdr_settings import (
+    DEFAULT_CUSTOM_ARRAY_X_METERS,
+    DEFAULT_CUSTOM_ARRAY_Y_METERS,
+    configure_receiver,
+    configure_signal_processor,
+    parse_custom_array,
+)
 
 # Import built-in modules
-from kraken_sdr_signal_processor import SignalProcessor
-from utils import read_config_file_dict, settings_change_watcher
+from kraken_sdr_signal_processor import SPECTRUM_CONSUMER_SIGNAL_LEVEL, SignalProcessor
+from output_spool import SPOOL_MODE_LOG
 
 
 class WebInterface:
@@ -49,128 +57,68 @@ class WebInterface:
 
         self._doa_fig_type = dsp_settings.get("doa_fig_type", "Linear")
 
-        # Que to communicate with the signal processing module
-        self.sp_data_que = queue.Queue(1)
         # Que to communicate with the receiver modules
         self.rx_data_que = queue.Queue(1)
 
         self.data_interface = dsp_settings.get("data_interface", "shmem")
 
-        default_center_frequency_mhz = 416.588
+        # Run the receiver and the signal processor in a separate process, the modules instantiated here
+        # only hold the configuration
+        self.en_dsp_process = dsp_settings.get("en_dsp_process", False)
+
         # Instantiate and configure Kraken SDR modules
         self.module_receiver = ReceiverRTLSDR(
-            data_que=self.rx_data_que, data_interface=self.data_interface, logging_level=self.logging_level
-        )
-        self.module_receiver.daq_center_freq = (
-            float(dsp_settings.get("center_freq", default_center_frequency_mhz)) * 10**6
+            data_que=self.rx_data_que,
+            # The "eth" interface is only opened on connection, which never happens in the DSP process mode.
+            # The shared memory interface belongs to the DSP process.
+            data_interface=self.data_interface if not self.en_dsp_process else "eth",
+            logging_level=self.logging_level,
         )
-        self.module_receiver.daq_rx_gain = (
-            float(dsp_settings.get("uniform_gain", 15.7))
-            if dsp_settings.get("uniform_gain", 15.7) != "Auto"
-            else AUTO_GAIN_VALUE
-        )
-        self.module_receiver.rec_ip_addr = dsp_settings.get("default_ip", "0.0.0.0")
+        configure_receiver(self.module_receiver, dsp_settings)
 
         # Remote Control
         self.remote_control = dsp_settings.get("en_remote_control", False)
 
         self.module_signal_processor = SignalProcessor(
-            data_que=self.sp_data_que, module_receiver=self.module_receiver, logging_level=self.logging_level
+            module_receiver=self.module_receiver,
+            logging_level=self.logging_level,
+            config_only=self.en_dsp_process,
         )
-        self.module_signal_processor.DOA_ant_alignment = dsp_settings.get("ant_arrangement", "UCA")
-        self.module_signal_processor.doa_measure = self._doa_fig_type
-        self.ant_spacing_meters = float(dsp_settings.get("ant_spacing_meters", 0.21))
+        configure_signal_processor(self.module_signal_processor, dsp_settings, self.module_receiver.daq_center_freq)
+        # The DAQ status panel shows the max amplitude of the spectrum
+        self.module_signal_processor.add_spectrum_consumer(SPECTRUM_CONSUMER_SIGNAL_LEVEL)
 
-        if self.module_signal_processor.DOA_ant_alignment == "UCA":
-            self.module_signal_processor.DOA_UCA_radius_m = self.ant_spacing_meters
-            # Convert RADIUS to INTERELEMENT SPACING
-            inter_elem_spacing = (
-                np.sqrt(2)
-                * self.ant_spacing_meters
-                * np.sqrt(1 - np.cos(np.deg2rad(360 / self.module_signal_processor.channel_number)))
-            )
-            self.module_signal_processor.DOA_inter_elem_space = inter_elem_spacing / (
-                300 / float(dsp_settings.get("center_freq", 100.0))
-            )
-        else:
-            self.module_signal_processor.DOA_UCA_radius_m = np.Infinity
-            self.module_signal_processor.DOA_inter_elem_space = self.ant_spacing_meters / (
-                300 / float(dsp_settings.get("center_freq", 100.0))
-            )
-
-        self.module_signal_processor.ula_direction = dsp_settings.get("ula_direction", "Both")
-        self.module_signal_processor.DOA_algorithm = dsp_settings.get("doa_method", "MUSIC")
-        self.module_signal_processor.DOA_expected_num_of_sources = dsp_settings.get("expected_num_of_sources", 1)
-
-        self.custom_array_x_meters = np.float_(
-            dsp_settings.get("custom_array_x_meters", "0.21,0.06,-0.17,-0.17,0.07").split(",")
-        )
-        self.custom_array_y_meters = np.float_(
-            dsp_settings.get("custom_array_y_meters", "0.00,-0.20,-0.12,0.12,0.20").split(",")
-        )
-        self.module_signal_processor.custom_array_x = self.custom_array_x_meters / (
-            300 / float(dsp_settings.get("center_freq", 100.0))
+        # Array dimensions are kept in meters for the configuration page
+        self.ant_spacing_meters = float(dsp_settings.get("ant_spacing_meters", 0.21))
+        self.custom_array_x_meters = parse_custom_array(
+            dsp_settings.get("custom_array_x_meters", DEFAULT_CUSTOM_ARRAY_X_METERS)
         )
-        self.module_signal_processor.custom_array_y = self.custom_array_y_meters / (
-            300 / float(dsp_settings.get("center_freq", 100.0))
+        self.custom_array_y_meters = parse_custom_array(
+            dsp_settings.get("custom_array_y_meters", DEFAULT_CUSTOM_ARRAY_Y_METERS)
         )
-        self.module_signal_processor.array_offset = int(dsp_settings.get("array_offset", 0))
-
-        self.module_signal_processor.en_DOA_estimation = dsp_settings.get("en_doa", True)
-        self.module_signal_processor.DOA_decorrelation_method = dsp_settings.get("doa_decorrelation_method", "Off")
-
-        # Output Data format.
-        self.module_signal_processor.DOA_data_format = dsp_settings.get("doa_data_format", "Kraken App")
 
         # Station Information
-        self.module_signal_processor.station_id = dsp_settings.get("station_id", "NOCALL")
         self.location_source = dsp_settings.get("location_source", "None")
-        self.module_signal_processor.latitude = dsp_settings.get("latitude", 0.0)
-        self.module_signal_processor.longitude = dsp_settings.get("longitude", 0.0)
-        self.module_signal_processor.heading = dsp_settings.get("heading", 0.0)
-        self.module_signal_processor.fixed_heading = dsp_settings.get("gps_fixed_heading", False)
-        self.module_signal_processor.gps_min_speed_for_valid_heading = dsp_settings.get("gps_min_speed", 2)
-        self.module_signal_processor.gps_min_duration_for_valid_heading = dsp_settings.get("gps_min_speed_duration", 3)
-
-        # Kraken Pro Remote Key
-        self.module_signal_processor.krakenpro_key = dsp_settings.get("krakenpro_key", "0ae4ca6b3")
 
         # Mapping Server URL
         self.mapping_server_url = dsp_settings.get("mapping_server_url", DEFAULT_MAPPING_SERVER_ENDPOINT)
 
-        # VFO Configuration
-        self.module_signal_processor.spectrum_fig_type = dsp_settings.get("spectrum_calculation", "Single")
-        self.module_signal_processor.vfo_mode = dsp_settings.get("vfo_mode", "Standard")
-        self.module_signal_processor.vfo_default_squelch_mode = dsp_settings.get("vfo_default_squelch_mode", "Auto")
-        self.module_signal_processor.vfo_default_demod = dsp_settings.get("vfo_default_demod", "None")
-        self.module_signal_processor.vfo_default_iq = dsp_settings.get("vfo_default_iq", "False")
-        self.module_signal_processor.max_demod_timeout = int(dsp_settings.get("max_demod_timeout", 60))
-        self.module_signal_processor.dsp_decimation = int(dsp_settings.get("dsp_decimation", 1))
-        self.module_signal_processor.active_vfos = int(dsp_settings.get("active_vfos", 1))
-        self.module_signal_processor.output_vfo = int(dsp_settings.get("output_vfo", 0))
-        self.module_signal_processor.optimize_short_bursts = dsp_settings.get("en_optimize_short_bursts", False)
-        self.module_signal_processor.en_peak_hold = dsp_settings.get("en_peak_hold", False)
         self.selected_vfo = 0
-        self.module_signal_processor.vfo_default_squelch_mode = dsp_settings.get("vfo_default_squelch_mode", "Auto")
 
-        for i in range(self.module_signal_processor.max_vfos):
-            self.module_signal_processor.vfo_bw[i] = int(
-                dsp_settings.get("vfo_bw_" + str(i), self.module_signal_processor.vfo_bw[i])
-            )
-            self.module_signal_processor.vfo_fir_order_factor[i] = int(
-                dsp_settings.get("vfo_fir_order_factor_" + str(i), self.module_signal_processor.vfo_fir_order_factor[i])
-            )
-            self.module_signal_processor.vfo_freq[i] = float(
-                dsp_settings.get("vfo_freq_" + str(i), self.module_receiver.daq_center_freq)
-            )
-            self.module_signal_processor.vfo_squelch_mode[i] = dsp_settings.get("vfo_squelch_mode_" + str(i), "Default")
-            self.module_signal_processor.vfo_squelch[i] = int(
-                dsp_settings.get("vfo_squelch_" + str(i), self.module_signal_processor.vfo_squelch[i])
-            )
-            self.module_signal_processor.vfo_demod[i] = dsp_settings.get("vfo_demod_" + str(i), "Default")
-            self.module_signal_processor.vfo_iq[i] = dsp_settings.get("vfo_iq_" + str(i), "Default")
+        self.dsp_process = None
+        if self.en_dsp_process:
+            self.dsp_process = DSPProcess(self.module_signal_processor, daq_config_filename, self.logging_level)
+            self.sp_data_que = self.dsp_process.sp_data_que
+            self.rx_data_que = self.dsp_process.rx_data_que
+            self.dsp_process.start()
+        else:
+            # Results of the signal processing module
+            self.sp_data_que = self.module_signal_processor.result_bus.subscribe("web_interface")
+            self.module_signal_processor.start()
 
-        self.module_signal_processor.start()
+        # The DSP chain is running from this point, the UI dependencies (dash, plotly) are only loaded now
+        from dash_devices.dependencies import Input
+        from utils import read_config_file_dict, start_settings_watcher
 
         #############################################
         #       UI Status and Config variables      #
@@ -180,6 +128,7 @@ class WebInterface:
         self.daq_conn_status = 0
         self.daq_cfg_iface_status = 0  # 0- ready, 1-busy
         self.daq_restart = 0  # 1-restarting
+        self.daq_reconfig = None  # Last DAQ reconfiguration (daq_reconfig.py)
         self.daq_update_rate = 0
         self.daq_frame_sync = 1  # Active low
         self.daq_frame_index = 0
@@ -206,6 +155,7 @@ class WebInterface:
 
         # DSP Processing Parameters and Results
         self.spectrum = None
+        self.zoom_spectra = []  # High resolution spectrum around each VFO
         self.doa_thetas = None
         self.doa_results = []
         self.doa_labels = []
@@ -220,8 +170,8 @@ class WebInterface:
         self.squelch_update = []
         self.logger.info("Web interface object initialized")
 
-        self.dsp_timer = None
-        self.settings_change_timer = None
+        self.data_pump = None
+        self.settings_watcher = None
         self.update_time = 9999
 
         self.pathname = ""
@@ -268,7 +218,7 @@ class WebInterface:
             self.vfo_cfg_inputs.append(Input(component_id="vfo_" + str(i) + "_iq", component_property="value"))
 
         self.save_configuration()
-        settings_change_watcher(self, settings_file_path)
+        start_settings_watcher(self, settings_file_path)
 
     def save_configuration(self):
         data = {}
@@ -280,9 +230,13 @@ class WebInterface:
         )
         data["data_interface"] = dsp_settings.get("data_interface", "shmem")
         data["default_ip"] = dsp_settings.get("default_ip", "0.0.0.0")
+        data["en_dsp_process"] = self.en_dsp_process
 
         # Remote Control
         data["en_remote_control"] = self.remote_control
+        # The local control API is served by the headless runner
+        data["en_control_api"] = dsp_settings.get("en_control_api", False)
+        data["control_api_port"] = dsp_settings.get("control_api_port", CONTROL_API_DEFAULT_PORT)
 
         # DOA Estimation
         data["en_doa"] = self.module_signal_processor.en_DOA_estimation
@@ -323,6 +277,8 @@ class WebInterface:
         data["krakenpro_key"] = self.module_signal_processor.krakenpro_key
         data["mapping_server_url"] = self.mapping_server_url
         data["rdf_mapper_server"] = self.module_signal_processor.RDF_mapper_server
+        data["output_spool"] = self.module_signal_processor.output_spool_mode
+        data["doa_spectrum_encoding"] = self.module_signal_processor.doa_spectrum_encoding
         data["gps_fixed_heading"] = self.module_signal_processor.fixed_heading
         data["gps_min_speed"] = self.module_signal_processor.gps_min_speed_for_valid_heading
         data["gps_min_speed_duration"] = self.module_signal_processor.gps_min_duration_for_valid_heading
@@ -338,13 +294,19 @@ class WebInterface:
         data["active_vfos"] = self.module_signal_processor.active_vfos
         data["output_vfo"] = self.module_signal_processor.output_vfo
         data["en_optimize_short_bursts"] = self.module_signal_processor.optimize_short_bursts
+        data["overload_policy"] = self.module_signal_processor.overload_steps
+        data["en_scan"] = self.module_signal_processor.en_scan
+        data["scan_hops"] = self.module_signal_processor.scan_hops
+        data["scan_dwell_frames"] = self.module_signal_processor.scan_dwell_frames
+        data["max_vfos"] = self.module_signal_processor.max_vfos
 
+        # The VFO table holds NumPy values, they are converted for the JSON file
         for i in range(self.module_signal_processor.max_vfos):
-            data["vfo_bw_" + str(i)] = self.module_signal_processor.vfo_bw[i]
-            data["vfo_fir_order_factor_" + str(i)] = self.module_signal_processor.vfo_fir_order_factor[i]
-            data["vfo_freq_" + str(i)] = self.module_signal_processor.vfo_freq[i]
+            data["vfo_bw_" + str(i)] = int(self.module_signal_processor.vfo_bw[i])
+            data["vfo_fir_order_factor_" + str(i)] = int(self.module_signal_processor.vfo_fir_order_factor[i])
+            data["vfo_freq_" + str(i)] = float(self.module_signal_processor.vfo_freq[i])
             data["vfo_squelch_mode_" + str(i)] = self.module_signal_processor.vfo_squelch_mode[i]
-            data["vfo_squelch_" + str(i)] = self.module_signal_processor.vfo_squelch[i]
+            data["vfo_squelch_" + str(i)] = float(self.module_signal_processor.vfo_squelch[i])
             data["vfo_demod_" + str(i)] = self.module_signal_processor.vfo_demod[i]
             data["vfo_iq_" + str(i)] = self.module_signal_processor.vfo_iq[i]
 
@@ -361,9 +323,12 @@ class WebInterface:
         data["uniform_gain"] = 15.7
         data["data_interface"] = dsp_settings.get("data_interface", "shmem")
         data["default_ip"] = dsp_settings.get("default_ip", "0.0.0.0")
+        data["en_dsp_process"] = False
 
         # Remote Control
         data["en_remote_control"] = False
+        data["en_control_api"] = False
+        data["control_api_port"] = CONTROL_API_DEFAULT_PORT
 
         # DOA Estimation
         data["en_doa"] = True
@@ -404,6 +369,8 @@ class WebInterface:
         data["krakenpro_key"] = "cb97235a"
         data["mapping_server_url"] = "wss://map.krakenrf.com:2096"
         data["rdf_mapper_server"] = "http://MY_RDF_MAPPER_SERVER.com/save.php"
+        data["output_spool"] = SPOOL_MODE_LOG
+        data["doa_spectrum_encoding"] = DOA_SPECTRUM_TEXT
         data["gps_fixed_heading"] = False
         data["gps_min_speed"] = 2
         data["gps_min_speed_duration"] = 3
@@ -419,6 +386,11 @@ class WebInterface:
         data["active_vfos"] = 1
         data["output_vfo"] = 0
         data["en_optimize_short_bursts"] = False
+        data["overload_policy"] = []
+        data["en_scan"] = False
+        data["scan_hops"] = []
+        data["scan_dwell_frames"] = 10
+        data["max_vfos"] = 16
 
         for i in range(self.module_signal_processor.max_vfos):
             data["vfo_bw_" + str(i)] = 12500
@@ -450,12 +422,30 @@ class WebInterface:
 
     def stop_processing(self):
         self.module_signal_processor.run_processing = False
+        if self.dsp_process is not None:
+            self.dsp_process.stop_processing()
+            return
         while self.module_signal_processor.is_running:
             # Block until signal processor run_processing while loop ends
             time.sleep(0.01)
 
     def close_data_interfaces(self):
-        self.module_receiver.eth_close()
+        if self.dsp_process is not None:
+            self.dsp_process.close_data_interfaces()
+        else:
+            self.module_receiver.eth_close()
+
+    def reattach_data_interfaces(self, num_ch):
+        """
+        Reopens the data interfaces after the DAQ subsystem has been restarted, the DSP modules are kept
+        """
+        if self.dsp_process is not None:
+            self.module_receiver.M = num_ch
+            self.dsp_process.reattach_data_interfaces(num_ch)
+        else:
+            self.module_receiver.reattach_data_iface(num_ch)
+            # The channel number and the spectrum buffers are taken from the next frame
+            self.module_signal_processor.first_frame = 1
 
     def close(self):
         pass
@@ -465,9 +455,14 @@ class WebInterface:
         Configures the RF parameters in the DAQ module
         """
         self.daq_cfg_iface_status = 1
-        self.module_receiver.set_center_freq(int(f0 * 10**6))
+        if self.dsp_process is not None:
+            self.module_receiver.daq_center_freq = int(f0 * 10**6)
+            self.module_receiver.daq_rx_gain = gain
+            self.dsp_process.config_daq_rf(f0 * 10**6, gain)
+        else:
+            self.module_receiver.set_center_freq(int(f0 * 10**6))
 
-        self.module_receiver.set_if_gain(gain)
+            self.module_receiver.set_if_gain(gain)
 
         self.logger.info("Updating receiver parameters")
         self.logger.info("Center frequency: {:f} MHz".format(f0))
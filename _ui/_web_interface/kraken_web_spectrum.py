@@ -1,7 +1,8 @@
 import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
-from variables import figure_font_size, trace_colors, x, y
+from kraken_web_figures import trace_colors
+from variables import figure_font_size, x, y
 
 
 def init_spectrum_fig(web_interface, fig_layout, trace_colors):
@@ -54,6 +55,18 @@ def init_spectrum_fig(web_interface, fig_layout, trace_colors):
             visible=False,
         )
 
+    # High resolution (zoom) spectrum around the VFOs, placed after the VFO windows
+    zoom_scatter = go.Scattergl(
+        x=x,
+        y=y,
+        name="VFO0 Zoom",
+        line=dict(color="orange", width=1),
+        visible=False,
+    )
+    for i in range(web_interface.module_signal_processor.max_vfos):
+        zoom_scatter["name"] = "VFO" + str(i) + " Zoom"
+        spectrum_fig.add_trace(zoom_scatter)
+
     # Now add the angle display text
     # web_interface.module_signal_processor.active_vfos):
     for _ in range(web_interface.module_signal_processor.max_vfos):
@@ -192,6 +205,18 @@ def plot_spectrum(app, web_interface, spectrum_fig, waterfall_fig):
             spectrum_fig.data[m - 1]["x"] = x
             spectrum_fig.data[m - 1]["y"] = web_interface.spectrum[m, :]
 
+        # Zoom spectra are only calculated for the VFOs whose squelch is open
+        zoom_trace_offset = web_interface.module_receiver.M + 2 * web_interface.module_signal_processor.max_vfos
+        for i in range(web_interface.module_signal_processor.max_vfos):
+            zoom_trace = spectrum_fig.data[zoom_trace_offset + i]
+            zoom_spectrum = web_interface.zoom_spectra[i] if i < len(web_interface.zoom_spectra) else None
+            if zoom_spectrum is not None:
+                zoom_trace["x"] = zoom_spectrum[0, :] + web_interface.daq_center_freq * 10**6
+                zoom_trace["y"] = zoom_spectrum[1, :]
+                zoom_trace["visible"] = True
+            else:
+                zoom_trace["visible"] = False
+
         z = web_interface.spectrum[1, :]
         app.push_mods(
             {
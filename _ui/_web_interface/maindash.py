@@ -1,9 +1,16 @@
-import dash_devices as dash
+# isort: off
+# Start the DSP chain before dash and plotly are imported, so it does not wait for the UI dependencies
 from kraken_web_interface import WebInterface
+
+web_interface = WebInterface()
+
+import dash_devices as dash
+from kraken_web_figures import fig_layout, trace_colors
 from kraken_web_spectrum import init_spectrum_fig
-from variables import fig_layout, trace_colors
 from waterfall import init_waterfall
 
+# isort: on
+
 # app = dash.Dash(__name__, suppress_callback_exceptions=True,
 # compress=True, update_title="") # cannot use update_title with
 # dash_devices
@@ -15,11 +22,6 @@ app.config.suppress_callback_exceptions = True
 # app_log.setLevel(settings.logging_level*10)
 # app_log.setLevel(30) # TODO: Only during dev time
 
-#############################################
-#          Prepare Dash application         #
-############################################
-web_interface = WebInterface()
-
 #############################################
 #       Prepare component dependencies      #
 #############################################
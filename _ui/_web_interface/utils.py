@@ -1,17 +1,20 @@
 import copy
-import json
-import os
-import queue
 from configparser import ConfigParser
 from math import inf
-from threading import Timer
 
-import numpy as np
 import variables
 from dash_devices.dependencies import Output
-from kraken_sdr_signal_processor import DEFAULT_VFO_FIR_ORDER_FACTOR
-from kraken_web_doa import plot_doa
-from kraken_web_spectrum import plot_spectrum
+from kraken_sdr_settings import (
+    CONFIG_APPLY_TIMEOUT,
+    DEFAULT_CUSTOM_ARRAY_X_METERS,
+    DEFAULT_CUSTOM_ARRAY_Y_METERS,
+    RECEIVER_SETTINGS_KEYS,
+    configure_signal_processor,
+    get_center_freq_mhz,
+    get_uniform_gain,
+    parse_custom_array,
+)
+from settings_watcher import SettingsFileWatcher
 from variables import (
     AGC_WARNING_DISABLED_STYLE,
     AGC_WARNING_ENABLED_STYLE,
@@ -19,7 +22,6 @@ from variables import (
     DEFAULT_MAPPING_SERVER_ENDPOINT,
     HZ_TO_MHZ,
     daq_config_filename,
-    doa_fig,
 )
 
 RED_COLOR = {"color": "#e74c3c"}
@@ -88,333 +90,73 @@ def set_clicked(web_interface, clickData):
     return None
 
 
-def fetch_dsp_data(app, web_interface, spectrum_fig, waterfall_fig):
-    daq_status_update_flag = 0
-    spectrum_update_flag = 0
-    doa_update_flag = 0
-    # freq_update            = 0 #no_update
-    #############################################
-    #      Fetch new data from back-end ques    #
-    #############################################
-    try:
-        # Fetch new data from the receiver module
-        que_data_packet = web_interface.rx_data_que.get(False)
-        for data_entry in que_data_packet:
-            if data_entry[0] == "conn-ok":
-                web_interface.daq_conn_status = 1
-                daq_status_update_flag = 1
-            elif data_entry[0] == "disconn-ok":
-                web_interface.daq_conn_status = 0
-                daq_status_update_flag = 1
-            elif data_entry[0] == "config-ok":
-                web_interface.daq_cfg_iface_status = 0
-                daq_status_update_flag = 1
-    except queue.Empty:
-        # Handle empty queue here
-        web_interface.logger.debug("Receiver module que is empty")
-    else:
-        pass
-        # Handle task here and call q.task_done()
-    if web_interface.daq_restart:  # Set by the restarting script
-        daq_status_update_flag = 1
-    try:
-        # Fetch new data from the signal processing module
-        que_data_packet = web_interface.sp_data_que.get(False)
-        for data_entry in que_data_packet:
-            if data_entry[0] == "iq_header":
-                daq_status_update_flag = 1
-                web_interface.logger.debug("Iq header data fetched from signal processing que")
-                iq_header = data_entry[1]
-                # Unpack header
-                web_interface.daq_frame_index = iq_header.cpi_index
-                if iq_header.frame_type == iq_header.FRAME_TYPE_DATA:
-                    web_interface.daq_frame_type = "Data"
-                elif iq_header.frame_type == iq_header.FRAME_TYPE_DUMMY:
-                    web_interface.daq_frame_type = "Dummy"
-                elif iq_header.frame_type == iq_header.FRAME_TYPE_CAL:
-                    web_interface.daq_frame_type = "Calibration"
-                elif iq_header.frame_type == iq_header.FRAME_TYPE_TRIGW:
-                    web_interface.daq_frame_type = "Trigger wait"
-                elif iq_header.frame_type == iq_header.FRAME_TYPE_EMPTY:
-                    web_interface.daq_frame_type = "Empty"
-                    continue
-                else:
-                    web_interface.daq_frame_type = "Unknown"
-
-                web_interface.daq_frame_sync = iq_header.check_sync_word()
-                web_interface.daq_power_level = iq_header.adc_overdrive_flags
-                web_interface.daq_sample_delay_sync = iq_header.delay_sync_flag
-                web_interface.daq_iq_sync = iq_header.iq_sync_flag
-                web_interface.daq_noise_source_state = iq_header.noise_source_state
-
-                # if web_interface.daq_center_freq != iq_header.rf_center_freq/10**6:
-                #    freq_update = 1
-
-                web_interface.daq_center_freq = iq_header.rf_center_freq / 10**6
-                web_interface.daq_adc_fs = iq_header.adc_sampling_freq / 10**6
-                web_interface.daq_fs = iq_header.sampling_freq / 10**6
-                web_interface.daq_cpi = (
-                    int(iq_header.cpi_length * 10**3 / iq_header.sampling_freq) if iq_header.sampling_freq else 0
-                )
-                gain_list_str = ""
-
-                for m in range(iq_header.active_ant_chs):
-                    gain_list_str += str(iq_header.if_gains[m] / 10)
-                    gain_list_str += ", "
-
-                web_interface.daq_if_gains = gain_list_str[:-2]
-            elif data_entry[0] == "update_rate":
-                web_interface.daq_update_rate = data_entry[1]
-            elif data_entry[0] == "latency":
-                web_interface.daq_dsp_latency = data_entry[1] + web_interface.daq_cpi
-            elif data_entry[0] == "max_amplitude":
-                web_interface.max_amplitude = data_entry[1]
-            elif data_entry[0] == "avg_powers":
-                avg_powers_str = ""
-                for avg_power in data_entry[1]:
-                    avg_powers_str += "{:.1f}".format(avg_power)
-                    avg_powers_str += ", "
-                web_interface.avg_powers = avg_powers_str[:-2]
-            elif data_entry[0] == "spectrum":
-                web_interface.logger.debug("Spectrum data fetched from signal processing que")
-                spectrum_update_flag = 1
-                web_interface.spectrum = data_entry[1]
-            elif data_entry[0] == "doa_thetas":
-                web_interface.doa_thetas = data_entry[1]
-                doa_update_flag = 1
-                web_interface.doa_results = []
-                web_interface.doa_labels = []
-                web_interface.doas = []
-                web_interface.max_doas_list = []
-                web_interface.doa_confidences = []
-                web_interface.logger.debug("DoA estimation data fetched from signal processing que")
-            elif data_entry[0] == "DoA Result":
-                web_interface.doa_results.append(data_entry[1])
-                web_interface.doa_labels.append(data_entry[0])
-            elif data_entry[0] == "DoA Max":
-                web_interface.doas.append(data_entry[1])
-            elif data_entry[0] == "DoA Confidence":
-                web_interface.doa_confidences.append(data_entry[1])
-            elif data_entry[0] == "DoA Max List":
-                web_interface.max_doas_list = data_entry[1].copy()
-            elif data_entry[0] == "DoA Squelch":
-                web_interface.squelch_update = data_entry[1].copy()
-            elif data_entry[0] == "VFO-0 Frequency":
-                app.push_mods(
-                    {
-                        "vfo_0_freq": {"value": data_entry[1] * HZ_TO_MHZ},
-                    }
-                )
-            else:
-                web_interface.logger.warning("Unknown data entry: {:s}".format(data_entry[0]))
-    except queue.Empty:
-        # Handle empty queue here
-        web_interface.logger.debug("Signal processing que is empty")
-    else:
-        pass
-        # Handle task here and call q.task_done()
+def apply_settings_file(web_interface, dsp_settings, changed_keys):
+    """
+    Applies the settings file after it has been changed by the node middleware or by remote tools
 
-    if (
-        web_interface.pathname == "/config" or web_interface.pathname == "/" or web_interface.pathname == "/init"
-    ) and daq_status_update_flag:
-        update_daq_status(app, web_interface)
-    elif web_interface.pathname == "/spectrum" and spectrum_update_flag:
-        plot_spectrum(app, web_interface, spectrum_fig, waterfall_fig)
-    # or (web_interface.pathname == "/doa" and
-    # web_interface.reset_doa_graph_flag):
-    elif web_interface.pathname == "/doa" and doa_update_flag:
-        plot_doa(app, web_interface, doa_fig)
+    Parameters:
+    -----------
+    :param: dsp_settings: Content of the settings file
+    :param: changed_keys: Keys of the settings that have changed
+    """
+    variables.dsp_settings = dsp_settings
 
-    web_interface.dsp_timer = Timer(0.01, fetch_dsp_data, args=(app, web_interface, spectrum_fig, waterfall_fig))
-    web_interface.dsp_timer.start()
+    center_freq = get_center_freq_mhz(dsp_settings)
+    gain = get_uniform_gain(dsp_settings)
 
+    web_interface.en_system_control = [1] if dsp_settings.get("en_system_control", False) else []
+    web_interface.en_beta_features = [1] if dsp_settings.get("en_beta_features", False) else []
 
-def fetch_gps_data(app, web_interface):
-    app.push_mods(
-        {
-            "body_gps_latitude": {"children": web_interface.module_signal_processor.latitude},
-            "body_gps_longitude": {"children": web_interface.module_signal_processor.longitude},
-            "body_gps_heading": {"children": web_interface.module_signal_processor.heading},
-        }
+    configure_signal_processor(web_interface.module_signal_processor, dsp_settings)
+    # The VFOs are checked and the configuration may be saved below, both need the new settings applied
+    if not web_interface.module_signal_processor.wait_config_applied(CONFIG_APPLY_TIMEOUT):
+        web_interface.logger.warning("The signal processor has not applied the new settings yet")
+
+    web_interface.ant_spacing_meters = float(dsp_settings.get("ant_spacing_meters", 0.21))
+    web_interface.custom_array_x_meters = parse_custom_array(
+        dsp_settings.get("custom_array_x_meters", DEFAULT_CUSTOM_ARRAY_X_METERS)
+    )
+    web_interface.custom_array_y_meters = parse_custom_array(
+        dsp_settings.get("custom_array_y_meters", DEFAULT_CUSTOM_ARRAY_Y_METERS)
     )
 
-    web_interface.gps_timer = Timer(1, fetch_gps_data, args=(app, web_interface))
-    web_interface.gps_timer.start()
-
-
-def settings_change_watcher(web_interface, settings_file_path, last_attempt_failed=False):
-    if os.path.exists(settings_file_path):
-        last_changed_time = os.stat(settings_file_path).st_mtime
-        time_delta = last_changed_time - variables.dsp_settings["timestamp"]
-        if time_delta > 0:
-            # Load settings file
-            try:
-                with open(settings_file_path, "r", encoding="utf-8") as file:
-                    dsp_settings = json.load(file)
-                    if dsp_settings is None:
-                        raise RuntimeError("%s appears empty" % file)
-            except Exception as ex:
-                if not last_attempt_failed:
-                    web_interface.logger.error("Problem loading settings file: %s", ex)
-                last_attempt_failed = True
-            else:
-                variables.dsp_settings = dsp_settings
-                variables.dsp_settings["timestamp"] = last_changed_time
-                last_attempt_failed = False
-
-                center_freq = float(dsp_settings.get("center_freq", 100.0))
-                gain = (
-                    float(dsp_settings.get("uniform_gain", 1.4))
-                    if dsp_settings.get("uniform_gain", 1.4) != "Auto"
-                    else AUTO_GAIN_VALUE
-                )
-
-                web_interface.en_system_control = [1] if dsp_settings.get("en_system_control", False) else []
-                web_interface.en_beta_features = [1] if dsp_settings.get("en_beta_features", False) else []
-
-                web_interface.module_signal_processor.en_DOA_estimation = dsp_settings.get("en_doa", 0)
-                web_interface.module_signal_processor.DOA_decorrelation_method = dsp_settings.get(
-                    "doa_decorrelation_method", 0
-                )
-
-                web_interface.module_signal_processor.DOA_ant_alignment = dsp_settings.get("ant_arrangement", "ULA")
-                web_interface.ant_spacing_meters = float(dsp_settings.get("ant_spacing_meters", 0.5))
-
-                wavelength = 300 / web_interface.daq_center_freq
-                if web_interface.module_signal_processor.DOA_ant_alignment == "UCA":
-                    web_interface.module_signal_processor.DOA_UCA_radius_m = web_interface.ant_spacing_meters
-                    # Convert RADIUS to INTERELEMENT SPACING
-                    inter_elem_spacing = (
-                        np.sqrt(2)
-                        * web_interface.ant_spacing_meters
-                        * np.sqrt(1 - np.cos(np.deg2rad(360 / web_interface.module_signal_processor.channel_number)))
-                    )
-                    web_interface.module_signal_processor.DOA_inter_elem_space = inter_elem_spacing / wavelength
-                else:
-                    web_interface.module_signal_processor.DOA_UCA_radius_m = np.Infinity
-                    web_interface.module_signal_processor.DOA_inter_elem_space = (
-                        web_interface.ant_spacing_meters / wavelength
-                    )
-
-                web_interface.custom_array_x_meters = np.float_(
-                    dsp_settings.get("custom_array_x_meters", "0.1,0.2,0.3,0.4,0.5").split(",")
-                )
-                web_interface.custom_array_y_meters = np.float_(
-                    dsp_settings.get("custom_array_y_meters", "0.1,0.2,0.3,0.4,0.5").split(",")
-                )
-                web_interface.module_signal_processor.custom_array_x = web_interface.custom_array_x_meters / (
-                    300 / web_interface.module_receiver.daq_center_freq
-                )
-                web_interface.module_signal_processor.custom_array_y = web_interface.custom_array_y_meters / (
-                    300 / web_interface.module_receiver.daq_center_freq
-                )
-
-                # Station Information
-                web_interface.module_signal_processor.station_id = dsp_settings.get("station_id", "NO-CALL")
-                web_interface.location_source = dsp_settings.get("location_source", "None")
-                web_interface.module_signal_processor.latitude = dsp_settings.get("latitude", 0.0)
-                web_interface.module_signal_processor.longitude = dsp_settings.get("longitude", 0.0)
-                web_interface.module_signal_processor.heading = dsp_settings.get("heading", 0.0)
-                web_interface.module_signal_processor.krakenpro_key = dsp_settings.get("krakenpro_key", 0.0)
-                web_interface.mapping_server_url = dsp_settings.get(
-                    "mapping_server_url", DEFAULT_MAPPING_SERVER_ENDPOINT
-                )
-                web_interface.module_signal_processor.RDF_mapper_server = dsp_settings.get(
-                    "rdf_mapper_server", "http://RDF_MAPPER_SERVER.com/save.php"
-                )
-                web_interface.module_signal_processor.DOA_data_format = dsp_settings.get(
-                    "doa_data_format", "Kraken App"
-                )
-
-                # VFO Configuration
-                web_interface.module_signal_processor.spectrum_fig_type = dsp_settings.get(
-                    "spectrum_calculation", "Single"
-                )
-                web_interface.module_signal_processor.vfo_mode = dsp_settings.get("vfo_mode", "Standard")
-                web_interface.module_signal_processor.vfo_default_squelch_mode = dsp_settings.get(
-                    "vfo_default_squelch_mode", "Auto"
-                )
-                web_interface.module_signal_processor.vfo_default_demod = dsp_settings.get("vfo_default_demod", "None")
-                web_interface.module_signal_processor.vfo_default_iq = dsp_settings.get("vfo_default_iq", "False")
-                web_interface.module_signal_processor.max_demod_timeout = int(dsp_settings.get("max_demod_timeout", 60))
-                web_interface.module_signal_processor.dsp_decimation = int(dsp_settings.get("dsp_decimation", 0))
-                web_interface.module_signal_processor.active_vfos = int(dsp_settings.get("active_vfos", 0))
-                web_interface.module_signal_processor.output_vfo = int(dsp_settings.get("output_vfo", 0))
-                web_interface.compass_offset = dsp_settings.get("compass_offset", 0)
-                web_interface.module_signal_processor.compass_offset = web_interface.compass_offset
-                web_interface.module_signal_processor.optimize_short_bursts = dsp_settings.get(
-                    "en_optimize_short_bursts", 0
-                )
-                web_interface.module_signal_processor.en_peak_hold = dsp_settings.get("en_peak_hold", 0)
-
-                for i in range(web_interface.module_signal_processor.max_vfos):
-                    web_interface.module_signal_processor.vfo_bw[i] = int(dsp_settings.get("vfo_bw_" + str(i), 0))
-                    web_interface.module_signal_processor.vfo_fir_order_factor[i] = int(
-                        dsp_settings.get("vfo_fir_order_factor_" + str(i), DEFAULT_VFO_FIR_ORDER_FACTOR)
-                    )
-                    web_interface.module_signal_processor.vfo_freq[i] = float(dsp_settings.get("vfo_freq_" + str(i), 0))
-                    web_interface.module_signal_processor.vfo_squelch_mode[i] = dsp_settings.get(
-                        "vfo_squelch_mode_" + str(i), "Default"
-                    )
-                    web_interface.module_signal_processor.vfo_squelch[i] = int(
-                        dsp_settings.get("vfo_squelch_" + str(i), 0)
-                    )
-                    web_interface.module_signal_processor.vfo_demod[i] = dsp_settings.get(
-                        "vfo_demod_" + str(i), "Default"
-                    )
-                    web_interface.module_signal_processor.vfo_iq[i] = dsp_settings.get("vfo_iq_" + str(i), "Default")
-
-                web_interface.module_signal_processor.DOA_algorithm = dsp_settings.get("doa_method", "MUSIC")
-                web_interface.module_signal_processor.DOA_expected_num_of_sources = dsp_settings.get(
-                    "expected_num_of_sources", 1
-                )
-                web_interface._doa_fig_type = dsp_settings.get("doa_fig_type", "Linear")
-                web_interface.module_signal_processor.doa_measure = web_interface._doa_fig_type
-                web_interface.module_signal_processor.ula_direction = dsp_settings.get("ula_direction", "Both")
-                web_interface.module_signal_processor.array_offset = int(dsp_settings.get("array_offset", 0))
-
-                freq_delta = web_interface.daq_center_freq - center_freq
-                gain_delta = web_interface.module_receiver.daq_rx_gain - gain
-
-                if abs(freq_delta) > 0.001 or abs(gain_delta) > 0.001:
-                    web_interface.daq_center_freq = center_freq
-                    web_interface.config_daq_rf(center_freq, gain)
-                    for i in range(web_interface.module_signal_processor.max_vfos):
-                        half_band_width = (web_interface.module_signal_processor.vfo_bw[i] / 10**6) / 2
-                        min_freq = web_interface.daq_center_freq - web_interface.daq_fs / 2 + half_band_width
-                        max_freq = web_interface.daq_center_freq + web_interface.daq_fs / 2 - half_band_width
-                        if min_freq > (web_interface.module_signal_processor.vfo_freq[i] / 10**6) or max_freq < (
-                            web_interface.module_signal_processor.vfo_freq[i] / 10**6
-                        ):
-                            web_interface.module_signal_processor.vfo_freq[i] = (
-                                web_interface.module_receiver.daq_center_freq
-                            )
-
-                    wavelength = 300 / web_interface.daq_center_freq
-
-                    if web_interface.module_signal_processor.DOA_ant_alignment == "UCA":
-                        # Convert RADIUS to INTERELEMENT SPACING
-                        inter_elem_spacing = (
-                            np.sqrt(2)
-                            * web_interface.ant_spacing_meters
-                            * np.sqrt(
-                                1 - np.cos(np.deg2rad(360 / web_interface.module_signal_processor.channel_number))
-                            )
-                        )
-                        web_interface.module_signal_processor.DOA_inter_elem_space = inter_elem_spacing / wavelength
-                    else:
-                        web_interface.module_signal_processor.DOA_inter_elem_space = (
-                            web_interface.ant_spacing_meters / wavelength
-                        )
-
-                if dsp_settings.get("ext_upd_flag", False):
-                    web_interface.needs_refresh = True
-                    web_interface.save_configuration()
-
-    web_interface.settings_change_timer = Timer(
-        0.5, settings_change_watcher, args=(web_interface, settings_file_path, last_attempt_failed)
+    # Station Information
+    web_interface.location_source = dsp_settings.get("location_source", "None")
+    web_interface.mapping_server_url = dsp_settings.get("mapping_server_url", DEFAULT_MAPPING_SERVER_ENDPOINT)
+    web_interface.compass_offset = dsp_settings.get("compass_offset", 0)
+    web_interface._doa_fig_type = dsp_settings.get("doa_fig_type", "Linear")
+
+    freq_delta = web_interface.daq_center_freq - center_freq
+    gain_delta = web_interface.module_receiver.daq_rx_gain - gain
+
+    if changed_keys & RECEIVER_SETTINGS_KEYS and (abs(freq_delta) > 0.001 or abs(gain_delta) > 0.001):
+        web_interface.daq_center_freq = center_freq
+        web_interface.config_daq_rf(center_freq, gain)
+        for i in range(web_interface.module_signal_processor.max_vfos):
+            half_band_width = (web_interface.module_signal_processor.vfo_bw[i] / 10**6) / 2
+            min_freq = web_interface.daq_center_freq - web_interface.daq_fs / 2 + half_band_width
+            max_freq = web_interface.daq_center_freq + web_interface.daq_fs / 2 - half_band_width
+            if min_freq > (web_interface.module_signal_processor.vfo_freq[i] / 10**6) or max_freq < (
+                web_interface.module_signal_processor.vfo_freq[i] / 10**6
+            ):
+                web_interface.module_signal_processor.vfo_freq[i] = web_interface.module_receiver.daq_center_freq
+
+    if dsp_settings.get("ext_upd_flag", False):
+        web_interface.needs_refresh = True
+        web_interface.save_configuration()
+
+
+def start_settings_watcher(web_interface, settings_file_path):
+    """
+    Starts watching the settings file, the changes are applied from the watcher thread
+    """
+    web_interface.settings_watcher = SettingsFileWatcher(
+        settings_file_path,
+        lambda dsp_settings, changed_keys: apply_settings_file(web_interface, dsp_settings, changed_keys),
+        variables.dsp_settings,
+        web_interface.logging_level,
     )
-    web_interface.settings_change_timer.start()
+    web_interface.settings_watcher.start()
 
 
 def update_daq_status(app, web_interface):
@@ -470,7 +212,7 @@ def update_daq_status(app, web_interface):
             conn_status_style = {"color": "#e74c3c"}
 
         if web_interface.daq_restart:
-            daq_conn_status_str = "Restarting.."
+            daq_conn_status_str = web_interface.daq_reconfig.get_status_text()
             conn_status_style = {"color": "#f39c12"}
 
         if web_interface.daq_update_rate < 1:
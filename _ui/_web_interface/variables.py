@@ -4,11 +4,9 @@ import platform
 import sys
 
 import numpy as np
-import plotly.express as px
-import plotly.graph_objects as go
 
-trace_colors = px.colors.qualitative.Plotly
-trace_colors[3] = "rgb(255,255,51)"
+# This module is imported by the DSP chain as well, keep UI and other heavy dependencies out of it.
+# The plotly figure objects live in kraken_web_figures.
 
 current_path = os.path.dirname(os.path.realpath(__file__))
 root_path = os.path.dirname(os.path.dirname(current_path))
@@ -26,17 +24,40 @@ except Exception:
 else:
     dsp_settings["timestamp"] = os.stat(settings_file_path).st_mtime
 
-try:
-    import git
-
-    SOFTWARE_GIT_SHORT_HASH = git.Repo().head.object.hexsha[:7]
-except Exception:
-    SOFTWARE_GIT_SHORT_HASH = "e5df8c9"
 
+def read_git_short_hash(repo_path):
+    """
+    Reads the short hash of the checked out commit straight from the .git folder.
+    Importing GitPython only for this took a noticeable part of the start up time.
+    """
+    git_path = os.path.join(repo_path, ".git")
+    try:
+        with open(os.path.join(git_path, "HEAD"), "r") as head_file:
+            head = head_file.read().strip()
+        if not head.startswith("ref:"):
+            # Detached HEAD
+            return head[:7]
+
+        ref = head[len("ref:") :].strip()
+        ref_path = os.path.join(git_path, ref)
+        if os.path.exists(ref_path):
+            with open(ref_path, "r") as ref_file:
+                return ref_file.read().strip()[:7]
+        with open(os.path.join(git_path, "packed-refs"), "r") as packed_refs_file:
+            for line in packed_refs_file:
+                if line.rstrip().endswith(" " + ref):
+                    return line[:7]
+    except Exception:
+        pass
+    return None
+
+
+SOFTWARE_GIT_SHORT_HASH = read_git_short_hash(root_path) or "e5df8c9"
 SOFTWARE_VERSION = "1.8.1"
 SYSTEM_UNAME = platform.uname()
 
 status_file_path = os.path.join(shared_path, "status.json")
+startup_report_file_path = os.path.join(shared_path, "startup_report.json")
 
 daq_subsystem_path = os.path.join(os.path.join(os.path.dirname(root_path), "heimdall_daq_fw"), "Firmware")
 
@@ -88,15 +109,6 @@ figure_font_size = 20
 y = np.random.normal(0, 1, 2**1)
 x = np.arange(2**1)
 
-fig_layout = go.Layout(
-    paper_bgcolor="rgba(0,0,0,0)",
-    plot_bgcolor="rgba(0,0,0,0)",
-    template="plotly_dark",
-    showlegend=True,
-    margin=go.layout.Margin(t=0),  # top margin
-)
-doa_fig = go.Figure(layout=fig_layout)
-
 option = [{"label": "", "value": 1}]
 
 DECORRELATION_OPTIONS = [
@@ -1,6 +1,6 @@
 import dash_core_components as dcc
 import dash_html_components as html
-from variables import doa_fig
+from kraken_web_figures import doa_fig
 
 layout = html.Div(
     [
@@ -137,6 +137,10 @@ dsp_config_tooltips = html.Div(
                 html.P(
                     "VFO-0 Auto Max - VFO-0 will auto tune to the strongest signal in the spectrum. Only supports a single VFO."
                 ),
+                html.P(
+                    "CFAR Auto Multi VFO - the active VFOs will auto tune to the signals detected in the spectrum, "
+                    "with an estimated bandwidth. The DoA is only estimated while the signal of the VFO is present."
+                ),
             ],
             target="label_vfo_mode",
             placement="bottom",
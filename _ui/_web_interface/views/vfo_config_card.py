@@ -43,6 +43,7 @@ def get_vfo_config_card_layout():
                         options=[
                             {"label": "Standard", "value": "Standard"},
                             {"label": "VFO-0 Auto Max", "value": "Auto"},
+                            {"label": "CFAR Auto Multi VFO", "value": "CFAR"},
                         ],
                         value=web_interface.module_signal_processor.vfo_mode,
                         style={"display": "inline-block"},
@@ -126,22 +127,8 @@ def get_vfo_config_card_layout():
                     dcc.Dropdown(
                         id="active_vfos",
                         options=[
-                            {"label": "1", "value": 1},
-                            {"label": "2", "value": 2},
-                            {"label": "3", "value": 3},
-                            {"label": "4", "value": 4},
-                            {"label": "5", "value": 5},
-                            {"label": "6", "value": 6},
-                            {"label": "7", "value": 7},
-                            {"label": "8", "value": 8},
-                            {"label": "9", "value": 9},
-                            {"label": "10", "value": 10},
-                            {"label": "11", "value": 11},
-                            {"label": "12", "value": 12},
-                            {"label": "13", "value": 13},
-                            {"label": "14", "value": 14},
-                            {"label": "15", "value": 15},
-                            {"label": "16", "value": 16},
+                            {"label": str(i), "value": i}
+                            for i in range(1, web_interface.module_signal_processor.max_vfos + 1)
                         ],
                         value=web_interface.module_signal_processor.active_vfos,
                         style={"display": "inline-block"},
@@ -155,24 +142,9 @@ def get_vfo_config_card_layout():
                     html.Div("Output VFO:", id="label_output_vfo", className="field-label"),
                     dcc.Dropdown(
                         id="output_vfo",
-                        options=[
-                            {"label": "ALL", "value": -1},
-                            {"label": "0", "value": 0},
-                            {"label": "1", "value": 1},
-                            {"label": "2", "value": 2},
-                            {"label": "3", "value": 3},
-                            {"label": "4", "value": 4},
-                            {"label": "5", "value": 5},
-                            {"label": "6", "value": 6},
-                            {"label": "7", "value": 7},
-                            {"label": "8", "value": 8},
-                            {"label": "9", "value": 9},
-                            {"label": "10", "value": 10},
-                            {"label": "11", "value": 11},
-                            {"label": "12", "value": 12},
-                            {"label": "13", "value": 13},
-                            {"label": "14", "value": 14},
-                            {"label": "15", "value": 15},
+                        options=[{"label": "ALL", "value": -1}]
+                        + [
+                            {"label": str(i), "value": i} for i in range(web_interface.module_signal_processor.max_vfos)
                         ],
                         value=web_interface.module_signal_processor.output_vfo,
                         style={"display": "inline-block"},
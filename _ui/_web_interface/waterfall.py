@@ -1,5 +1,5 @@
 import plotly.graph_objects as go
-from variables import fig_layout
+from kraken_web_figures import fig_layout
 
 
 def init_waterfall(web_interface):
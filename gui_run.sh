@@ -42,8 +42,13 @@ sleep 0.1
 # Start rsync to sync DAQ logs into shared folder
 ./util/sync_daq_logs.sh >/dev/null 2>/dev/null &
 
-echo "Web Interface Running at $IPADDR:8080"
-python3 _ui/_web_interface/app.py >"${SHARED_FOLDER_DOA_LOGS}/ui.log" 2>&1 &
+if [ "$1" = "-H" ]; then
+    echo "Headless DSP Running (no Web Interface)"
+    python3 _sdr/_signal_processing/kraken_sdr_headless.py "${@:2}" >"${SHARED_FOLDER_DOA_LOGS}/headless.log" 2>&1 &
+else
+    echo "Web Interface Running at $IPADDR:8080"
+    python3 _ui/_web_interface/app.py >"${SHARED_FOLDER_DOA_LOGS}/ui.log" 2>&1 &
+fi
 
 # Start webserver to share output and settings with clients
 echo "Data Out Server Running at $IPADDR:$IPPORT"
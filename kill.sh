@@ -10,6 +10,8 @@ fi
 
 # Kill the Python web interface process
 sudo kill -${KILL_SIGNAL} $(ps ax | grep ".*[p]ython3 .*_ui/_web_interface/app.py" | awk '{print $1}') 2> /dev/null
+# Kill the headless DSP process
+sudo kill -${KILL_SIGNAL} $(ps ax | grep ".*[p]ython3 .*kraken_sdr_headless.py" | awk '{print $1}') 2> /dev/null
 # Kill PHP processes
 sudo kill -${KILL_SIGNAL} $(ps ax | grep "[p]hp" | awk '{print $1}') 2> /dev/null
 # Kill Node.js processes
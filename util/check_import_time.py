@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# Measures the import time of the DSP chain modules and checks it against a budget.
+#
+# The DSP chain must start without waiting for the web UI, so besides the time budget
+# it also checks that none of the UI / optional dependencies get imported by it.
+#
+# Usage: python3 util/check_import_time.py [--scale 2.0]
+# The budgets are given for a Raspberry Pi 4, use --scale to loosen or tighten them on other hosts.
+# Returns a non-zero exit code if any of the checks fail.
+
+import argparse
+import os
+import subprocess
+import sys
+
+root_path = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+web_interface_path = os.path.join(root_path, "_ui", "_web_interface")
+
+# Module name: cumulative import time budget [s]
+IMPORT_TIME_BUDGETS = {
+    "variables": 0.5,
+    "kraken_sdr_receiver": 1.0,
+    "kraken_sdr_signal_processor": 6.0,
+}
+
+# These must stay lazy, the DSP chain does not need them to start up
+FORBIDDEN_DSP_IMPORTS = ["plotly", "dash", "dash_devices", "dash_bootstrap_components", "git", "requests"]
+
+
+def measure_import(module_name):
+    """
+    Imports the module in a fresh interpreter with -X importtime.
+    Returns the cumulative import time in seconds and the set of imported top level packages.
+    """
+    code = "import sys; sys.path.insert(0, {!r}); import variables; import {}".format(web_interface_path, module_name)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True, cwd=root_path
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+    cumulative_us = 0
+    imported_packages = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:") :].split("|")
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            # Header line
+            continue
+        name = fields[2].strip()
+        imported_packages.add(name.split(".")[0])
+        if name == module_name:
+            cumulative_us = int(fields[1])
+    return cumulative_us / 1e6, imported_packages
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the import time budget of the DSP chain")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiplier applied to every budget")
+    args = parser.parse_args()
+
+    failed = False
+    for module_name, budget in IMPORT_TIME_BUDGETS.items():
+        budget *= args.scale
+        try:
+            import_time, imported_packages = measure_import(module_name)
+        except RuntimeError as e:
+            print(f"{module_name:>28}: import failed: {e}")
+            failed = True
+            continue
+
+        status = "OK" if import_time <= budget else "OVER BUDGET"
+        failed |= import_time > budget
+        print(f"{module_name:>28}: {import_time:6.3f} s (budget {budget:.3f} s) {status}")
+
+        forbidden = sorted(imported_packages.intersection(FORBIDDEN_DSP_IMPORTS))
+        if forbidden:
+            print(f"{'':>28}  imports UI / optional dependencies: {', '.join(forbidden)}")
+            failed = True
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()